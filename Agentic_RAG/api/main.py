@@ -3,11 +3,20 @@
 from fastapi import FastAPI 
 from api.routes.health import router as health_router
 from api.routes.ingest import router as ingest_router
+from api.routes.jobs import router as jobs_router
+from api.routes.query import router as query_router
+from api.services.job_service import get_job_manager
 
 app = FastAPI()
 
 app.include_router(health_router)
 app.include_router(ingest_router)
+app.include_router(jobs_router)
+app.include_router(query_router)
+
+@app.on_event("shutdown")
+def stop_ingest_workers():
+    get_job_manager().shutdown()
 
 @app.get("/")
 async def read_root():
@@ -1,22 +1,98 @@
 # Document Ingestion Endpoint
 
-from api.utils.document_processor import process_upload_file
-from fastapi import APIRouter, UploadFile, File
+import asyncio
+import json
+import os
+from typing import List, Optional
+
+from api.services.ingest_service import resolve_server_path
+from api.services.job_service import QueueFull, get_job_manager
+from api.utils.document_processor import spool_upload
+from fastapi import APIRouter, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
 
 
 router = APIRouter()
 
+def _overloaded(error):
+    return JSONResponse(
+        status_code=503, content={"error": str(error)}, headers={"Retry-After": "10"}
+    )
+
+async def _follow(job, interval=0.5):
+    """Stream the job state as NDJSON whenever it changes, until it finishes"""
+    last = None
+    while True:
+        state = job.to_dict()
+        if state != last:
+            yield json.dumps(state, ensure_ascii=False) + "\n"
+            last = state
+        if job.status in ("done", "failed"):
+            return
+        await asyncio.sleep(interval)
+
 @router.post("/ingest")
-async def ingest_document(file: UploadFile = File(...)):
+async def ingest_document(file: UploadFile = File(...), stream: bool = False):
+    """
+    Spool the upload to disk and queue an ingestion job. Returns the job
+    immediately (202); with ?stream=true its progress is streamed as NDJSON.
+    """
+    manager = get_job_manager()
+    stats = manager.stats()
+    if stats["pending"] >= stats["max_pending"]:
+        return _overloaded(f"{stats['pending']} ingestion jobs pending, try again later")
+
     try:
-        result = await process_upload_file(file)
-        return result
+        path = await spool_upload(file)
     except Exception as e:
-        return {"error": f"Processing failed: {str(e)}"}
-
+        return {"error": f"Upload failed: {str(e)}"}
 
+    try:
+        job = manager.submit(path, file.filename)
+    except QueueFull as e:
+        os.unlink(path)
+        return _overloaded(e)
 
+    if stream:
+        return StreamingResponse(_follow(job), media_type="application/x-ndjson")
+    return JSONResponse(status_code=202, content=job.to_dict())
 
+@router.post("/ingest/batch")
+async def ingest_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    path: Optional[str] = Form(None),
+    stream: bool = False,
+):
+    """
+    Queue one job for many PDFs: uploaded files and/or a directory or
+    archive (zip, tar) below INGEST_ROOT on the server. All files are
+    extracted in parallel and indexed together; the job reports per-file
+    status.
+    """
+    if not files and not path:
+        return JSONResponse(status_code=400, content={"error": "Send files or a server-side path"})
+    try:
+        server_path = resolve_server_path(path) if path else None
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
 
+    manager = get_job_manager()
+    stats = manager.stats()
+    if stats["pending"] >= stats["max_pending"]:
+        return _overloaded(f"{stats['pending']} ingestion jobs pending, try again later")
 
+    uploads = []
+    try:
+        for file in files or []:
+            uploads.append((file.filename, await spool_upload(file)))
+        job = manager.submit_batch(uploads, server_path)
+    except Exception as e:
+        for _, upload_path in uploads:
+            os.unlink(upload_path)
+        if isinstance(e, QueueFull):
+            return _overloaded(e)
+        return {"error": f"Upload failed: {str(e)}"}
 
+    if stream:
+        return StreamingResponse(_follow(job), media_type="application/x-ndjson")
+    return JSONResponse(status_code=202, content=job.to_dict())
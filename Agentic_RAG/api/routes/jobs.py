@@ -0,0 +1,19 @@
+# Ingestion Job Endpoints
+
+from api.services.job_service import get_job_manager
+from fastapi import APIRouter, HTTPException
+
+
+router = APIRouter()
+
+@router.get("/jobs")
+async def list_jobs():
+    manager = get_job_manager()
+    return {**manager.stats(), "jobs": manager.list()}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -1 +1,39 @@
-# RAG Query Endpoint 
\ No newline at end of file
+# RAG Query Endpoint
+
+import threading
+from typing import Optional
+
+from api.services.rag_service import HybridRetriever
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+
+
+router = APIRouter()
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+def get_retriever():
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = HybridRetriever.from_env()
+        return _retriever
+
+class QueryRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    k: Optional[int] = Field(None, ge=1, le=100)
+    dense_weight: Optional[float] = Field(None, ge=0)
+    lexical_weight: Optional[float] = Field(None, ge=0)
+
+def _retrieve(request: QueryRequest):
+    mode, results = get_retriever().retrieve(
+        request.query, request.k, request.dense_weight, request.lexical_weight
+    )
+    return {"query": request.query, "mode": mode, "results": results}
+
+@router.post("/query")
+async def query_documents(request: QueryRequest):
+    """Hybrid retrieval: BM25 and vector search fused by reciprocal rank fusion"""
+    return await run_in_threadpool(_retrieve, request)
@@ -0,0 +1,195 @@
+"""
+Wählbare FAISS-Indextypen für VectorService.
+
+- flat:  exakte Suche (IndexFlatL2), Kosten wachsen linear mit dem Korpus
+- hnsw:  Graph-Index (IndexHNSWFlat), schnelle Suche, volle float32-Vektoren
+- ivfpq: invertierte Listen mit Produktquantisierung (IndexIVFPQ), wenige
+         Byte je Vektor, für Korpora mit Millionen Chunks
+
+Alle Indizes arbeiten mit den stabilen Chunk-IDs aus vector_service. IVF-PQ
+braucht Trainingsdaten: bis 'train_size' Vektoren vorhanden sind, bleibt der
+Index flach, danach wird einmalig trainiert und auf IVF-PQ migriert.
+
+HNSW kann keine Knoten löschen. Gelöschte Vektoren bleiben als Tombstones
+im Graphen: ihre ID wird negativ, search() blendet sie über einen
+IDSelector aus. Neu aufgebaut wird erst, wenn ihr Anteil 'rebuild_ratio'
+übersteigt (needs_rebuild / rebuild).
+"""
+
+import math
+import os
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+# Chunk-IDs sind nicht negativ; Tombstones im HNSW-Graphen tragen -2 - Zeile
+_LIVE_IDS = faiss.IDSelectorRange(0, 2**63 - 1)
+
+
+class IndexConfig:
+    """
+    Indextyp und Parameter.
+
+    Args:
+        index_type: "flat", "hnsw" oder "ivfpq".
+        hnsw_m: Nachbarn je Knoten im HNSW-Graphen.
+        ef_construction: Suchbreite beim Aufbau des Graphen.
+        ef_search: Suchbreite bei Anfragen (höher = besserer Recall).
+        nlist: Anzahl IVF-Listen (0 = 4 * sqrt(Vektoren) beim Training).
+        nprobe: Durchsuchte IVF-Listen je Anfrage.
+        pq_m: Teilvektoren der Produktquantisierung (0 = dimension / 8).
+        pq_bits: Bit je Teilvektor-Code.
+        train_size: Ab dieser Anzahl Vektoren wird IVF-PQ trainiert.
+        rebuild_ratio: Anteil gelöschter HNSW-Knoten, ab dem der Graph neu
+            aufgebaut wird.
+    """
+
+    def __init__(
+        self, index_type="flat", hnsw_m=32, ef_construction=80, ef_search=64,
+        nlist=0, nprobe=16, pq_m=0, pq_bits=8, train_size=20000,
+        rebuild_ratio=0.2
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(
+                f"Unbekannter Indextyp '{index_type}', erlaubt: {', '.join(INDEX_TYPES)}"
+            )
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+        self.train_size = train_size
+        self.rebuild_ratio = rebuild_ratio
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            index_type=os.getenv("VECTOR_INDEX_TYPE", "flat"),
+            hnsw_m=int(os.getenv("VECTOR_HNSW_M", "32")),
+            ef_construction=int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", "80")),
+            ef_search=int(os.getenv("VECTOR_HNSW_EF_SEARCH", "64")),
+            nlist=int(os.getenv("VECTOR_IVF_NLIST", "0")),
+            nprobe=int(os.getenv("VECTOR_IVF_NPROBE", "16")),
+            pq_m=int(os.getenv("VECTOR_PQ_M", "0")),
+            pq_bits=int(os.getenv("VECTOR_PQ_BITS", "8")),
+            train_size=int(os.getenv("VECTOR_IVF_TRAIN_SIZE", "20000")),
+            rebuild_ratio=float(os.getenv("VECTOR_HNSW_REBUILD_RATIO", "0.2")),
+        )
+
+
+def index_kind(index) -> str:
+    """Typ eines bestehenden Index (nach Migration oder aus einem Snapshot)."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def build_index(config, dimension):
+    """Leerer Index; IVF-PQ startet flach, bis genug Trainingsdaten da sind."""
+    if config.index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dimension, config.hnsw_m)
+        hnsw.hnsw.efConstruction = config.ef_construction
+        index = faiss.IndexIDMap2(hnsw)
+    else:
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+    apply_search_params(config, index)
+    return index
+
+
+def apply_search_params(config, index):
+    """Setzt efSearch bzw. nprobe, auch für aus Snapshots geladene Indizes."""
+    kind = index_kind(index)
+    if kind == "hnsw":
+        faiss.ParameterSpace().set_index_parameter(index, "efSearch", config.ef_search)
+    elif kind == "ivfpq":
+        faiss.ParameterSpace().set_index_parameter(index, "nprobe", config.nprobe)
+
+
+def search(config, index, queries, k):
+    """(Distanzen, IDs) wie index.search, bei HNSW ohne Tombstones."""
+    if index_kind(index) == "hnsw":
+        params = faiss.SearchParametersHNSW(sel=_LIVE_IDS, efSearch=config.ef_search)
+        return index.search(queries, k, params=params)
+    return index.search(queries, k)
+
+
+def all_vectors(index):
+    """(ids, vectors) aller Einträge eines IndexIDMap2."""
+    ids = faiss.vector_to_array(index.id_map).astype(np.int64, copy=False)
+    return ids, index.index.reconstruct_n(0, index.ntotal)
+
+
+def needs_training(config, index) -> bool:
+    return (
+        config.index_type == "ivfpq"
+        and index_kind(index) == "flat"
+        and index.ntotal >= config.train_size
+    )
+
+
+def train_ivfpq(config, index):
+    """
+    Trainiert IVF-PQ auf allen Vektoren eines flachen Index und gibt den
+    neuen Index mit denselben IDs zurück.
+    """
+    ids, vectors = all_vectors(index)
+    count, dimension = vectors.shape
+    # k-means braucht etwa 39 Punkte je Liste
+    nlist = config.nlist or int(4 * math.sqrt(count))
+    nlist = max(1, min(nlist, count // 39))
+    pq_m = config.pq_m or max(1, dimension // 8)
+    while dimension % pq_m:
+        pq_m -= 1
+
+    ivfpq = faiss.IndexIVFPQ(
+        faiss.IndexFlatL2(dimension), dimension, nlist, pq_m, config.pq_bits
+    )
+    ivfpq.train(vectors)
+    # Hashtable-Direct-Map: reconstruct(id) und remove_ids mit eigenen IDs
+    ivfpq.set_direct_map_type(faiss.DirectMap.Hashtable)
+    ivfpq.add_with_ids(vectors, ids)
+    apply_search_params(config, ivfpq)
+    return ivfpq
+
+
+def remove_ids(config, index, vector_ids):
+    """
+    Entfernt Vektoren. Bei HNSW werden die Knoten nur als Tombstones
+    markiert (negative ID), die Kosten hängen nicht vom Graphen ab.
+    """
+    ids = np.asarray(vector_ids, dtype=np.int64)
+    if index_kind(index) != "hnsw":
+        index.remove_ids(ids)
+        return index
+    id_map = faiss.vector_to_array(index.id_map)
+    rows = np.flatnonzero(np.isin(id_map, ids))
+    id_map[rows] = -2 - rows
+    # rev_map behält die alten Einträge; sie werden beim erneuten Einfügen
+    # der ID überschrieben und sonst nicht mehr abgefragt
+    faiss.copy_array_to_vector(id_map, index.id_map)
+    return index
+
+
+def needs_rebuild(config, index, live) -> bool:
+    """Ob der HNSW-Graph mehr als rebuild_ratio Tombstones hat ('live' = gültige Vektoren)."""
+    return (
+        index_kind(index) == "hnsw"
+        and index.ntotal - live > config.rebuild_ratio * index.ntotal
+    )
+
+
+def rebuild(config, index):
+    """Neuer HNSW-Index aus den gültigen Vektoren, ohne Tombstones."""
+    ids, vectors = all_vectors(index)
+    live = ids >= 0
+    rebuilt = build_index(config, vectors.shape[1])
+    rebuilt.add_with_ids(vectors[live], ids[live])
+    return rebuilt
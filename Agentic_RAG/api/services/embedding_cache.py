@@ -0,0 +1,183 @@
+"""
+Persistenter Embedding-Cache auf der Platte.
+
+Schlüssel ist das Modell plus der SHA-256 des Chunk-Textes: jedes Modell
+bekommt ein eigenes Unterverzeichnis, darin liegt der Inhalts-Hash. Ein
+Modellverzeichnis enthält
+
+- meta.json     Modellname, Dimension und Kapazität
+- vectors.f32   float32-Matrix (capacity, dimension), per mmap eingeblendet
+- keys.u8       SHA-256 je Slot (32 Byte, Nullen = frei)
+- ticks.i64     Zeitpunkt des letzten Zugriffs je Slot (für LRU)
+
+Die Dateien haben feste Größe; ist der Cache voll, wird der am längsten
+nicht genutzte Slot überschrieben. Beim Schreiben wird der Schlüssel eines
+Slots erst gelöscht und nach dem Vektor neu gesetzt, ein Absturz mitten im
+Schreiben hinterlässt so höchstens einen freien Slot.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    LRU-Cache für Embeddings eines Modells in memory-mapped Dateien.
+
+    Args:
+        cache_dir: Basisverzeichnis, je Modell ein Unterverzeichnis.
+        model_name: Modell, dessen Embeddings gespeichert werden.
+        dimension: Dimension der Embeddings.
+        max_mb: Größenlimit des Caches auf der Platte in MB.
+    """
+
+    def __init__(self, cache_dir, model_name, dimension, max_mb=256):
+        self.model_name = model_name
+        self.dimension = dimension
+        slot_bytes = dimension * 4 + 32 + 8
+        self.capacity = max(1, int(max_mb * 2**20) // slot_bytes)
+        model_key = hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:16]
+        self.path = Path(cache_dir) / model_key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._open()
+
+    @classmethod
+    def from_env(cls, model_name, dimension):
+        """Cache aus EMBEDDING_CACHE_DIR / _MAX_MB oder None, wenn nicht gesetzt."""
+        cache_dir = os.getenv("EMBEDDING_CACHE_DIR")
+        if not cache_dir:
+            return None
+        return cls(
+            cache_dir, model_name, dimension,
+            max_mb=float(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")),
+        )
+
+    def _open(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "model": self.model_name,
+            "dimension": self.dimension,
+            "capacity": self.capacity,
+        }
+        meta_path = self.path / "meta.json"
+        fresh = not meta_path.exists() or json.loads(meta_path.read_text()) != meta
+        mode = "w+" if fresh else "r+"
+
+        # Neue Dateien sind sparse, belegt wird nur, was geschrieben wurde
+        self.vectors = np.memmap(
+            self.path / "vectors.f32", dtype=np.float32, mode=mode,
+            shape=(self.capacity, self.dimension)
+        )
+        self.keys = np.memmap(
+            self.path / "keys.u8", dtype=np.uint8, mode=mode,
+            shape=(self.capacity, 32)
+        )
+        self.ticks = np.memmap(
+            self.path / "ticks.i64", dtype=np.int64, mode=mode,
+            shape=(self.capacity,)
+        )
+        if fresh:
+            self._flush()
+            meta_path.write_text(json.dumps(meta))
+
+        # Zuordnung Schlüssel -> Slot in LRU-Reihenfolge aufbauen
+        used = np.flatnonzero(self.keys.any(axis=1))
+        self._slots = OrderedDict(
+            (self.keys[slot].tobytes(), int(slot))
+            for slot in used[np.argsort(self.ticks[used], kind="stable")]
+        )
+        self._free = sorted(set(range(self.capacity)) - set(used.tolist()), reverse=True)
+        self._tick = int(self.ticks[used].max()) + 1 if len(used) else 1
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _touch(self, key, slot):
+        self._slots.move_to_end(key)
+        self.ticks[slot] = self._tick
+        self._tick += 1
+
+    def get_many(self, digests, out) -> list:
+        """
+        Schreibt die Treffer für 'digests' (Hex-SHA-256) nach out[i] und
+        gibt die Positionen der nicht gefundenen zurück.
+        """
+        missing = []
+        with self._lock:
+            for i, digest in enumerate(digests):
+                key = bytes.fromhex(digest)
+                slot = self._slots.get(key)
+                if slot is None:
+                    missing.append(i)
+                    continue
+                out[i] = self.vectors[slot]
+                self._touch(key, slot)
+            self.hits += len(digests) - len(missing)
+            self.misses += len(missing)
+        return missing
+
+    def put_many(self, digests, vectors):
+        """Speichert vectors[i] unter digests[i], verdrängt bei Bedarf per LRU."""
+        with self._lock:
+            for digest, vector in zip(digests, vectors):
+                key = bytes.fromhex(digest)
+                slot = self._slots.get(key)
+                if slot is None:
+                    if self._free:
+                        slot = self._free.pop()
+                    else:
+                        _, slot = self._slots.popitem(last=False)
+                        self.evictions += 1
+                    self.keys[slot] = 0
+                    self.vectors[slot] = vector
+                    self.keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                    self._slots[key] = slot
+                self._touch(key, slot)
+            self._flush()
+
+    def _flush(self):
+        self.vectors.flush()
+        self.keys.flush()
+        self.ticks.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": len(self._slots),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def close(self):
+        with self._lock:
+            self._flush()
+
+
+def embed_cached(embeddings, cache, to_embed):
+    """
+    Embeddings für {content hash: Text} als float32-Array in derselben
+    Reihenfolge; mit 'cache' wird nur eingebettet, was dort fehlt.
+    """
+    if cache is None:
+        return embeddings.encode(list(to_embed.values()))
+    digests = list(to_embed)
+    vectors = np.empty((len(digests), embeddings.dimension), dtype=np.float32)
+    missing = cache.get_many(digests, vectors)
+    if missing:
+        vectors[missing] = embeddings.encode([to_embed[digests[i]] for i in missing])
+        cache.put_many([digests[i] for i in missing], vectors[missing])
+    return vectors
@@ -0,0 +1,139 @@
+"""
+Batched Embedding mit sentence-transformers.
+
+Die Texte werden in Batches fester Größe eingebettet, optional nach Länge
+sortiert, damit ein Batch aus ähnlich langen Texten besteht und wenig
+Padding mitrechnet. Große Ingests verteilen die Batches auf einen Pool von
+Worker-Prozessen, die je eine eigene Kopie des Modells laden. Die Ausgabe
+ist immer ein normalisiertes float32-Array (n, dim), das direkt an FAISS
+übergeben werden kann.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+_worker_model = None
+
+
+def _init_worker(model_name, device):
+    global _worker_model
+    # Jeder Prozess rechnet single-threaded, die Parallelität kommt vom Pool
+    import torch
+    torch.set_num_threads(1)
+    _worker_model = SentenceTransformer(model_name, device=device)
+
+
+def _encode_in_worker(texts, batch_size):
+    return _encode(_worker_model, texts, batch_size)
+
+
+def _encode(model, texts, batch_size):
+    return model.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    ).astype(np.float32, copy=False)
+
+
+class EmbeddingEngine:
+    """
+    Bettet Texte in Batches ein, bei großen Mengen auf mehreren Prozessen.
+
+    Args:
+        model_name: sentence-transformers Modell.
+        batch_size: Texte pro Forward-Pass.
+        sort_by_length: Batches aus ähnlich langen Texten bilden.
+        workers: Worker-Prozesse für große Ingests (0 = alle Kerne,
+            1 = kein Pool).
+        pool_threshold: Ab dieser Anzahl Texte wird der Pool genutzt.
+        device: Torch-Device, z.B. "cpu" oder "cuda".
+    """
+
+    def __init__(
+        self, model_name="all-MiniLM-L6-v2", batch_size=32,
+        sort_by_length=True, workers=0, pool_threshold=1024, device="cpu"
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.sort_by_length = sort_by_length
+        self.workers = workers or os.cpu_count() or 1
+        self.pool_threshold = pool_threshold
+        self.device = device
+        self.model = SentenceTransformer(model_name, device=device)
+        # sentence-transformers >= 5 benennt die Methode um
+        get_dimension = getattr(
+            self.model, "get_embedding_dimension",
+            self.model.get_sentence_embedding_dimension
+        )
+        self.dimension = get_dimension()
+        self._pool = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+            sort_by_length=os.getenv("EMBEDDING_SORT_BY_LENGTH", "1") != "0",
+            workers=int(os.getenv("EMBEDDING_WORKERS", "0")),
+            pool_threshold=int(os.getenv("EMBEDDING_POOL_THRESHOLD", "1024")),
+            device=os.getenv("EMBEDDING_DEVICE", "cpu"),
+        )
+
+    def encode(self, texts) -> np.ndarray:
+        """Normalisierte Embeddings (len(texts), dimension) als float32."""
+        out = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if not texts:
+            return out
+
+        order = np.arange(len(texts))
+        if self.sort_by_length:
+            order = np.argsort([len(text) for text in texts], kind="stable")
+        batches = [
+            order[start:start + self.batch_size]
+            for start in range(0, len(order), self.batch_size)
+        ]
+
+        if self.workers > 1 and len(texts) >= self.pool_threshold:
+            pool = self._get_pool()
+            futures = [
+                (rows, pool.submit(
+                    _encode_in_worker, [texts[i] for i in rows], self.batch_size
+                ))
+                for rows in batches
+            ]
+            for rows, future in futures:
+                out[rows] = future.result()
+        elif self.sort_by_length:
+            # model.encode sortiert selbst nach Länge, ein Aufruf genügt
+            out[:] = _encode(self.model, texts, self.batch_size)
+        else:
+            for rows in batches:
+                out[rows] = _encode(
+                    self.model, [texts[i] for i in rows], self.batch_size
+                )
+        return out
+
+    def encode_query(self, query) -> np.ndarray:
+        return _encode(self.model, [query], 1)
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: torch verträgt kein fork nach der Initialisierung
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.device),
+            )
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
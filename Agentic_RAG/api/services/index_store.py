@@ -0,0 +1,249 @@
+"""
+Atomare Snapshots des FAISS-Index samt Docstore und ID-Zuordnung.
+
+Ein Snapshot ist ein Verzeichnis unter <index_dir>/snapshots/ mit
+
+- index.faiss   FAISS-Index (IndexIDMap2)
+- ids.npy       sortierte Vektor-IDs
+- hashes.npy    SHA-256 je ID (32 Byte, gleiche Reihenfolge wie ids.npy)
+- offsets.npy   Start der Texte in texts.bin (len(ids) + 1 Einträge)
+- texts.bin     UTF-8-Texte aller Chunks hintereinander
+- lex_*         BM25-Index (siehe lexical_index), sofern übergeben
+- meta.json     Zähler des Dienstes, z.B. die nächste freie Dokument-ID
+
+Geschrieben wird in ein temporäres Verzeichnis, das erst nach fsync
+umbenannt wird; die Datei CURRENT zeigt danach per os.replace auf den neuen
+Snapshot. Ein Absturz hinterlässt so immer den alten oder den neuen Stand.
+Beim Laden werden Index und Arrays nur per mmap eingeblendet, die Ladezeit
+hängt damit kaum von der Indexgröße ab.
+
+Änderungen seit dem Snapshot stehen in einem Protokoll unter
+<index_dir>/log/<snapshot>.log. Jeder Aufruf von append_log hängt einen
+Block aus Länge, CRC32 und Einträgen an und ruft fsync auf; ein beim Absturz
+abgerissener Block wird beim Lesen verworfen. Ein neuer Snapshot ersetzt
+das Protokoll seines Vorgängers.
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import time
+import zlib
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Ab faiss 1.10 lassen sich auch Flat-Indizes per mmap laden
+MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+# Protokoll: Block = Länge und CRC32 der Nutzdaten, darin Einträge aus
+# Art und Vektor-ID, gefolgt von den Daten der Art
+_BLOCK = struct.Struct("<II")
+_RECORD = struct.Struct("<cq")
+_LENGTH = struct.Struct("<I")
+
+
+class Snapshot:
+    """Schreibgeschützte, per mmap geladene Sicht auf einen Snapshot."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.index = faiss.read_index(str(self.path / "index.faiss"), MMAP_FLAG)
+        self.ids = np.load(self.path / "ids.npy", mmap_mode="r")
+        self.hashes = np.load(self.path / "hashes.npy", mmap_mode="r")
+        self.offsets = np.load(self.path / "offsets.npy", mmap_mode="r")
+        self._texts_file = open(self.path / "texts.bin", "rb")
+        self.texts = (
+            mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.offsets[-1] else b""
+        )
+        meta = self.path / "meta.json"
+        self.meta = json.loads(meta.read_text()) if meta.exists() else {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, vector_id):
+        row = int(np.searchsorted(self.ids, vector_id))
+        if row == len(self.ids) or self.ids[row] != vector_id:
+            raise KeyError(vector_id)
+        return row
+
+    def text(self, vector_id) -> str:
+        row = self._row(vector_id)
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return self.texts[start:end].decode("utf-8")
+
+    def entries(self):
+        """(vector_id, content hash) aller Chunks in ID-Reihenfolge."""
+        for vector_id, digest in zip(self.ids, self.hashes):
+            yield int(vector_id), digest.tobytes().hex()
+
+    def load_index(self):
+        """Veränderbare Kopie des Index (der mmap-Index ist schreibgeschützt)."""
+        return faiss.read_index(str(self.path / "index.faiss"))
+
+
+def load_snapshot(index_dir):
+    """Aktueller Snapshot in 'index_dir' oder None."""
+    current = Path(index_dir) / "CURRENT"
+    if not current.exists():
+        return None
+    return Snapshot(Path(index_dir) / "snapshots" / current.read_text().strip())
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(index_dir, index, entries, lexical=None, meta=None):
+    """
+    Schreibt einen neuen Snapshot und macht ihn atomar zum aktuellen.
+
+    'entries' liefert (vector_id, content hash, text) in aufsteigender
+    ID-Reihenfolge, 'lexical' ist ein optionaler LexicalIndex, 'meta' ein
+    optionales JSON-Dict (meta.json). Gibt den Namen des Snapshots zurück.
+    """
+    snapshots = Path(index_dir) / "snapshots"
+    snapshots.mkdir(parents=True, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}"
+    tmp = snapshots / f"{name}.tmp"
+    tmp.mkdir()
+
+    ids, hashes, offsets = [], [], [0]
+    with open(tmp / "texts.bin", "wb") as f:
+        for vector_id, digest, text in entries:
+            data = text.encode("utf-8")
+            f.write(data)
+            ids.append(vector_id)
+            hashes.append(bytes.fromhex(digest))
+            offsets.append(offsets[-1] + len(data))
+    np.save(tmp / "ids.npy", np.array(ids, dtype=np.int64))
+    np.save(
+        tmp / "hashes.npy",
+        np.frombuffer(b"".join(hashes), dtype=np.uint8).reshape(-1, 32)
+    )
+    np.save(tmp / "offsets.npy", np.array(offsets, dtype=np.int64))
+    faiss.write_index(index, str(tmp / "index.faiss"))
+    if lexical is not None:
+        lexical.save(tmp)
+    if meta is not None:
+        (tmp / "meta.json").write_text(json.dumps(meta))
+
+    for file in tmp.iterdir():
+        _fsync(file)
+    os.rename(tmp, snapshots / name)
+    _fsync(snapshots)
+
+    current_tmp = Path(index_dir) / "CURRENT.tmp"
+    current_tmp.write_text(name)
+    _fsync(current_tmp)
+    os.replace(current_tmp, Path(index_dir) / "CURRENT")
+    _fsync(index_dir)
+
+    # Alte Snapshots und ihre Protokolle entfernen; bereits eingeblendete
+    # Dateien bleiben für laufende Leser gültig, bis diese sie schließen
+    for old in snapshots.iterdir():
+        if old.name != name:
+            shutil.rmtree(old, ignore_errors=True)
+    logs = Path(index_dir) / "log"
+    if logs.exists():
+        for old in logs.iterdir():
+            if old.stem != name:
+                old.unlink(missing_ok=True)
+    return name
+
+
+def log_path(index_dir, snapshot):
+    """Protokoll der Änderungen seit dem Snapshot 'snapshot' (Name)."""
+    return Path(index_dir) / "log" / f"{snapshot}.log"
+
+
+def _encode_record(record):
+    kind, vector_id = record[0], record[1]
+    if kind == "upsert":
+        _, _, digest, text, vector = record
+        data = text.encode("utf-8")
+        vector = np.asarray(vector, dtype=np.float32).tobytes()
+        return b"".join((
+            _RECORD.pack(b"U", vector_id), bytes.fromhex(digest),
+            _LENGTH.pack(len(data)), data, _LENGTH.pack(len(vector)), vector,
+        ))
+    if kind == "delete":
+        return _RECORD.pack(b"D", vector_id)
+    data = json.dumps(record[2]).encode("utf-8")
+    return _RECORD.pack(b"M", 0) + _LENGTH.pack(len(data)) + data
+
+
+def _decode_records(payload):
+    records, pos = [], 0
+    while pos < len(payload):
+        kind, vector_id = _RECORD.unpack_from(payload, pos)
+        pos += _RECORD.size
+        if kind == b"U":
+            digest = payload[pos:pos + 32].hex()
+            pos += 32
+            (length,) = _LENGTH.unpack_from(payload, pos)
+            text = payload[pos + 4:pos + 4 + length].decode("utf-8")
+            pos += 4 + length
+            (length,) = _LENGTH.unpack_from(payload, pos)
+            vector = np.frombuffer(payload, dtype=np.float32, count=length // 4, offset=pos + 4)
+            pos += 4 + length
+            records.append(("upsert", vector_id, digest, text, vector))
+        elif kind == b"D":
+            records.append(("delete", vector_id))
+        else:
+            (length,) = _LENGTH.unpack_from(payload, pos)
+            records.append(("meta", 0, json.loads(payload[pos + 4:pos + 4 + length])))
+            pos += 4 + length
+    return records
+
+
+def append_log(path, records):
+    """
+    Hängt 'records' als einen Block an das Protokoll an und wartet auf fsync.
+
+    Einträge: ("upsert", vector_id, content hash, text, vector),
+    ("delete", vector_id) und ("meta", 0, dict) für Zähler wie in meta.json.
+    """
+    path = Path(path)
+    payload = b"".join(_encode_record(record) for record in records)
+    created = not path.exists()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as f:
+        f.write(_BLOCK.pack(len(payload), zlib.crc32(payload)) + payload)
+        f.flush()
+        os.fsync(f.fileno())
+    if created:
+        _fsync(path.parent)
+
+
+def read_log(path):
+    """
+    Einträge aller vollständigen Blöcke in Schreibreihenfolge. Ein
+    unvollständiger oder beschädigter Rest am Ende wird abgeschnitten.
+    """
+    path = Path(path)
+    if not path.exists():
+        return []
+    data = path.read_bytes()
+    records, pos = [], 0
+    while pos + _BLOCK.size <= len(data):
+        length, crc = _BLOCK.unpack_from(data, pos)
+        payload = data[pos + _BLOCK.size:pos + _BLOCK.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.extend(_decode_records(payload))
+        pos += _BLOCK.size + length
+    if pos < len(data):
+        with open(path, "r+b") as f:
+            f.truncate(pos)
+            os.fsync(f.fileno())
+    return records
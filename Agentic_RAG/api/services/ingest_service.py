@@ -0,0 +1,136 @@
+"""
+Ingestion eines PDFs in zwei Schritten.
+
+1. extract_to_file läuft in einem Worker-Prozess: Seiten werden einzeln
+   extrahiert und gechunkt, die Chunks zeilenweise als JSON in eine Datei
+   geschrieben.
+2. index_chunks liest diese Datei im API-Prozess und übergibt die Chunks
+   in Batches an den VectorService.
+
+Keiner der Schritte hält das ganze Dokument im Speicher, der Bedarf hängt
+nicht von der Dateigröße ab.
+
+Für Batch-Uploads sammelt collect_pdfs die PDFs eines Verzeichnisses oder
+Archivs (zip, tar) auf dem Server; erlaubt sind nur Pfade unter INGEST_ROOT.
+"""
+
+import json
+import os
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path
+
+from api.services.vector_service import get_vector_service
+from api.utils.document_processor import count_pdf_pages, iter_chunks, iter_pdf_pages
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_ROOT = os.getenv("INGEST_ROOT")
+
+
+def resolve_server_path(path):
+    """Verzeichnis oder Archiv unter INGEST_ROOT; ValueError sonst."""
+    if not INGEST_ROOT:
+        raise ValueError("Server-side paths are disabled (INGEST_ROOT not set)")
+    root = Path(INGEST_ROOT).resolve()
+    resolved = (root / path).resolve()
+    if not resolved.is_relative_to(root):
+        raise ValueError(f"Path '{path}' is outside of INGEST_ROOT")
+    if not resolved.exists():
+        raise ValueError(f"Path '{path}' does not exist")
+    return resolved
+
+
+def _is_pdf(name):
+    return name.lower().endswith(".pdf")
+
+
+def collect_pdfs(path, workdir):
+    """
+    (Name, Pfad) aller PDFs in einem Verzeichnis, zip- oder tar-Archiv.
+    PDFs aus Archiven werden einzeln nach workdir entpackt.
+    """
+    path = Path(path)
+    if path.is_dir():
+        return [
+            (str(pdf.relative_to(path)), str(pdf))
+            for pdf in sorted(path.rglob("*")) if pdf.is_file() and _is_pdf(pdf.name)
+        ]
+
+    pdfs = []
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not _is_pdf(member.filename):
+                    continue
+                # Eigener Dateiname, Pfade aus dem Archiv werden nie verwendet
+                target = Path(workdir) / f"{len(pdfs):05d}.pdf"
+                with archive.open(member) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                pdfs.append((member.filename, str(target)))
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as archive:
+            for member in archive:
+                if not member.isfile() or not _is_pdf(member.name):
+                    continue
+                target = Path(workdir) / f"{len(pdfs):05d}.pdf"
+                with archive.extractfile(member) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                pdfs.append((member.name, str(target)))
+    elif _is_pdf(path.name):
+        pdfs.append((path.name, str(path)))
+    else:
+        raise ValueError(f"'{path.name}' is neither a directory, an archive nor a PDF")
+    return pdfs
+
+
+def extract_to_file(pdf_path, chunks_path):
+    """Schreibt die Chunks eines PDFs nach chunks_path (eine JSON-Zeile je Chunk)."""
+    stats = {"pages": count_pdf_pages(pdf_path), "chunks_count": 0, "total_text_length": 0}
+
+    def counted(pages):
+        for text in pages:
+            stats["total_text_length"] += len(text)
+            yield text
+
+    with open(chunks_path, "w", encoding="utf-8") as f:
+        for page, chunk in iter_chunks(counted(iter_pdf_pages(pdf_path))):
+            f.write(json.dumps({"page": page, "text": chunk}, ensure_ascii=False) + "\n")
+            stats["chunks_count"] += 1
+    return stats
+
+
+def iter_chunk_file(chunks_path):
+    """(page, text) aus einer Datei von extract_to_file."""
+    with open(chunks_path, encoding="utf-8") as f:
+        for line in f:
+            chunk = json.loads(line)
+            yield chunk["page"], chunk["text"]
+
+
+def index_chunks(chunks, vector_service=None, on_progress=None):
+    """
+    Indexiert (page, text)-Paare als neues Dokument und gibt dessen ID
+    zurück. on_progress(page, chunks) wird nach jedem Batch aufgerufen.
+    """
+    vector_service = vector_service or get_vector_service()
+    writer = vector_service.document_writer()
+    batch = []
+    page = 0
+    try:
+        for page, chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= INGEST_BATCH_SIZE:
+                writer.add(batch)
+                batch = []
+                if on_progress:
+                    on_progress(page, writer.count)
+        if batch:
+            writer.add(batch)
+            if on_progress:
+                on_progress(page, writer.count)
+    except BaseException:
+        # Kein halbes Dokument im Index lassen
+        vector_service.delete_document(writer.document_id)
+        raise
+    return writer.commit()
@@ -0,0 +1,282 @@
+"""
+Hintergrund-Jobs für die Ingestion.
+
+/ingest legt nur noch einen Job an und antwortet sofort mit dessen ID. Die
+CPU-lastige Extraktion (PyMuPDF, Chunking) läuft in einem Prozess-Pool,
+das Einbetten und Indexieren in einem Job-Thread des API-Prozesses. Der
+Event-Loop bleibt frei für /health und Suchanfragen.
+
+Das Einbetten nutzt den Prozess-Pool nicht: die Batches aus
+INGEST_BATCH_SIZE Chunks liegen unter EMBEDDING_POOL_THRESHOLD, der
+eigene Pool von EmbeddingEngine greift nur bei größeren Aufrufen. Das
+Modell rechnet also im Job-Thread, torch gibt dabei den GIL frei. Der
+VectorService sperrt seinen Index nur zum Einhängen der fertigen Vektoren,
+Suchanfragen warten nicht auf das Einbetten.
+
+Ein Batch-Job verarbeitet viele Dateien: alle PDFs werden parallel
+extrahiert, die Chunks aller Dateien gemeinsam in Batches eingebettet und
+der Index am Ende einmal gespeichert.
+
+Die Anzahl offener Jobs (wartend + laufend) ist begrenzt; ist die Grenze
+erreicht, lehnt submit() neue Jobs mit QueueFull ab, statt sie
+anzustauen.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import groupby
+
+from api.services.ingest_service import (
+    INGEST_BATCH_SIZE, collect_pdfs, extract_to_file, index_chunks, iter_chunk_file,
+)
+from api.services.vector_service import get_vector_service
+
+
+class QueueFull(Exception):
+    """Es sind bereits max_pending Jobs offen."""
+
+
+class Job:
+    def __init__(self, filename, batch=False):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.files = [] if batch else None  # Status je Datei eines Batch-Jobs
+        self.status = "queued"  # queued -> extracting -> indexing -> done | failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.pages = None
+        self.page = 0
+        self.chunks_indexed = 0
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {
+                "page": self.page,
+                "pages": self.pages,
+                "chunks_indexed": self.chunks_indexed,
+            },
+            "files": [dict(file) for file in self.files] if self.files is not None else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Verwaltet Ingestion-Jobs.
+
+    Args:
+        workers: Prozesse für die Extraktion und gleichzeitig laufende Jobs
+            (0 = alle Kerne bis auf einen, der für Anfragen frei bleibt).
+        max_pending: Höchstzahl offener Jobs, darüber wird abgelehnt.
+        history: Abgeschlossene Jobs, die abrufbar bleiben.
+    """
+
+    def __init__(self, workers=0, max_pending=8, history=1000):
+        self.workers = workers or max(1, (os.cpu_count() or 1) - 1)
+        self.max_pending = max_pending
+        self.history = history
+        self.jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        # spawn: Worker starten ohne geerbten Torch-/FAISS-Zustand
+        self._processes = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="ingest"
+        )
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=int(os.getenv("INGEST_WORKERS", "0")),
+            max_pending=int(os.getenv("INGEST_MAX_PENDING", "8")),
+        )
+
+    def submit(self, pdf_path, filename):
+        """Legt einen Job für das (bereits gespoolte) PDF an; QueueFull bei Überlast."""
+        return self._submit(Job(filename), self._run, pdf_path)
+
+    def submit_batch(self, uploads, server_path=None):
+        """
+        Batch-Job für gespoolte Uploads [(filename, path)] und/oder ein
+        Verzeichnis bzw. Archiv auf dem Server; QueueFull bei Überlast.
+        """
+        label = str(server_path) if server_path else f"{len(uploads)} files"
+        return self._submit(Job(label, batch=True), self._run_batch, uploads, server_path)
+
+    def _submit(self, job, run, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} ingestion jobs pending, try again later")
+            self._pending += 1
+            self.jobs[job.id] = job
+            self._trim()
+        self._threads.submit(run, job, *args)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return [job.to_dict() for job in reversed(self.jobs.values())]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+            }
+
+    def _trim(self):
+        finished = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status in ("done", "failed")
+        ]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+    def _run(self, job, pdf_path):
+        chunks_path = f"{pdf_path}.chunks"
+        job.started_at = time.time()
+        try:
+            # Schritt 1: Extraktion und Chunking im Worker-Prozess
+            job.status = "extracting"
+            stats = self._processes.submit(extract_to_file, pdf_path, chunks_path).result()
+            job.pages = stats["pages"]
+
+            # Schritt 2: Einbetten und Indexieren im API-Prozess
+            job.status = "indexing"
+
+            def progress(page, chunks):
+                job.page, job.chunks_indexed = page, chunks
+
+            document_id = index_chunks(iter_chunk_file(chunks_path), on_progress=progress)
+            job.result = {"filename": job.filename, "document_id": document_id, **stats}
+            job.status = "done"
+        except Exception as e:
+            job.error = f"Processing failed: {str(e)}"
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            for path in (pdf_path, chunks_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+            with self._lock:
+                self._pending -= 1
+
+    def _run_batch(self, job, uploads, server_path):
+        workdir = tempfile.mkdtemp(prefix="ingest-")
+        job.started_at = time.time()
+        open_writers = {}  # Datei-Index -> DocumentWriter, noch nicht committet
+        try:
+            # Schritt 1: Dateien sammeln, Archive einzeln entpacken
+            sources = list(uploads)
+            if server_path:
+                sources += collect_pdfs(server_path, workdir)
+            job.files = [{"filename": name, "status": "queued"} for name, _ in sources]
+
+            # Schritt 2: Alle PDFs parallel im Prozess-Pool extrahieren
+            job.status = "extracting"
+            chunk_files = [os.path.join(workdir, f"{i:05d}.chunks") for i in range(len(sources))]
+            futures = {
+                self._processes.submit(extract_to_file, path, chunk_files[i]): i
+                for i, (_, path) in enumerate(sources)
+            }
+            for file in job.files:
+                file["status"] = "extracting"
+
+            # Schritt 3: Chunks aller Dateien in gemeinsamen Batches einbetten,
+            # gespeichert wird erst am Ende des Jobs
+            vector_service = get_vector_service()
+            batch = []  # (Datei-Index, Chunk)
+            finished = []  # Dateien, deren Chunks alle in batch oder im Index sind
+
+            def flush():
+                vector_service.write_many([
+                    (open_writers[i], [chunk for _, chunk in group])
+                    for i, group in groupby(batch, key=lambda item: item[0])
+                ])
+                job.chunks_indexed += len(batch)
+                batch.clear()
+                for i in finished:
+                    job.files[i].update(
+                        status="done", document_id=open_writers.pop(i).commit()
+                    )
+                finished.clear()
+
+            with vector_service.deferred_save():
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        stats = future.result()
+                    except Exception as e:
+                        job.files[i].update(status="failed", error=f"Processing failed: {str(e)}")
+                        continue
+                    job.status = "indexing"
+                    job.files[i].update(status="indexing", **stats)
+                    open_writers[i] = vector_service.document_writer()
+                    for _, chunk in iter_chunk_file(chunk_files[i]):
+                        batch.append((i, chunk))
+                        if len(batch) >= INGEST_BATCH_SIZE:
+                            flush()
+                    finished.append(i)
+                    os.unlink(chunk_files[i])
+                flush()
+
+            failed = sum(file["status"] == "failed" for file in job.files)
+            job.result = {"files": len(job.files), "succeeded": len(job.files) - failed, "failed": failed}
+            job.status = "done"
+        except Exception as e:
+            # Nicht abgeschlossene Dokumente wieder entfernen
+            for i, writer in open_writers.items():
+                get_vector_service().delete_document(writer.document_id)
+                job.files[i].update(status="failed", error=f"Indexing failed: {str(e)}")
+            job.error = f"Processing failed: {str(e)}"
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            for _, path in uploads:
+                if os.path.exists(path):
+                    os.unlink(path)
+            shutil.rmtree(workdir, ignore_errors=True)
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Gemeinsamer JobManager der API, wird beim ersten Aufruf gestartet."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager.from_env()
+        return _manager
@@ -0,0 +1,219 @@
+"""
+Invertierter Index mit BM25-Scoring für die lexikalische Suche.
+
+Postings sind reine Integer-Arrays: je Term die internen Dokumentnummern
+(uint32) und Termhäufigkeiten (uint16). Ein Chunk bekommt bei jedem
+Hinzufügen eine neue interne Nummer, Löschen markiert sie nur (Länge 0);
+beim Speichern werden gelöschte Einträge entfernt und die Nummern
+verdichtet.
+
+Gespeichert wird in den Snapshot des Vektorindex (siehe index_store):
+
+- lex_vocab.txt        Terme, einer je Zeile (Zeile = Term-ID)
+- lex_offsets.npy      Beginn der Postings je Term (len(vocab) + 1)
+- lex_docs.npy         interne Dokumentnummern aller Postings
+- lex_tfs.npy          Termhäufigkeiten aller Postings
+- lex_doc_ids.npy      Vektor-ID je interner Nummer
+- lex_doc_lengths.npy  Anzahl Tokens je interner Nummer
+
+Beim Laden werden die Postings per mmap eingeblendet; neue Chunks landen
+bis zum nächsten Speichern in kleinen Arrays im Speicher.
+"""
+
+import math
+import re
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+# Wörter und zusammengesetzte Codes wie "AB-1234", "v2.3.1" oder "x_17"
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+PART_PATTERN = re.compile(r"[-./]")
+
+
+def tokenize(text):
+    """Kleingeschriebene Tokens; Codes zusätzlich in ihren Teilen."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if PART_PATTERN.search(token):
+            tokens.extend(part for part in PART_PATTERN.split(token) if part)
+    return tokens
+
+
+def is_code(token):
+    """Produktcodes, Versionen, IDs: Tokens mit Ziffern."""
+    return any(char.isdigit() for char in token)
+
+
+class LexicalIndex:
+    """
+    BM25 über Chunks, inkrementell über add() und remove() gepflegt.
+
+    Args:
+        k1: Sättigung der Termhäufigkeit.
+        b: Einfluss der Chunklänge.
+    """
+
+    FILES = (
+        "lex_vocab.txt", "lex_offsets.npy", "lex_docs.npy", "lex_tfs.npy",
+        "lex_doc_ids.npy", "lex_doc_lengths.npy",
+    )
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}  # Term -> Term-ID
+        # Verdichtete Postings (aus dem Snapshot)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.empty(0, dtype=np.uint32)
+        self._tfs = np.empty(0, dtype=np.uint16)
+        # Postings seit dem letzten Speichern: Term-ID -> (docs, tfs)
+        self._delta = {}
+        self.doc_ids = array("q")  # interne Nummer -> Vektor-ID
+        self.doc_lengths = array("I")  # interne Nummer -> Tokens, 0 = gelöscht
+        self._doc_of = None  # Vektor-ID -> interne Nummer, bei Bedarf aufgebaut
+        self.alive = 0
+        self.total_length = 0
+
+    def __len__(self):
+        return self.alive
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Index aus einem Snapshot-Verzeichnis oder None, falls nicht vorhanden."""
+        path = Path(path)
+        if not all((path / name).exists() for name in cls.FILES):
+            return None
+        index = cls(**kwargs)
+        terms = (path / "lex_vocab.txt").read_text(encoding="utf-8").split("\n")
+        index.vocab = {term: term_id for term_id, term in enumerate(terms) if term}
+        index._offsets = np.load(path / "lex_offsets.npy", mmap_mode="r")
+        index._docs = np.load(path / "lex_docs.npy", mmap_mode="r")
+        index._tfs = np.load(path / "lex_tfs.npy", mmap_mode="r")
+        index.doc_ids = array("q", np.load(path / "lex_doc_ids.npy").tobytes())
+        lengths = np.load(path / "lex_doc_lengths.npy")
+        index.doc_lengths = array("I", lengths.tobytes())
+        index.alive = int(np.count_nonzero(lengths))
+        index.total_length = int(lengths.sum())
+        return index
+
+    def _doc_map(self):
+        if self._doc_of is None:
+            self._doc_of = {
+                vector_id: doc
+                for doc, (vector_id, length) in enumerate(zip(self.doc_ids, self.doc_lengths))
+                if length
+            }
+        return self._doc_of
+
+    def add(self, vector_id, text):
+        """Indexiert einen Chunk; ein vorhandener Eintrag mit der ID wird ersetzt."""
+        self.remove(vector_id)
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        doc = len(self.doc_ids)
+        length = sum(counts.values()) or 1  # 0 ist für gelöschte reserviert
+        self.doc_ids.append(vector_id)
+        self.doc_lengths.append(length)
+        self._doc_map()[vector_id] = doc
+        self.alive += 1
+        self.total_length += length
+        for token, tf in counts.items():
+            term_id = self.vocab.setdefault(token, len(self.vocab))
+            docs, tfs = self._delta.setdefault(term_id, (array("I"), array("H")))
+            docs.append(doc)
+            tfs.append(min(tf, 0xFFFF))
+
+    def remove(self, vector_id):
+        doc = self._doc_map().pop(vector_id, None)
+        if doc is None:
+            return
+        self.total_length -= self.doc_lengths[doc]
+        self.doc_lengths[doc] = 0
+        self.alive -= 1
+
+    def _postings(self, term_id):
+        """(docs, tfs) eines Terms aus verdichtetem Teil und Delta."""
+        if term_id + 1 < len(self._offsets):
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            docs, tfs = self._docs[start:end], self._tfs[start:end]
+        else:
+            docs, tfs = self._docs[:0], self._tfs[:0]
+        delta = self._delta.get(term_id)
+        if delta is not None:
+            docs = np.concatenate([docs, np.frombuffer(delta[0], dtype=np.uint32)])
+            tfs = np.concatenate([tfs, np.frombuffer(delta[1], dtype=np.uint16)])
+        return docs, tfs
+
+    def search(self, query, k=10, tokens=None):
+        """[(vector_id, score)] der k besten Chunks nach BM25."""
+        if not self.alive:
+            return []
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        average = self.total_length / self.alive
+        all_docs, all_scores = [], []
+        for token in set(tokens if tokens is not None else tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            docs, tfs = self._postings(term_id)
+            doc_lengths = lengths[docs]
+            alive = doc_lengths > 0
+            docs, tfs, doc_lengths = docs[alive], tfs[alive].astype(np.float32), doc_lengths[alive]
+            if not len(docs):
+                continue
+            idf = math.log(1 + (self.alive - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths / average)
+            all_docs.append(docs)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        if not all_docs:
+            return []
+
+        # Scores je Dokument summieren, nur über die getroffenen Postings
+        docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(self.doc_ids[int(docs[i])], float(scores[i])) for i in top]
+
+    def save(self, path):
+        """
+        Schreibt den verdichteten Index nach path: gelöschte Einträge fallen
+        weg, das Delta wird eingegliedert. Der Index selbst bleibt
+        unverändert, damit parallele Suchen ungestört weiterlaufen; die
+        verdichtete Fassung liefert danach load(path).
+        """
+        path = Path(path)
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        alive = lengths > 0
+        renumber = np.cumsum(alive, dtype=np.int64) - 1
+
+        # Alle Postings als (Term, Dokument, tf), dann nach Term und Dokument sortiert
+        terms = [np.repeat(
+            np.arange(len(self._offsets) - 1, dtype=np.int64), np.diff(self._offsets)
+        )]
+        docs, tfs = [np.asarray(self._docs)], [np.asarray(self._tfs)]
+        for term_id, (delta_docs, delta_tfs) in self._delta.items():
+            terms.append(np.full(len(delta_docs), term_id, dtype=np.int64))
+            docs.append(np.frombuffer(delta_docs, dtype=np.uint32))
+            tfs.append(np.frombuffer(delta_tfs, dtype=np.uint16))
+        terms, docs, tfs = np.concatenate(terms), np.concatenate(docs), np.concatenate(tfs)
+        keep = alive[docs]
+        terms, docs, tfs = terms[keep], renumber[docs[keep]].astype(np.uint32), tfs[keep]
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self.vocab)), out=offsets[1:])
+
+        vocab = [""] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            vocab[term_id] = term
+        (path / "lex_vocab.txt").write_text("\n".join(vocab), encoding="utf-8")
+        np.save(path / "lex_offsets.npy", offsets)
+        np.save(path / "lex_docs.npy", docs)
+        np.save(path / "lex_tfs.npy", tfs)
+        doc_ids = np.frombuffer(self.doc_ids, dtype=np.int64)[alive]
+        np.save(path / "lex_doc_ids.npy", doc_ids)
+        np.save(path / "lex_doc_lengths.npy", lengths[alive])
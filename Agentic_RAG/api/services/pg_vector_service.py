@@ -0,0 +1,302 @@
+"""
+VectorService auf PostgreSQL + pgvector (Tabellen aus init.sql).
+
+Verbindungen kommen aus einem psycopg-Pool, Embeddings werden per binärem
+COPY geschrieben. Den Vektorindex verwaltet create_index(): bis
+PGVECTOR_INDEX_MIN_ROWS Chunks wird exakt gesucht, danach wird ein HNSW-
+oder ivfflat-Index gebaut und ivfflat neu gebaut, sobald die Anzahl Listen
+nicht mehr zur Tabellengröße passt. Gebaut wird mit CREATE INDEX
+CONCURRENTLY unter einem temporären Namen, Suchen laufen währenddessen
+weiter.
+"""
+
+import math
+import os
+import threading
+from pathlib import Path
+
+import psycopg
+from pgvector.psycopg import register_vector
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import ConnectionPool
+
+from api.services.embedding_cache import EmbeddingCache, embed_cached
+from api.services.embedding_service import EmbeddingEngine
+from api.services.vector_service import content_hash
+
+INIT_SQL = Path(__file__).resolve().parents[2] / "init.sql"
+INDEX_NAME = "chunks_embedding_idx"
+# Schlüssel für pg_try_advisory_lock, damit nur ein Prozess den Index baut
+INDEX_LOCK_KEY = 0x5241_4749
+
+
+def ivfflat_lists(rows: int) -> int:
+    """Empfehlung von pgvector: rows / 1000 bis 1 Mio. Zeilen, darüber sqrt(rows)."""
+    if rows <= 1_000_000:
+        return max(10, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def _configure(conn):
+    register_vector(conn)
+    conn.commit()
+
+
+class PgVectorService:
+    """
+    Chunks und Embeddings in PostgreSQL mit pgvector.
+
+    Verbindung über POSTGRES_HOST/PORT/DB/USER/PASSWORD, Poolgröße über
+    POSTGRES_POOL_SIZE. Indextyp (hnsw oder ivfflat) und Suchparameter über
+    PGVECTOR_* (siehe README).
+    """
+
+    def __init__(self, embeddings=None, cache=None, auto_index=True):
+        self.embeddings = embeddings or EmbeddingEngine.from_env()
+        if cache is None:
+            cache = EmbeddingCache.from_env(
+                self.embeddings.model_name, self.embeddings.dimension
+            )
+        self.cache = cache
+        self.auto_index = auto_index
+
+        self.index_type = os.getenv("PGVECTOR_INDEX_TYPE", "hnsw")
+        if self.index_type not in ("hnsw", "ivfflat"):
+            raise ValueError(f"Unbekannter pgvector-Index '{self.index_type}'")
+        self.index_min_rows = int(os.getenv("PGVECTOR_INDEX_MIN_ROWS", "10000"))
+        self.hnsw_m = int(os.getenv("PGVECTOR_HNSW_M", "16"))
+        self.ef_construction = int(os.getenv("PGVECTOR_HNSW_EF_CONSTRUCTION", "64"))
+        self.ef_search = int(os.getenv("PGVECTOR_HNSW_EF_SEARCH", "64"))
+        self.probes = int(os.getenv("PGVECTOR_IVFFLAT_PROBES", "10"))
+        self.maintenance_work_mem = os.getenv("PGVECTOR_MAINTENANCE_WORK_MEM", "512MB")
+        self._index_lock = threading.Lock()
+
+        self.conninfo = make_conninfo(
+            host=os.getenv("POSTGRES_HOST", "localhost"),
+            port=os.getenv("POSTGRES_PORT", "5432"),
+            dbname=os.getenv("POSTGRES_DB", "rag_assistant"),
+            user=os.getenv("POSTGRES_USER", "postgres"),
+            password=os.getenv("POSTGRES_PASSWORD", ""),
+        )
+        self._ensure_schema()
+        self.pool = ConnectionPool(
+            self.conninfo,
+            min_size=1,
+            max_size=int(os.getenv("POSTGRES_POOL_SIZE", "10")),
+            configure=_configure,
+            open=True,
+        )
+
+    def _ensure_schema(self):
+        """Führt init.sql aus, falls die Tabellen fehlen (lokale Instanz ohne Docker)."""
+        with psycopg.connect(self.conninfo, autocommit=True) as conn:
+            exists = conn.execute(
+                "SELECT to_regclass('document_chunks')"
+            ).fetchone()[0]
+            if exists is None:
+                print("Tabellen fehlen, führe init.sql aus...")
+                conn.execute(INIT_SQL.read_text(encoding="utf-8"))
+
+    def store_chunks(self, document_id, chunks):
+        """Ersetzt die Chunks eines Dokuments in einer Transaktion."""
+        # Schritt 1: Embeddings, gleiche Inhalte nur einmal (und zuerst aus dem Cache)
+        digests = [content_hash(chunk) for chunk in chunks]
+        to_embed = dict(zip(digests, chunks))
+        vectors = embed_cached(self.embeddings, self.cache, to_embed)
+        row = {digest: i for i, digest in enumerate(to_embed)}
+
+        # Schritt 2: Alte Chunks löschen und neue per binärem COPY schreiben
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM document_chunks WHERE document_id = %s", (document_id,)
+            )
+            with cur.copy(
+                "COPY document_chunks (document_id, chunk_index, chunk_text, chunk_embedding) "
+                "FROM STDIN WITH (FORMAT BINARY)"
+            ) as copy:
+                copy.set_types(["int4", "int4", "text", "vector"])
+                for chunk_index, (chunk, digest) in enumerate(zip(chunks, digests)):
+                    copy.write_row((document_id, chunk_index, chunk, vectors[row[digest]]))
+            cur.execute(
+                "UPDATE documents SET chunk_count = %s WHERE id = %s",
+                (len(chunks), document_id),
+            )
+
+        # Schritt 3: Index anlegen oder neu bauen, falls die Tabelle gewachsen ist
+        if self.auto_index:
+            self.create_index()
+        return True
+
+    def delete_document(self, document_id):
+        """Entfernt alle Chunks eines Dokuments; gibt deren Anzahl zurück."""
+        with self.pool.connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM document_chunks WHERE document_id = %s", (document_id,)
+            ).rowcount
+            conn.execute(
+                "UPDATE documents SET chunk_count = 0 WHERE id = %s", (document_id,)
+            )
+        return deleted
+
+    def search_similar(self, query, limit=5, similarity_threshold=0.0):
+        """Ähnlichste Chunks nach Kosinus-Ähnlichkeit, mit Dateiname."""
+        vector = self.embeddings.encode_query(query)[0]
+        with self.pool.connection() as conn:
+            # Suchparameter nur für diese Transaktion
+            conn.execute(
+                "SELECT set_config('hnsw.ef_search', %s, true), "
+                "set_config('ivfflat.probes', %s, true)",
+                (str(self.ef_search), str(self.probes)),
+            )
+            rows = conn.execute(
+                """
+                SELECT c.document_id, c.chunk_index, c.chunk_text, d.filename,
+                       1 - (c.chunk_embedding <=> %(vector)s) AS similarity
+                FROM document_chunks c
+                JOIN documents d ON d.id = c.document_id
+                ORDER BY c.chunk_embedding <=> %(vector)s
+                LIMIT %(limit)s
+                """,
+                {"vector": vector, "limit": limit},
+            ).fetchall()
+
+        # Schwelle erst hier, ein WHERE auf die Distanz verhindert den Indexscan
+        return [
+            {
+                "document_id": document_id,
+                "chunk_index": chunk_index,
+                "text": text,
+                "filename": filename,
+                "similarity": float(similarity),
+            }
+            for document_id, chunk_index, text, filename, similarity in rows
+            if similarity >= similarity_threshold
+        ]
+
+    def _index_info(self, conn):
+        """(Methode, Optionen) des Vektorindex oder None."""
+        row = conn.execute(
+            """
+            SELECT am.amname, c.reloptions
+            FROM pg_class c JOIN pg_am am ON am.oid = c.relam
+            WHERE c.relname = %s
+            """,
+            (INDEX_NAME,),
+        ).fetchone()
+        if row is None:
+            return None
+        method, options = row
+        return method, dict(option.split("=", 1) for option in options or [])
+
+    def create_index(self):
+        """
+        Bringt den Vektorindex auf den zur Tabellengröße passenden Stand.
+        Gibt True zurück, wenn der Index danach passt (auch ohne Änderung).
+        """
+        if not self._index_lock.acquire(blocking=False):
+            return True  # Ein anderer Thread baut gerade
+        try:
+            with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                if not conn.execute(
+                    "SELECT pg_try_advisory_lock(%s)", (INDEX_LOCK_KEY,)
+                ).fetchone()[0]:
+                    return True  # Ein anderer Prozess baut gerade
+                try:
+                    return self._update_index(conn)
+                finally:
+                    conn.execute("SELECT pg_advisory_unlock(%s)", (INDEX_LOCK_KEY,))
+        except psycopg.Error as e:
+            print(f"Fehler beim Indexaufbau: {e}")
+            return False
+        finally:
+            self._index_lock.release()
+
+    def _update_index(self, conn):
+        rows = conn.execute("SELECT count(*) FROM document_chunks").fetchone()[0]
+        current = self._index_info(conn)
+
+        if rows < self.index_min_rows:
+            # Exakte Suche ist hier schnell genug. Ein ivfflat-Index, der auf
+            # (fast) leerer Tabelle trainiert wurde, kostet nur Recall.
+            if current is not None and current[0] == "ivfflat":
+                print(f"Entferne ivfflat-Index ({rows} Chunks, exakte Suche)")
+                conn.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+                    sql.Identifier(INDEX_NAME)
+                ))
+            return True
+
+        if self.index_type == "hnsw":
+            if current is not None and current[0] == "hnsw":
+                return True
+            options = {"m": self.hnsw_m, "ef_construction": self.ef_construction}
+        else:
+            lists = ivfflat_lists(rows)
+            if current is not None and current[0] == "ivfflat":
+                built = int(current[1].get("lists", 100))
+                if lists / 2 <= built <= lists * 2:
+                    return True
+            options = {"lists": lists}
+
+        print(f"Baue {self.index_type}-Index über {rows} Chunks ({options})...")
+        self._build_index(conn, options)
+        return True
+
+    def _build_index(self, conn, options):
+        """Baut den Index unter neuem Namen und tauscht ihn dann aus."""
+        building = sql.Identifier(f"{INDEX_NAME}_new")
+        conn.execute(sql.SQL("SET maintenance_work_mem = {}").format(
+            sql.Literal(self.maintenance_work_mem)
+        ))
+        # Reste eines abgebrochenen Baus (ungültiger Index) entfernen
+        conn.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(building))
+        conn.execute(sql.SQL(
+            "CREATE INDEX CONCURRENTLY {} ON document_chunks "
+            "USING {} (chunk_embedding vector_cosine_ops) WITH ({})"
+        ).format(
+            building,
+            sql.SQL(self.index_type),
+            sql.SQL(", ").join(
+                sql.SQL("{} = {}").format(sql.SQL(key), sql.Literal(value))
+                for key, value in options.items()
+            ),
+        ))
+        conn.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+            sql.Identifier(INDEX_NAME)
+        ))
+        conn.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+            building, sql.Identifier(INDEX_NAME)
+        ))
+
+    def health_check(self):
+        try:
+            with self.pool.connection() as conn:
+                version = conn.execute(
+                    "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+                ).fetchone()
+                documents = conn.execute("SELECT count(*) FROM documents").fetchone()[0]
+                chunks = conn.execute("SELECT count(*) FROM document_chunks").fetchone()[0]
+                index = self._index_info(conn)
+        except psycopg.Error as e:
+            return {"status": "unhealthy", "database_connected": False, "error": str(e)}
+
+        pool = self.pool.get_stats()
+        return {
+            "status": "healthy" if version else "unhealthy",
+            "database_connected": True,
+            "pgvector_enabled": version is not None,
+            "pgvector_version": version[0] if version else None,
+            "embedding_model": self.embeddings.model_name,
+            "documents_count": documents,
+            "chunks_count": chunks,
+            "vector_index": {"method": index[0], **index[1]} if index else None,
+            "pool": {
+                "size": pool.get("pool_size"),
+                "available": pool.get("pool_available"),
+                "waiting": pool.get("requests_waiting", 0),
+            },
+            "embedding_cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    def close(self):
+        self.pool.close()
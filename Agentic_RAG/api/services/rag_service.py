@@ -1 +1,121 @@
-# RAG (Retrieval-Augmented Generation) Service 
\ No newline at end of file
+# RAG (Retrieval-Augmented Generation) Service
+
+"""
+Hybride Suche für /query.
+
+Dichte Suche (FAISS) und lexikalische Suche (BM25) liefern je eine
+Kandidatenliste, die per Reciprocal Rank Fusion zusammengeführt wird:
+
+    score = dense_weight / (rrf_k + rang_dicht) + lexical_weight / (rrf_k + rang_bm25)
+
+Anfragen, die nur aus Codes bestehen (Produktnummern, Versionen, IDs),
+werden direkt aus dem BM25-Index beantwortet: ohne Embedding-Aufruf und
+ohne dass semantisch ähnliche Chunks den exakten Treffer verdrängen.
+"""
+
+import os
+
+from api.services.lexical_index import TOKEN_PATTERN, is_code
+from api.services.vector_service import get_vector_service, split_chunk_id
+
+
+class HybridRetriever:
+    """
+    Args:
+        vector_service: VectorService mit FAISS- und BM25-Index.
+        k: Anzahl Ergebnisse.
+        dense_weight: Gewicht der dichten Suche in der Fusion.
+        lexical_weight: Gewicht der BM25-Suche in der Fusion.
+        rrf_k: Dämpfung der Ränge (60 nach Cormack et al.).
+        candidates: Kandidaten je Suchverfahren vor der Fusion.
+        max_code_terms: Anfragen mit höchstens so vielen Tokens, die alle
+            Codes sind, gehen direkt an BM25.
+    """
+
+    def __init__(
+        self, vector_service=None, k=5, dense_weight=1.0, lexical_weight=1.0,
+        rrf_k=60, candidates=50, max_code_terms=3
+    ):
+        self.vector_service = vector_service or get_vector_service()
+        self.k = k
+        self.dense_weight = dense_weight
+        self.lexical_weight = lexical_weight
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.max_code_terms = max_code_terms
+
+    @classmethod
+    def from_env(cls, vector_service=None):
+        return cls(
+            vector_service,
+            k=int(os.getenv("RAG_TOP_K", "5")),
+            dense_weight=float(os.getenv("RAG_DENSE_WEIGHT", "1.0")),
+            lexical_weight=float(os.getenv("RAG_LEXICAL_WEIGHT", "1.0")),
+            rrf_k=int(os.getenv("RAG_RRF_K", "60")),
+            candidates=int(os.getenv("RAG_CANDIDATES", "50")),
+        )
+
+    def _exact_terms(self, query):
+        terms = TOKEN_PATTERN.findall(query.lower())
+        if 0 < len(terms) <= self.max_code_terms and all(is_code(term) for term in terms):
+            return terms
+        return None
+
+    def retrieve(self, query, k=None, dense_weight=None, lexical_weight=None):
+        """Die k besten Chunks als (Modus, [dict]) mit Scores und Rängen."""
+        k = k or self.k
+        dense_weight = self.dense_weight if dense_weight is None else dense_weight
+        lexical_weight = self.lexical_weight if lexical_weight is None else lexical_weight
+        candidates = max(k, self.candidates)
+
+        # Schritt 1: Reine Code-Anfragen exakt über BM25 beantworten
+        terms = self._exact_terms(query)
+        if terms:
+            hits = self.vector_service.lexical_search(query, k, tokens=terms)
+            results = self._results((
+                (vector_id, score, {"lexical_rank": rank})
+                for rank, (vector_id, score) in enumerate(hits, 1)
+            ), k)
+            if results:
+                return "exact", results
+
+        # Schritt 2: Beide Suchen ausführen (Gewicht 0 = Suche auslassen)
+        dense = self.vector_service.search_ids(query, candidates) if dense_weight else []
+        lexical = self.vector_service.lexical_search(query, candidates) if lexical_weight else []
+
+        # Schritt 3: Reciprocal Rank Fusion
+        fused = {}
+        for weight, hits, key in (
+            (dense_weight, dense, "dense_rank"), (lexical_weight, lexical, "lexical_rank")
+        ):
+            for rank, (vector_id, _) in enumerate(hits, 1):
+                entry = fused.setdefault(vector_id, {"score": 0.0})
+                entry["score"] += weight / (self.rrf_k + rank)
+                entry[key] = rank
+        best = sorted(fused.items(), key=lambda item: item[1]["score"], reverse=True)
+        return "hybrid", self._results((
+            (vector_id, entry.pop("score"), entry) for vector_id, entry in best
+        ), k)
+
+    def _results(self, hits, k):
+        """
+        Die ersten k Ergebnisse zu (vector_id, Score, Ränge); Chunks, die seit
+        der Suche gelöscht wurden (text() liefert None), werden übersprungen.
+        """
+        results = []
+        for vector_id, score, ranks in hits:
+            if len(results) == k:
+                break
+            text = self.vector_service.text(vector_id)
+            if text is None:
+                continue
+            document_id, chunk_index = split_chunk_id(vector_id)
+            results.append({
+                "document_id": document_id,
+                "chunk_index": chunk_index,
+                "text": text,
+                "score": score,
+                "dense_rank": ranks.get("dense_rank"),
+                "lexical_rank": ranks.get("lexical_rank"),
+            })
+        return results
@@ -1,59 +1,553 @@
 # Clean imports - only what we actually use
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
 
+import numpy as np
+
+from api.services.ann_index import (
+    IndexConfig, apply_search_params, build_index, index_kind, needs_rebuild,
+    needs_training, rebuild, remove_ids, search, train_ivfpq,
+)
+from api.services.embedding_cache import EmbeddingCache, embed_cached
+from api.services.embedding_service import EmbeddingEngine
+from api.services.index_store import (
+    append_log, load_snapshot, log_path, read_log, write_snapshot,
+)
+from api.services.lexical_index import LexicalIndex
+
+
+def make_chunk_id(document_id: int, chunk_index: int) -> int:
+    """Stabile Vektor-ID: obere 32 Bit Dokument, untere 32 Bit Chunk-Index."""
+    return (document_id << 32) | chunk_index
+
+
+def split_chunk_id(vector_id: int) -> tuple:
+    return vector_id >> 32, vector_id & 0xFFFFFFFF
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DocumentWriter:
+    """
+    Nimmt die Chunks eines Dokuments in Batches entgegen (VectorService.
+    document_writer). Jeder Batch wird sofort eingebettet und indexiert,
+    commit() entfernt danach überzählige alte Chunks und schreibt die
+    Änderungen einmal für das ganze Dokument ins Protokoll.
+    """
+
+    def __init__(self, service, document_id):
+        self.service = service
+        self.document_id = document_id
+        self.count = 0
+        self.changed = False
+
+    def add(self, chunks):
+        self.service.write_many([(self, chunks)])
+
+    def commit(self):
+        """Schließt das Dokument ab und gibt dessen ID zurück."""
+        return self.service._commit_document(self.document_id, self.count, self.changed)
 
 
 class VectorService:
-    def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'}
+    """
+    Inkrementeller FAISS-Index mit stabilen Chunk-IDs.
+
+    Jeder Chunk wird unter make_chunk_id(document_id, chunk_index) abgelegt.
+    Neue Dokumente werden angehängt, ein erneutes Speichern eines Dokuments
+    ersetzt nur dessen geänderte Chunks. Bereits bekannte Inhalte (gleicher
+    SHA-256) werden nicht neu eingebettet, ihr Vektor wird aus dem Index
+    übernommen.
+
+    Mit index_dir (oder VECTOR_INDEX_DIR) wird der Index als atomarer
+    Snapshot gespeichert und beim Start per mmap geladen. Der eingeblendete
+    Index beantwortet Suchen sofort; erst die erste Änderung lädt eine
+    veränderbare Kopie und baut die ID-Zuordnung auf.
+
+    Jedes abgeschlossene Dokument hängt nur seine Änderungen an das
+    Protokoll des Snapshots an (index_store.append_log), der Aufwand wächst
+    mit der Änderung statt mit dem Korpus. Übersteigt das Protokoll
+    compact_ratio der Chunks im Index (mindestens compact_min Einträge),
+    wird es in einen neuen Snapshot verdichtet. Beim Start wird das
+    Protokoll auf den Snapshot angewendet.
+
+    Mit EMBEDDING_CACHE_DIR werden neue Inhalte zuerst im Embedding-Cache
+    gesucht, auch wenn sie nicht mehr im Index stehen (z.B. nach dem Löschen
+    und erneuten Hochladen eines Dokuments).
+
+    Der Indextyp (flat, hnsw, ivfpq) kommt aus VECTOR_INDEX_TYPE, siehe
+    ann_index. IVF-PQ wird trainiert, sobald genug Vektoren vorhanden sind;
+    bis dahin sucht der Service exakt auf einem flachen Index. Gelöschte
+    HNSW-Knoten bleiben als Tombstones, bis ihr Anteil rebuild_ratio
+    übersteigt und der Graph neu aufgebaut wird.
+
+    Parallel zum Vektorindex wird ein BM25-Index (lexical_index) gepflegt
+    und im selben Snapshot gespeichert.
+
+    Schreibzugriffe (Einfügen, Löschen, Snapshots) laufen nacheinander unter
+    _write_lock. Suchen nehmen nur _lock, den Schreiber allein zum Einhängen
+    fertig berechneter Änderungen halten; Einbetten und Snapshot-Schreiben
+    blockieren /query damit nicht.
+    """
+
+    def __init__(
+        self, index_dir=None, autosave=True, embeddings=None, cache=None,
+        index_config=None, compact_ratio=None, compact_min=None
+    ):
+        # Batchgröße, Längensortierung und Worker-Pool über EMBEDDING_* (.env)
+        self.embeddings = embeddings or EmbeddingEngine.from_env()
+        # Embedding-Cache auf der Platte, aktiv mit EMBEDDING_CACHE_DIR
+        if cache is None:
+            cache = EmbeddingCache.from_env(
+                self.embeddings.model_name, self.embeddings.dimension
+            )
+        self.cache = cache
+        self.index_config = index_config or IndexConfig.from_env()
+
+        self.index_dir = index_dir or os.getenv("VECTOR_INDEX_DIR")
+        self.autosave = autosave
+        # Protokoll verdichten ab max(compact_min, compact_ratio * Chunks)
+        self.compact_ratio = compact_ratio if compact_ratio is not None else float(
+            os.getenv("VECTOR_COMPACT_RATIO", "0.25")
+        )
+        self.compact_min = compact_min if compact_min is not None else int(
+            os.getenv("VECTOR_COMPACT_MIN", "10000")
         )
-        
-        self.vector_store = None  # Wird erstellt wenn erste Dokumente kommen
-    
+        self.index = None  # Wird erstellt wenn erste Dokumente kommen
+        self.hashes = {}  # vector_id -> content hash
+        self.texts = {}  # vector_id -> Text, sofern nicht im Snapshot
+        self.documents = {}  # document_id -> set der vector_ids
+        self.hash_ids = {}  # content hash -> set der vector_ids
+        # Nur wachsend, damit die ID eines gelöschten Dokuments nie erneut
+        # vergeben wird; steht in meta.json des Snapshots
+        self.next_document_id = 1
+        self._lock = threading.Lock()  # Suchen gegen Änderungen am Index
+        self._write_lock = threading.Lock()  # Schreiber untereinander
+        self._deferred = 0  # offene deferred_save()-Blöcke
+        self._dirty = False
+        self._pending = []  # Protokolleinträge seit dem letzten append_log
+        self._logged = 0  # Einträge im Protokoll des aktuellen Snapshots
+
+        self.lexical = LexicalIndex()
+        self.snapshot = load_snapshot(self.index_dir) if self.index_dir else None
+        self._writable = self.snapshot is None
+        if self.snapshot is not None:
+            self.index = self.snapshot.index
+            apply_search_params(self.index_config, self.index)
+            self.next_document_id = self.snapshot.meta.get("next_document_id") or (
+                # Älterer Snapshot ohne Zähler: höchste vorhandene ID + 1
+                (int(self.snapshot.ids[-1]) >> 32) + 1 if len(self.snapshot) else 1
+            )
+            self.lexical = LexicalIndex.load(self.snapshot.path)
+            if self.lexical is None:
+                # Snapshot ohne BM25-Index: einmalig aus den Texten aufbauen
+                self.lexical = LexicalIndex()
+                for vector_id, _ in self.snapshot.entries():
+                    self.lexical.add(vector_id, self.snapshot.text(vector_id))
+            records = read_log(log_path(self.index_dir, self.snapshot.path.name))
+            if records:
+                self._make_writable()
+                self._replay(records)
+                print(f"Änderungsprotokoll angewendet: {len(records)} Einträge")
+            print(f"Vector Store geladen: {len(self)} Chunks")
+
+    def __len__(self):
+        """Anzahl gespeicherter Chunks."""
+        return len(self.hashes) if self._writable else len(self.snapshot)
+
     def create_index(self):
         pass
-    
-    def store_chunks(self, chunks):
-        # Schritt 1: Leere Liste für Documents
-        documents = []
-        
-        # Schritt 2: Jeden String-Chunk in ein Document-Objekt umwandeln
-        for chunk in chunks:
-            doc = Document(page_content=chunk)
-            documents.append(doc)
-        
-        # Schritt 3: FAISS mit Documents erstellen
-        vector_store = FAISS.from_documents(
-            documents=documents,  # Jetzt die Document-Objekte!
-            embedding=self.embeddings
+
+    def _make_writable(self):
+        """Ersetzt den mmap-Index durch eine Kopie und baut die Zuordnung auf."""
+        if self._writable:
+            return
+        index = self.snapshot.load_index()
+        apply_search_params(self.index_config, index)
+        with self._lock:
+            self.index = index
+        for vector_id, digest in self.snapshot.entries():
+            self.hashes[vector_id] = digest
+            self.documents.setdefault(split_chunk_id(vector_id)[0], set()).add(vector_id)
+            self.hash_ids.setdefault(digest, set()).add(vector_id)
+        self._writable = True
+
+    def _replay(self, records):
+        """Wendet das Änderungsprotokoll beim Start auf den Snapshot an."""
+        upserts = {}  # vector_id -> (text, digest, vector), bis zum nächsten delete
+
+        def apply_upserts():
+            if upserts:
+                ids = np.fromiter(upserts, dtype=np.int64, count=len(upserts))
+                matrix = np.stack([vector for _, _, vector in upserts.values()])
+                self._add(ids, matrix, {
+                    vector_id: (text, digest)
+                    for vector_id, (text, digest, _) in upserts.items()
+                })
+                upserts.clear()
+
+        for record in records:
+            if record[0] == "upsert":
+                _, vector_id, digest, text, vector = record
+                upserts[vector_id] = (text, digest, vector)
+            elif record[0] == "delete":
+                apply_upserts()
+                if record[1] in self.hashes:
+                    self._remove([record[1]])
+            else:
+                self.next_document_id = max(
+                    self.next_document_id, record[2]["next_document_id"]
+                )
+        apply_upserts()
+        self._refresh_index()
+        self._logged = len(records)
+
+    def _text(self, vector_id):
+        text = self.texts.get(vector_id)
+        if text is None:
+            text = self.snapshot.text(vector_id)
+        return text
+
+    def document_writer(self, document_id=None):
+        """
+        Writer, der die Chunks eines Dokuments batchweise entgegennimmt,
+        z.B. während eines Uploads. Ohne document_id wird eine neue ID
+        vergeben und sofort reserviert; IDs gelöschter Dokumente werden
+        nicht wiederverwendet.
+        """
+        with self._write_lock:
+            self._make_writable()
+            if document_id is None:
+                document_id = self.next_document_id
+            self.next_document_id = max(self.next_document_id, document_id + 1)
+            self.documents.setdefault(document_id, set())
+        return DocumentWriter(self, document_id)
+
+    def store_chunks(self, chunks, document_id=None):
+        """
+        Speichert die Chunks eines Dokuments und gibt dessen ID zurück.
+
+        Ohne document_id wird eine neue ID vergeben. Für ein bekanntes
+        Dokument werden unveränderte Chunks übersprungen, geänderte ersetzt
+        und überzählige alte Chunks gelöscht.
+        """
+        writer = self.document_writer(document_id)
+        writer.add(chunks)
+        return writer.commit()
+
+    def write_many(self, batches):
+        """
+        Schreibt [(DocumentWriter, chunks)] mit einem gemeinsamen Embedding-
+        Aufruf, z.B. die Chunks mehrerer Dateien eines Batch-Uploads.
+        """
+        parts = []
+        counts = {}  # writer -> Chunk-Index nach diesem Aufruf
+        for writer, chunks in batches:
+            chunks = list(chunks)
+            offset = counts.get(writer, writer.count)
+            parts.append((writer.document_id, offset, chunks))
+            counts[writer] = offset + len(chunks)
+        changed = self._store_batch(parts)
+        for writer, count in counts.items():
+            writer.count = count
+            if writer.document_id in changed:
+                writer.changed = True
+
+    def _store_batch(self, parts):
+        """
+        Schreibt [(document_id, offset, chunks)], die Chunks jeweils ab
+        Chunk-Index offset. Gibt die geänderten Dokument-IDs zurück.
+        """
+        with self._write_lock:
+            self._make_writable()
+
+            # Schritt 1: Nur neue oder geänderte Chunks bestimmen
+            new_ids = {}
+            for document_id, offset, chunks in parts:
+                for chunk_index, chunk in enumerate(chunks, offset):
+                    vector_id = make_chunk_id(document_id, chunk_index)
+                    digest = content_hash(chunk)
+                    if self.hashes.get(vector_id) != digest:
+                        new_ids[vector_id] = (chunk, digest)
+            if not new_ids:
+                return set()
+
+            # Schritt 2: Vektoren bekannter Inhalte übernehmen, auch von
+            # Chunks, die gleich ersetzt werden (verschobene Absätze)
+            ids = np.fromiter(new_ids, dtype=np.int64, count=len(new_ids))
+            matrix = np.empty(
+                (len(ids), self.embeddings.dimension), dtype=np.float32
+            )
+            to_embed = {}  # content hash -> Text, jeder Inhalt nur einmal
+            embed_rows = []  # (Zeile in matrix, content hash)
+            for row, (chunk, digest) in enumerate(new_ids.values()):
+                known = self.hash_ids.get(digest)
+                if known:
+                    matrix[row] = self.index.reconstruct(next(iter(known)))
+                else:
+                    to_embed.setdefault(digest, chunk)
+                    embed_rows.append((row, digest))
+
+        # Schritt 3: Nur wirklich neue Inhalte einbetten, direkt in matrix;
+        # ohne Sperre, Suchen und andere Schreiber laufen weiter
+        if to_embed:
+            embedded = embed_cached(self.embeddings, self.cache, to_embed)
+            position = {digest: i for i, digest in enumerate(to_embed)}
+            rows = np.array([row for row, _ in embed_rows], dtype=np.int64)
+            matrix[rows] = embedded[[position[d] for _, d in embed_rows]]
+
+        with self._write_lock:
+            # Schritt 4: Zwischenzeitlich von einem anderen Schreiber mit
+            # gleichem Inhalt gespeicherte Chunks auslassen
+            keep = np.array([
+                self.hashes.get(vector_id) != digest
+                for vector_id, (_, digest) in new_ids.items()
+            ])
+            if not keep.all():
+                ids, matrix = ids[keep], matrix[keep]
+                new_ids = {
+                    vector_id: entry
+                    for (vector_id, entry), kept in zip(new_ids.items(), keep) if kept
+                }
+            if not new_ids:
+                return set()
+
+            # Schritt 5: Ersetzte Chunks entfernen und alle unter stabilen
+            # IDs anhängen, als ein Schritt unter _lock; schlägt das
+            # Einbetten fehl, bleibt der alte Stand vollständig erhalten
+            with self._lock:
+                changed = self._add(ids, matrix, new_ids)
+            self._record(
+                ("upsert", vector_id, digest, chunk, vector)
+                for (vector_id, (chunk, digest)), vector in zip(new_ids.items(), matrix)
+            )
+
+            self._refresh_index()
+            return changed
+
+    def _add(self, ids, matrix, new_ids):
+        """
+        Ersetzt bzw. ergänzt die Chunks new_ids {vector_id: (Text, Hash)}
+        mit den Vektoren aus matrix; Aufrufer hält beide Sperren. Gibt die
+        geänderten Dokument-IDs zurück.
+        """
+        self._remove([vector_id for vector_id in new_ids if vector_id in self.hashes])
+        if self.index is None:
+            self.index = build_index(self.index_config, matrix.shape[1])
+        self.index.add_with_ids(matrix, ids)
+        changed = set()
+        for vector_id, (chunk, digest) in new_ids.items():
+            document_id = split_chunk_id(vector_id)[0]
+            self.hashes[vector_id] = digest
+            self.texts[vector_id] = chunk
+            self.documents.setdefault(document_id, set()).add(vector_id)
+            self.hash_ids.setdefault(digest, set()).add(vector_id)
+            self.lexical.add(vector_id, chunk)
+            changed.add(document_id)
+        return changed
+
+    def _refresh_index(self):
+        """
+        Trainiert IVF-PQ bzw. baut den HNSW-Graphen ohne Tombstones neu,
+        sobald nötig. Gerechnet wird unter _write_lock auf dem bestehenden
+        Index, Suchen laufen bis zum Austausch weiter.
+        """
+        if self.index is None:
+            return
+        if needs_training(self.index_config, self.index):
+            print(f"Trainiere IVF-PQ auf {self.index.ntotal} Vektoren...")
+            index = train_ivfpq(self.index_config, self.index)
+        elif needs_rebuild(self.index_config, self.index, len(self.hashes)):
+            print(f"Baue HNSW-Graphen ohne {self.index.ntotal - len(self.hashes)} gelöschte Knoten neu...")
+            index = rebuild(self.index_config, self.index)
+        else:
+            return
+        with self._lock:
+            self.index = index
+
+    def _commit_document(self, document_id, count, changed):
+        """Löscht alte Chunks ab Index count und speichert bei Änderungen."""
+        with self._write_lock:
+            stale = [
+                vector_id for vector_id in self.documents.get(document_id, ())
+                if split_chunk_id(vector_id)[1] >= count
+            ]
+            with self._lock:
+                self._remove(stale)
+            self._record(("delete", vector_id) for vector_id in stale)
+            self._refresh_index()
+            if changed or stale:
+                self._autosave()
+        return document_id
+
+    def index_type(self):
+        """Aktueller Indextyp; bei ivfpq vor dem Training noch "flat"."""
+        return index_kind(self.index) if self.index is not None else None
+
+    def cache_stats(self):
+        """Trefferquote des Embedding-Caches oder None ohne Cache."""
+        return self.cache.stats() if self.cache is not None else None
+
+    def delete_document(self, document_id):
+        """Entfernt alle Chunks eines Dokuments; gibt deren Anzahl zurück."""
+        with self._write_lock:
+            self._make_writable()
+            ids = list(self.documents.get(document_id, ()))
+            with self._lock:
+                self._remove(ids)
+            self._record(("delete", vector_id) for vector_id in ids)
+            self._refresh_index()
+            self.documents.pop(document_id, None)
+            if ids:
+                self._autosave()
+            return len(ids)
+
+    def _remove(self, vector_ids):
+        """Entfernt Chunks aus Index und Zuordnung; Aufrufer hält beide Sperren."""
+        if not vector_ids:
+            return
+        self.index = remove_ids(self.index_config, self.index, vector_ids)
+        for vector_id in vector_ids:
+            digest = self.hashes.pop(vector_id)
+            self.texts.pop(vector_id, None)
+            self.lexical.remove(vector_id)
+            self.documents[split_chunk_id(vector_id)[0]].discard(vector_id)
+            same_content = self.hash_ids[digest]
+            same_content.discard(vector_id)
+            if not same_content:
+                del self.hash_ids[digest]
+
+    def _record(self, records):
+        """Merkt Änderungen für das Protokoll vor, sofern gespeichert wird."""
+        if self.autosave and self.index_dir:
+            self._pending.extend(records)
+
+    def _autosave(self):
+        if not (self.autosave and self.index_dir):
+            return
+        if self._deferred:
+            self._dirty = True
+        else:
+            self._flush()
+
+    def _flush(self):
+        """
+        Hängt die vorgemerkten Änderungen an das Protokoll an oder verdichtet
+        alles in einen neuen Snapshot, wenn das Protokoll zu groß würde.
+        """
+        logged = self._logged + len(self._pending)
+        if self.snapshot is None or logged > max(
+            self.compact_min, self.compact_ratio * len(self.hashes)
+        ):
+            self._save()
+        elif self._pending:
+            self._pending.append(("meta", 0, {"next_document_id": self.next_document_id}))
+            append_log(log_path(self.index_dir, self.snapshot.path.name), self._pending)
+            self._logged = logged
+            self._pending = []
+
+    @contextmanager
+    def deferred_save(self):
+        """
+        Fasst alle Änderungen im Block zu einem Protokollblock (oder
+        Snapshot) zusammen, z.B. für einen Batch-Upload vieler Dateien.
+        """
+        with self._write_lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._write_lock:
+                self._deferred -= 1
+                if not self._deferred and self._dirty:
+                    self._dirty = False
+                    self._flush()
+
+    def save(self):
+        """Schreibt den aktuellen Stand als Snapshot nach index_dir (verdichtet das Protokoll)."""
+        with self._write_lock:
+            self._save()
+
+    def _save(self):
+        """
+        Schreibt den Snapshot unter _write_lock: andere Schreiber warten, der
+        Stand bleibt so während des Schreibens unverändert. Suchen laufen
+        weiter, erst der Austausch von Snapshot und BM25-Index nimmt _lock.
+        """
+        if not self.index_dir or not self._writable or self.index is None:
+            return
+        entries = (
+            (vector_id, self.hashes[vector_id], self._text(vector_id))
+            for vector_id in sorted(self.hashes)
         )
-        
-        # Schritt 4: In der Instanz speichern (überschreibt immer)
-        self.vector_store = vector_store
-        
-        # Optional: Erfolg zurückgeben
-        return True
-    
-    
-    def search_similar(self, query):
+        write_snapshot(
+            self.index_dir, self.index, entries, lexical=self.lexical,
+            meta={"next_document_id": self.next_document_id},
+        )
+        # Das Protokoll des alten Snapshots ist jetzt enthalten
+        self._pending = []
+        self._logged = 0
+        snapshot = load_snapshot(self.index_dir)
+        lexical = LexicalIndex.load(snapshot.path)
+        with self._lock:
+            self.snapshot = snapshot
+            # Verdichteter BM25-Index aus dem Snapshot statt der Deltas
+            self.lexical = lexical
+            # Texte liegen jetzt im Snapshot und müssen nicht im Speicher bleiben
+            self.texts.clear()
+
+    def search_similar(self, query, k=2):
         # Schritt 1: Prüfen ob Vector Store existiert
-        if self.vector_store is None:
+        if self.index is None or self.index.ntotal == 0:
             print("Kein Vector Store vorhanden. Erst Dokumente hinzufügen!")
             return []
-        
-        # Schritt 2:
-        similar_docs = self.vector_store.similarity_search(query, k=2)
-        
-        # Schritt 3: Ergebnisse formatieren
-        results = []
-        for doc in similar_docs:
-            results.append(doc.page_content)  # Nur den Text
-        
-        return results
-        
-        
 
+        # Schritt 2 und 3: k nächste Vektoren suchen, nur den Text zurückgeben;
+        # inzwischen gelöschte Chunks fallen weg
+        texts = (self.text(vector_id) for vector_id, _ in self.search_ids(query, k))
+        return [text for text in texts if text is not None]
+
+    def search_ids(self, query, k):
+        """[(vector_id, Distanz)] der k nächsten Chunks (dichte Suche)."""
+        if self.index is None or self.index.ntotal == 0:
+            return []
+        query_vector = self.embeddings.encode_query(query)
+        with self._lock:
+            distances, ids = search(self.index_config, self.index, query_vector, k)
+        return [
+            (int(vector_id), float(distance))
+            for vector_id, distance in zip(ids[0], distances[0])
+            if vector_id != -1
+        ]
+
+    def lexical_search(self, query, k, tokens=None):
+        """[(vector_id, BM25-Score)] der k besten Chunks (lexikalische Suche)."""
+        with self._lock:
+            return self.lexical.search(query, k, tokens=tokens)
+
+    def text(self, vector_id):
+        """
+        Text eines Chunks oder None, wenn er seit der Suche gelöscht wurde
+        (der Snapshot kann inzwischen verdichtet worden sein).
+        """
+        with self._lock:
+            if self._writable and vector_id not in self.hashes:
+                return None
+            return self._text(vector_id)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_vector_service():
+    """Gemeinsamer VectorService der API, wird beim ersten Aufruf geladen."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = VectorService()
+        return _service
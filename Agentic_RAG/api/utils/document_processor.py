@@ -4,17 +4,26 @@ import os
 from fastapi import UploadFile
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract plain text from PDF - simple and efficient for RAG"""
+# Uploads werden in Stücken dieser Größe auf die Platte geschrieben
+SPOOL_PIECE_SIZE = 1024 * 1024
+
+def iter_pdf_pages(pdf_path: str):
+    """Yield the plain text of each PDF page - only one page in memory at a time"""
     doc = fitz.open(pdf_path)
     try:
-        text = ""
         for page in doc:
-            text += page.get_text() + "\n"
-        return text.strip()
+            yield page.get_text()
     finally:
         doc.close()
 
+def count_pdf_pages(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """Extract plain text from PDF - simple and efficient for RAG"""
+    return "\n".join(iter_pdf_pages(pdf_path)).strip()
+
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list:
     """Split text into overlapping chunks using LangChain's intelligent splitter"""
     text_splitter = RecursiveCharacterTextSplitter(
@@ -23,28 +32,36 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list:
     )
     return text_splitter.split_text(text)
 
-async def process_upload_file(file: UploadFile) -> dict:
-    """Convert UploadFile to text chunks for RAG processing"""
-    
-    # Create temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-        content = await file.read()
-        temp_file.write(content)
-        temp_path = temp_file.name
-    
-    try:
-        # Extract text from PDF
-        text = extract_text_from_pdf(temp_path)
-        
-        # Split into chunks
-        chunks = chunk_text(text)
-        
-        return {
-            "filename": file.filename,
-            "total_text_length": len(text),
-            "chunks_count": len(chunks),
-            "chunks": chunks
-        }
-    finally:
-        # Cleanup
-        os.unlink(temp_path)
+def iter_chunks(pages, chunk_size: int = 1000, overlap: int = 200):
+    """
+    Chunk a stream of page texts, yielding (page_number, chunk).
+
+    The last chunk of a page may continue on the next page, so it is kept
+    and split again together with the next page. Only one page plus one
+    chunk is held in memory; page_number is the page the chunk ends on.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap
+    )
+    buffer = ""
+    page_number = 0
+    for page_number, text in enumerate(pages, 1):
+        buffer = f"{buffer}\n{text}" if buffer else text
+        chunks = text_splitter.split_text(buffer)
+        for chunk in chunks[:-1]:
+            yield page_number, chunk
+        buffer = chunks[-1] if chunks else ""
+    if buffer:
+        yield page_number, buffer
+
+async def spool_upload(file: UploadFile, suffix: str = ".pdf") -> str:
+    """Write an upload to a temp file in fixed-size pieces; returns its path"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        try:
+            while piece := await file.read(SPOOL_PIECE_SIZE):
+                temp_file.write(piece)
+        except BaseException:
+            os.unlink(temp_file.name)
+            raise
+        return temp_file.name
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the embedding path of the ingestion.
+Compares LangChain's HuggingFaceEmbeddings (the previous path) with the
+EmbeddingEngine in several configurations and prints chunks per second.
+
+    python benchmark_embeddings.py --chunks 2000
+    python benchmark_embeddings.py --pdf test_documents/report.pdf
+"""
+
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from api.services.embedding_service import EmbeddingEngine
+
+WORDS = (
+    "Umsatz Quartal Bericht Analyse Kunde Vertrag Risiko Strategie Prognose "
+    "Markt Produkt Entwicklung Prozess Daten Modell Ergebnis Ziel Projekt "
+    "revenue growth pipeline retrieval embedding vector index latency"
+).split()
+
+
+def synthetic_chunks(count, seed=42):
+    """Chunks with mixed lengths, like real splitter output (20-250 words)."""
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 250)))
+        for _ in range(count)
+    ]
+
+
+def pdf_chunks(path):
+    from api.utils.document_processor import chunk_text, extract_text_from_pdf
+    return chunk_text(extract_text_from_pdf(path))
+
+
+def measure(name, encode, chunks):
+    encode(chunks[:32])  # Warm-up (model load, pool start)
+    start = time.perf_counter()
+    vectors = encode(chunks)
+    seconds = time.perf_counter() - start
+    print(f"   {name:<38} {len(chunks) / seconds:8.1f} chunks/s  ({seconds:.2f}s)")
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def run_benchmark(chunks, batch_size, workers, model_name="all-MiniLM-L6-v2"):
+    print(f"🚀 Embedding {len(chunks)} chunks (batch size {batch_size})")
+    print("=" * 70)
+    results = {}
+
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    baseline = HuggingFaceEmbeddings(
+        model_name=model_name, model_kwargs={'device': 'cpu'}
+    )
+    results["baseline"] = measure(
+        "HuggingFaceEmbeddings (previous path)", baseline.embed_documents, chunks
+    )
+
+    configs = [
+        ("EmbeddingEngine", dict(sort_by_length=False, workers=1)),
+        ("EmbeddingEngine + length sorting", dict(sort_by_length=True, workers=1)),
+    ]
+    if workers > 1:
+        configs.append((
+            f"EmbeddingEngine + pool ({workers} processes)",
+            dict(sort_by_length=True, workers=workers, pool_threshold=1),
+        ))
+    for name, kwargs in configs:
+        engine = EmbeddingEngine(
+            model_name=model_name, batch_size=batch_size, **kwargs
+        )
+        try:
+            results[name] = measure(name, engine.encode, chunks)
+        finally:
+            engine.close()
+
+    # all-MiniLM-L6-v2 normalizes itself, so the vectors should match
+    reference = results["baseline"]
+    for name, vectors in results.items():
+        if name != "baseline":
+            error = float(np.abs(vectors - reference).max())
+            print(f"   max. deviation {name}: {error:.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding benchmark")
+    parser.add_argument("--pdf", help="PDF instead of synthetic chunks")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    chunks = pdf_chunks(args.pdf) if args.pdf else synthetic_chunks(args.chunks)
+    run_benchmark(chunks, args.batch_size, args.workers, args.model)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the FAISS index types of VectorService.
+Builds flat, HNSW and IVF-PQ indexes over the same vectors and prints build
+time, memory, query latency and recall@k against exact search.
+
+    python benchmark_index.py --vectors 200000
+    python benchmark_index.py --npy embeddings.npy --k 10
+"""
+
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from api.services.ann_index import (
+    IndexConfig, apply_search_params, build_index, train_ivfpq,
+)
+
+
+def synthetic_vectors(count, dimension, seed=42):
+    """Normalized vectors around random centers, similar to text embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 100), dimension))
+    vectors = centers[rng.integers(len(centers), size=count)]
+    vectors += 0.5 * rng.standard_normal((count, dimension))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def build(config, vectors, ids):
+    index = build_index(config, vectors.shape[1])
+    index.add_with_ids(vectors, ids)
+    if config.index_type == "ivfpq":
+        index = train_ivfpq(config, index)
+    return index
+
+
+def measure(name, index, queries, truth, k):
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+    recall = np.mean([
+        len(np.intersect1d(result, expected)) / k
+        for result, expected in zip(found, truth)
+    ])
+    memory = len(faiss.serialize_index(index)) / 2**20
+    print(
+        f"   {name:<30} {np.percentile(latencies, 50):7.3f} ms  "
+        f"{np.percentile(latencies, 95):7.3f} ms  {memory:9.1f} MB  {recall:9.3f}"
+    )
+
+
+def run_benchmark(vectors, num_queries, k):
+    count, dimension = vectors.shape
+    ids = np.arange(count, dtype=np.int64) << 32  # wie make_chunk_id(doc, 0)
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(count, num_queries, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    print(f"🚀 {count} vectors, dimension {dimension}, {num_queries} queries, k={k}")
+    print("=" * 78)
+    print(f"   {'index':<30} {'p50':>10}  {'p95':>10}  {'memory':>12}  recall@{k}")
+
+    sweeps = [
+        ("flat", {}, []),
+        ("hnsw", {"hnsw_m": 32}, [("ef_search", value) for value in (16, 64, 128)]),
+        ("ivfpq", {}, [("nprobe", value) for value in (4, 16, 64)]),
+    ]
+    truth = None
+    for index_type, params, settings in sweeps:
+        config = IndexConfig(index_type, **params)
+        start = time.perf_counter()
+        index = build(config, vectors, ids)
+        print(f"   -- {index_type}: built in {time.perf_counter() - start:.1f}s")
+        if truth is None:
+            _, truth = index.search(queries, k)
+        for attribute, value in settings or [(None, None)]:
+            if attribute:
+                setattr(config, attribute, value)
+                apply_search_params(config, index)
+            label = f"{index_type} {attribute}={value}" if attribute else index_type
+            measure(label, index, queries, truth, k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FAISS index benchmark")
+    parser.add_argument("--npy", help="Real embeddings (.npy, float32) instead of synthetic vectors")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.npy:
+        vectors = np.load(args.npy).astype(np.float32)
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dimension)
+    run_benchmark(vectors, args.queries, args.k)
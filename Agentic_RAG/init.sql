@@ -28,10 +28,10 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     UNIQUE(document_id, chunk_index)
 );
 
--- Create index for fast vector similarity search
-CREATE INDEX IF NOT EXISTS chunks_embedding_idx ON document_chunks 
-USING ivfflat (chunk_embedding vector_cosine_ops)
-WITH (lists = 100);
+-- The vector similarity index (chunks_embedding_idx) is managed by
+-- PgVectorService.create_index(): an ivfflat index built on the empty table
+-- would have meaningless lists, so it is created (HNSW or ivfflat) once
+-- enough chunks exist and rebuilt when the table outgrows its lists.
 
 -- Create index for document lookup
 CREATE INDEX IF NOT EXISTS chunks_document_id_idx ON document_chunks(document_id);
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch ingestion path (ingest_service, job_service, /ingest/batch)
+
+Runs offline with the bag-of-words embedder from test_vector_service and
+small PDFs written with PyMuPDF.
+
+    python -m pytest test_ingest.py
+"""
+
+import io
+import os
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api.routes.ingest as ingest_routes
+import api.services.ingest_service as ingest_service
+import api.services.job_service as job_service
+from api.services.job_service import JobManager, QueueFull
+from api.services.vector_service import VectorService
+from test_vector_service import FakeEmbeddings, TEST_CHUNKS
+
+
+def pdf_bytes(pages):
+    """A PDF with one text page per entry of pages."""
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=9)
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings()
+
+
+@pytest.fixture
+def vector_service(tmp_path, embeddings, monkeypatch):
+    service = VectorService(index_dir=tmp_path / "index", embeddings=embeddings)
+    monkeypatch.setattr(job_service, "get_vector_service", lambda: service)
+    return service
+
+
+@pytest.fixture
+def ingest_root(tmp_path, monkeypatch):
+    root = tmp_path / "ingest"
+    root.mkdir()
+    monkeypatch.setattr(ingest_service, "INGEST_ROOT", str(root))
+    return root
+
+
+@pytest.fixture
+def manager():
+    # Threads instead of spawned processes: same code path, no worker start-up
+    manager = JobManager(workers=2, max_pending=2)
+    manager._processes.shutdown()
+    manager._processes = ThreadPoolExecutor(max_workers=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_resolve_server_path_inside_root(ingest_root):
+    (ingest_root / "docs").mkdir()
+
+    assert ingest_service.resolve_server_path("docs") == (ingest_root / "docs").resolve()
+
+
+@pytest.mark.parametrize("path", ["../outside", "docs/../../outside", "/etc"])
+def test_resolve_server_path_rejects_paths_outside_root(ingest_root, path):
+    (ingest_root.parent / "outside").mkdir()
+    (ingest_root / "docs").mkdir()
+
+    with pytest.raises(ValueError, match="outside of INGEST_ROOT"):
+        ingest_service.resolve_server_path(path)
+
+
+def test_resolve_server_path_rejects_missing_path(ingest_root):
+    with pytest.raises(ValueError, match="does not exist"):
+        ingest_service.resolve_server_path("missing.zip")
+
+
+def test_resolve_server_path_disabled_without_root(monkeypatch):
+    monkeypatch.setattr(ingest_service, "INGEST_ROOT", None)
+
+    with pytest.raises(ValueError, match="disabled"):
+        ingest_service.resolve_server_path("docs")
+
+
+def test_collect_pdfs_from_directory(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.pdf").write_bytes(pdf_bytes(["a"]))
+    (tmp_path / "sub" / "b.PDF").write_bytes(pdf_bytes(["b"]))
+    (tmp_path / "notes.txt").write_text("no pdf")
+
+    assert ingest_service.collect_pdfs(tmp_path, tmp_path / "work") == [
+        ("a.pdf", str(tmp_path / "a.pdf")),
+        ("sub/b.PDF", str(tmp_path / "sub" / "b.PDF")),
+    ]
+
+
+def test_collect_pdfs_from_zip_uses_generated_names(tmp_path):
+    archive = tmp_path / "upload.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("../../escape.pdf", pdf_bytes(["escape"]))
+        zf.writestr("sub/b.pdf", pdf_bytes(["b"]))
+        zf.writestr("readme.txt", "no pdf")
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+
+    pdfs = ingest_service.collect_pdfs(archive, workdir)
+
+    # Member names are only reported, the files land under generated names
+    assert pdfs == [
+        ("../../escape.pdf", str(workdir / "00000.pdf")),
+        ("sub/b.pdf", str(workdir / "00001.pdf")),
+    ]
+    assert sorted(p.name for p in workdir.iterdir()) == ["00000.pdf", "00001.pdf"]
+    assert not (tmp_path / "escape.pdf").exists()
+    assert (workdir / "00001.pdf").read_bytes() == zipfile.ZipFile(archive).read("sub/b.pdf")
+
+
+def test_collect_pdfs_from_tar_uses_generated_names(tmp_path):
+    archive = tmp_path / "upload.tar.gz"
+    with tarfile.open(archive, "w:gz") as tf:
+        for name, data in [("/abs/a.pdf", pdf_bytes(["a"])), ("../b.pdf", pdf_bytes(["b"]))]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+        link = tarfile.TarInfo("link.pdf")
+        link.type, link.linkname = tarfile.SYMTYPE, "/etc/passwd"
+        tf.addfile(link)
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+
+    pdfs = ingest_service.collect_pdfs(archive, workdir)
+
+    # Links are skipped, regular members are copied under generated names
+    assert pdfs == [
+        ("/abs/a.pdf", str(workdir / "00000.pdf")),
+        ("../b.pdf", str(workdir / "00001.pdf")),
+    ]
+    assert sorted(p.name for p in workdir.iterdir()) == ["00000.pdf", "00001.pdf"]
+    assert not (tmp_path / "b.pdf").exists()
+
+
+def test_collect_pdfs_rejects_other_files(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("no pdf")
+
+    with pytest.raises(ValueError, match="neither a directory, an archive nor a PDF"):
+        ingest_service.collect_pdfs(path, tmp_path)
+
+
+def test_batch_job_indexes_archive(manager, vector_service, ingest_root):
+    with zipfile.ZipFile(ingest_root / "docs.zip", "w") as zf:
+        zf.writestr("ki.pdf", pdf_bytes(TEST_CHUNKS[:2]))
+        zf.writestr("faiss.pdf", pdf_bytes(TEST_CHUNKS[3:]))
+
+    job = manager.submit_batch([], ingest_service.resolve_server_path("docs.zip"))
+    manager._threads.shutdown(wait=True)
+
+    assert job.status == "done", job.error
+    assert job.result == {"files": 2, "succeeded": 2, "failed": 0}
+    assert {file["filename"] for file in job.files} == {"ki.pdf", "faiss.pdf"}
+    assert all(file["document_id"] for file in job.files)
+    assert "FAISS" in vector_service.search_similar("FAISS Bibliothek Ähnlichkeitssuche", k=1)[0]
+    assert manager.stats()["pending"] == 0
+
+
+def test_batch_job_removes_partial_document_on_error(
+    manager, vector_service, ingest_root, monkeypatch
+):
+    monkeypatch.setattr(job_service, "INGEST_BATCH_SIZE", 1)
+    kept = vector_service.store_chunks(["Ein Dokument, das bleiben muss."])
+    write_many = vector_service.write_many
+    calls = []
+
+    def fail_second_batch(batches):
+        calls.append(batches)
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        return write_many(batches)
+
+    monkeypatch.setattr(vector_service, "write_many", fail_second_batch)
+    (ingest_root / "long.pdf").write_bytes(pdf_bytes(["Seite eins.", "Seite zwei.", "Seite drei."]))
+
+    job = manager.submit_batch([], ingest_service.resolve_server_path("long.pdf"))
+    manager._threads.shutdown(wait=True)
+
+    # The first batch reached the index, its document is removed again
+    assert job.status == "failed"
+    assert job.files[0]["status"] == "failed"
+    assert "disk full" in job.files[0]["error"]
+    assert len(vector_service) == 1
+    assert vector_service.search_similar("Seite eins", k=5) == ["Ein Dokument, das bleiben muss."]
+    assert vector_service.delete_document(kept) == 1
+
+
+def test_submit_raises_queue_full(manager, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(manager, "_run_batch", lambda job, *args: release.wait(10))
+
+    manager.submit_batch([], None)
+    manager.submit_batch([], None)
+    try:
+        with pytest.raises(QueueFull):
+            manager.submit_batch([], None)
+    finally:
+        release.set()
+
+
+class FullManager:
+    """Reports free slots but rejects the job, as when another request won the race."""
+
+    def stats(self):
+        return {"workers": 1, "pending": 0, "max_pending": 1}
+
+    def submit_batch(self, uploads, server_path=None):
+        raise QueueFull("1 ingestion jobs pending, try again later")
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(ingest_routes.router)
+    return TestClient(app)
+
+
+def test_batch_endpoint_returns_503_when_queue_full(client, monkeypatch):
+    spooled = []
+    spool_upload = ingest_routes.spool_upload
+
+    async def recording_spool(file):
+        spooled.append(await spool_upload(file))
+        return spooled[-1]
+
+    monkeypatch.setattr(ingest_routes, "get_job_manager", FullManager)
+    monkeypatch.setattr(ingest_routes, "spool_upload", recording_spool)
+
+    response = client.post(
+        "/ingest/batch",
+        files=[("files", ("a.pdf", pdf_bytes(["a"]), "application/pdf"))],
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "10"
+    assert "pending" in response.json()["error"]
+    # Spooled uploads are removed when the job is rejected
+    assert len(spooled) == 1
+    assert not any(os.path.exists(path) for path in spooled)
+
+
+def test_batch_endpoint_rejects_path_outside_root(client, ingest_root, monkeypatch):
+    monkeypatch.setattr(ingest_routes, "get_job_manager", FullManager)
+
+    response = client.post("/ingest/batch", data={"path": "../"})
+
+    assert response.status_code == 400
+    assert "outside of INGEST_ROOT" in response.json()["error"]
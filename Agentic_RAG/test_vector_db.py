@@ -7,14 +7,14 @@ Run this after starting the Docker containers to verify everything works.
 import os
 import sys
 import time
-from api.services.vector_service import VectorService
+from api.services.pg_vector_service import PgVectorService
 
-# Set environment variables for testing
-os.environ['POSTGRES_HOST'] = 'localhost'
-os.environ['POSTGRES_PORT'] = '5432'
-os.environ['POSTGRES_DB'] = 'rag_assistant'
-os.environ['POSTGRES_USER'] = 'postgres'
-os.environ['POSTGRES_PASSWORD'] = 'your_secure_password_here'
+# Set environment variables for testing (override to use a local instance)
+os.environ.setdefault('POSTGRES_HOST', 'localhost')
+os.environ.setdefault('POSTGRES_PORT', '5432')
+os.environ.setdefault('POSTGRES_DB', 'rag_assistant')
+os.environ.setdefault('POSTGRES_USER', 'postgres')
+os.environ.setdefault('POSTGRES_PASSWORD', 'your_secure_password_here')
 
 def test_vector_database():
     """Test the vector database functionality step by step."""
@@ -24,7 +24,7 @@ def test_vector_database():
     # Initialize VectorService
     try:
         print("1. Initializing VectorService...")
-        vector_service = VectorService()
+        vector_service = PgVectorService()
         print("✅ VectorService initialized successfully")
     except Exception as e:
         print(f"❌ Failed to initialize VectorService: {e}")
@@ -1,95 +1,397 @@
 #!/usr/bin/env python3
 """
-Simple test script for our FAISS VectorService
-Tests basic functionality with example data
+Tests for our FAISS VectorService
+
+Runs offline: a deterministic bag-of-words embedder stands in for the
+sentence-transformers model, so no model download is needed.
+
+    python -m pytest test_vector_service.py
 """
 
+import hashlib
 import sys
-import os
-
-# Add api directory to path so we can import our service
-sys.path.append('api')
-
-from services.vector_service import VectorService
-
-def test_vector_service():
-    """Test our VectorService with example chunks."""
-    print("🚀 Testing VectorService...")
-    print("=" * 50)
-    
-    # Initialize service
-    print("1. Initializing VectorService...")
-    try:
-        vector_service = VectorService()
-        print("✅ VectorService initialized successfully")
-    except Exception as e:
-        print(f"❌ Failed to initialize VectorService: {e}")
-        return False
-    
-    # Test with empty search (should return empty)
-    print("\n2. Testing empty search...")
-    results = vector_service.search_similar("test query")
-    if results == []:
-        print("✅ Empty search works correctly (no documents yet)")
-    else:
-        print(f"❌ Expected empty results, got: {results}")
-    
-    # Add some test chunks
-    print("\n3. Adding test documents...")
-    test_chunks = [
-        "Künstliche Intelligenz (KI) ist ein Bereich der Informatik, der sich mit der Entwicklung intelligenter Maschinen beschäftigt.",
-        "Machine Learning ist ein Teilbereich der KI, der Algorithmen verwendet, um aus Daten zu lernen.",
-        "RAG (Retrieval-Augmented Generation) kombiniert Informationsabruf mit Textgeneration für bessere AI-Antworten.",
-        "FAISS ist eine Bibliothek für effiziente Ähnlichkeitssuche in hochdimensionalen Vektorräumen.",
-        "Python ist eine beliebte Programmiersprache für KI und Data Science Projekte."
-    ]
-    
-    try:
-        success = vector_service.store_chunks(test_chunks)
-        if success:
-            print(f"✅ Successfully stored {len(test_chunks)} chunks")
-        else:
-            print("❌ Failed to store chunks")
-            return False
-    except Exception as e:
-        print(f"❌ Error storing chunks: {e}")
-        return False
-    
-    # Test searches
-    print("\n4. Testing similarity searches...")
-    test_queries = [
-        "Was ist künstliche Intelligenz?",
-        "Wie funktioniert Machine Learning?", 
-        "Was ist RAG?",
-        "Python Programmierung",
-        "Vektor Suche"
-    ]
-    
-    for query in test_queries:
-        print(f"\n   Query: '{query}'")
-        try:
-            results = vector_service.search_similar(query)
-            print(f"   Found {len(results)} results:")
-            for i, result in enumerate(results, 1):
-                # Show first 80 characters of each result
-                preview = result[:80] + "..." if len(result) > 80 else result
-                print(f"   {i}. {preview}")
-        except Exception as e:
-            print(f"   ❌ Error searching: {e}")
-    
-    print("\n" + "=" * 50)
-    print("🎉 VectorService test completed!")
-    print("\nNext steps:")
-    print("- VectorService is working ✅")
-    print("- Ready for RAG Tools implementation")
-    print("- Ready for Agent integration")
-    
-    return True
+import threading
+
+import numpy as np
+import pytest
+
+from api.services.ann_index import IndexConfig, index_kind
+from api.services.embedding_cache import EmbeddingCache
+from api.services.index_store import log_path
+from api.services.lexical_index import TOKEN_PATTERN
+from api.services.rag_service import HybridRetriever
+from api.services.vector_service import VectorService
+
+TEST_CHUNKS = [
+    "Künstliche Intelligenz (KI) ist ein Bereich der Informatik, der sich mit der Entwicklung intelligenter Maschinen beschäftigt.",
+    "Machine Learning ist ein Teilbereich der KI, der Algorithmen verwendet, um aus Daten zu lernen.",
+    "RAG (Retrieval-Augmented Generation) kombiniert Informationsabruf mit Textgeneration für bessere AI-Antworten.",
+    "FAISS ist eine Bibliothek für effiziente Ähnlichkeitssuche in hochdimensionalen Vektorräumen.",
+    "Python ist eine beliebte Programmiersprache für KI und Data Science Projekte."
+]
+
+
+class FakeEmbeddings:
+    """
+    Deterministic stand-in for EmbeddingEngine.
+
+    Every token gets a fixed random direction (seeded by its SHA-256), a
+    text is the normalized sum of its tokens. Texts sharing words are
+    close, which is enough to check that searches find the right chunk.
+    """
+
+    model_name = "fake-bag-of-words"
+    dimension = 256
+
+    def __init__(self):
+        self.encoded = 0  # texts passed to encode()
+        self.fail = False
+        self.gate = None  # Event that encode() waits for, if set
+        self.entered = threading.Event()
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            seed = int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "little")
+            vector += np.random.default_rng(seed).standard_normal(self.dimension)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts):
+        if self.fail:
+            raise RuntimeError("embedding backend unavailable")
+        if self.gate is not None:
+            self.entered.set()
+            self.gate.wait(10)
+        self.encoded += len(texts)
+        return np.array([self._vector(text) for text in texts], dtype=np.float32).reshape(-1, self.dimension)
+
+    def encode_query(self, query):
+        self.encoded += 1
+        return self._vector(query).reshape(1, -1)
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ("VECTOR_INDEX_DIR", "EMBEDDING_CACHE_DIR"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings()
+
+
+@pytest.fixture(params=["flat", "hnsw"])
+def index_config(request):
+    return IndexConfig(index_type=request.param)
+
+
+@pytest.fixture
+def vector_service(tmp_path, embeddings, index_config):
+    return VectorService(
+        index_dir=tmp_path / "index", embeddings=embeddings, index_config=index_config
+    )
+
+
+def test_empty_search(vector_service):
+    assert vector_service.search_similar("test query") == []
+
+
+def test_store_and_search(vector_service):
+    document_id = vector_service.store_chunks(TEST_CHUNKS)
+
+    assert document_id == 1
+    assert vector_service.index.ntotal == len(TEST_CHUNKS)
+    assert vector_service.search_similar("RAG Retrieval Generation", k=1) == [TEST_CHUNKS[2]]
+    assert vector_service.search_similar("Python Programmiersprache", k=1) == [TEST_CHUNKS[4]]
+
+
+def test_incremental_update(vector_service, embeddings):
+    document_id = vector_service.store_chunks(TEST_CHUNKS[:2])
+    before, encoded = vector_service.index.ntotal, embeddings.encoded
+
+    vector_service.store_chunks(
+        TEST_CHUNKS[:2] + ["Neuer Chunk über Vektorindizes."], document_id=document_id
+    )
+
+    # Only the new chunk is embedded and added
+    assert vector_service.index.ntotal == before + 1
+    assert embeddings.encoded == encoded + 1
+
+
+def test_delete_document(vector_service):
+    kept = vector_service.store_chunks(TEST_CHUNKS[:2])
+    document_id = vector_service.store_chunks(TEST_CHUNKS[2:])
+
+    assert vector_service.delete_document(document_id) == 3
+    assert len(vector_service) == 2
+    assert sorted(vector_service.search_similar("Was ist RAG?", k=5)) == sorted(TEST_CHUNKS[:2])
+    assert vector_service.delete_document(kept) == 2
+
+
+def test_document_ids_are_not_reused(tmp_path, vector_service, embeddings, index_config):
+    first = vector_service.store_chunks(TEST_CHUNKS[:1])
+    second = vector_service.store_chunks(TEST_CHUNKS[1:2])
+    vector_service.delete_document(second)
+
+    third = vector_service.store_chunks(TEST_CHUNKS[2:3])
+    assert (first, second, third) == (1, 2, 3)
+
+    # The counter survives a restart, even after deleting the newest document
+    vector_service.delete_document(third)
+    reloaded = VectorService(
+        index_dir=tmp_path / "index", embeddings=embeddings, index_config=index_config
+    )
+    assert reloaded.store_chunks(TEST_CHUNKS[3:4]) == 4
+
+
+def test_hnsw_deletes_are_tombstones_until_rebuild(tmp_path, embeddings):
+    index_dir = tmp_path / "index"
+    index_config = IndexConfig(index_type="hnsw", rebuild_ratio=0.5)
+    vector_service = VectorService(
+        index_dir=index_dir, embeddings=embeddings, index_config=index_config
+    )
+    first = vector_service.store_chunks(TEST_CHUNKS[:2])
+    second = vector_service.store_chunks(TEST_CHUNKS[2:])
+
+    # Deleted nodes stay in the graph but are never returned
+    vector_service.delete_document(first)
+    assert vector_service.index.ntotal == 5
+    assert sorted(vector_service.search_similar("KI", k=5)) == sorted(TEST_CHUNKS[2:])
+
+    # Replacing a chunk keeps its id searchable with the new vector
+    vector_service.store_chunks(
+        ["Geänderter Chunk über Vektorindizes."] + TEST_CHUNKS[3:], document_id=second
+    )
+    assert vector_service.index.ntotal == 6
+    assert vector_service.search_similar("Vektorindizes", k=1) == ["Geänderter Chunk über Vektorindizes."]
+    reloaded = VectorService(index_dir=index_dir, embeddings=embeddings, index_config=index_config)
+    assert sorted(reloaded.search_similar("KI", k=5)) == sorted(
+        ["Geänderter Chunk über Vektorindizes."] + TEST_CHUNKS[3:]
+    )
+
+    # Past rebuild_ratio the graph is rebuilt from the live vectors
+    vector_service.store_chunks(TEST_CHUNKS[3:4], document_id=second)
+    assert vector_service.index.ntotal == 1
+    assert vector_service.search_similar("FAISS Bibliothek", k=5) == [TEST_CHUNKS[3]]
+
+
+def test_ivfpq_trains_deletes_and_reloads(tmp_path, embeddings):
+    index_dir = tmp_path / "index"
+    index_config = IndexConfig(index_type="ivfpq", train_size=100, nlist=2, pq_bits=4)
+    vector_service = VectorService(
+        index_dir=index_dir, embeddings=embeddings, index_config=index_config,
+        compact_ratio=0, compact_min=0,
+    )
+    chunks = [f"Abschnitt {i} behandelt Thema{i} ausführlich." for i in range(120)]
+    first = vector_service.store_chunks(chunks[:60])
+    assert index_kind(vector_service.index) == "flat"
+
+    # Crossing train_size migrates to IVF-PQ with the same ids
+    second = vector_service.store_chunks(chunks[60:])
+    assert index_kind(vector_service.index) == "ivfpq"
+    assert vector_service.index.ntotal == 120
+    assert vector_service.search_similar("Thema7", k=1) == [chunks[7]]
+
+    # Deleting goes through the Hashtable direct map of the trained index
+    assert vector_service.delete_document(first) == 60
+    assert vector_service.index.ntotal == 60
+    assert vector_service.search_similar("Thema7", k=1) != [chunks[7]]
+    assert vector_service.search_similar("Thema77", k=1) == [chunks[77]]
+
+    # The compacted snapshot is searched through mmap
+    reloaded = VectorService(
+        index_dir=index_dir, embeddings=embeddings, index_config=index_config,
+        compact_ratio=0, compact_min=0,
+    )
+    assert not reloaded._writable
+    assert index_kind(reloaded.index) == "ivfpq"
+    assert len(reloaded) == 60
+    assert reloaded.search_similar("Thema77", k=1) == [chunks[77]]
+
+    # Known content is reconstructed from the writable copy, not embedded again
+    encoded = embeddings.encoded
+    third = reloaded.store_chunks([chunks[77], "Ein neuer Abschnitt über Vektorindizes."])
+    assert embeddings.encoded == encoded + 1
+    assert reloaded.delete_document(second) == 60
+    assert len(reloaded) == 2
+    assert reloaded.search_similar("Thema77", k=1) == [chunks[77]]
+    assert set(reloaded.documents) == {third}
+
+
+def test_failed_embedding_keeps_old_chunks(vector_service, embeddings):
+    document_id = vector_service.store_chunks(TEST_CHUNKS[:3])
+
+    embeddings.fail = True
+    with pytest.raises(RuntimeError):
+        vector_service.store_chunks(
+            [TEST_CHUNKS[0], "Geänderter Chunk über RAG.", TEST_CHUNKS[2]],
+            document_id=document_id,
+        )
+    embeddings.fail = False
+
+    assert vector_service.index.ntotal == 3
+    assert vector_service.search_similar("Machine Learning Algorithmen", k=1) == [TEST_CHUNKS[1]]
+
+
+def test_search_runs_while_embedding(vector_service, embeddings):
+    vector_service.store_chunks(TEST_CHUNKS)
+
+    # The writer blocks inside the embedding call ...
+    embeddings.gate = threading.Event()
+    writer = threading.Thread(
+        target=vector_service.store_chunks, args=(["Neuer Chunk über Vektorindizes."],)
+    )
+    writer.start()
+    assert embeddings.entered.wait(5)
+
+    # ... while searches still get through
+    results = []
+    search = threading.Thread(target=lambda: results.append(
+        vector_service.search_similar("RAG Retrieval Generation", k=1)
+    ))
+    search.start()
+    search.join(5)
+    searched_while_embedding = not search.is_alive()
+    embeddings.gate.set()
+    writer.join(5)
+    search.join(5)
+
+    assert searched_while_embedding
+    assert results == [[TEST_CHUNKS[2]]]
+    assert vector_service.search_similar("Vektorindizes", k=1) == ["Neuer Chunk über Vektorindizes."]
+
+
+def test_document_deleted_between_search_and_text_lookup(tmp_path, embeddings, index_config):
+    # compact_min=0: the delete compacts the log into a new snapshot
+    vector_service = VectorService(
+        index_dir=tmp_path / "index", embeddings=embeddings, index_config=index_config,
+        compact_ratio=0, compact_min=0,
+    )
+    kept = vector_service.store_chunks(TEST_CHUNKS[:2])
+    deleted = vector_service.store_chunks(TEST_CHUNKS[2:])
+    search_ids, lexical_search = vector_service.search_ids, vector_service.lexical_search
+
+    def delete_after(search):
+        def wrapper(*args, **kwargs):
+            hits = search(*args, **kwargs)
+            vector_service.delete_document(deleted)
+            return hits
+        return wrapper
+
+    # The hits still contain the deleted chunks, their texts are gone
+    vector_service.search_ids = delete_after(search_ids)
+    assert sorted(vector_service.search_similar("RAG Retrieval Generation", k=5)) == sorted(TEST_CHUNKS[:2])
+
+    vector_service.search_ids = search_ids
+    vector_service.store_chunks(TEST_CHUNKS[2:], document_id=deleted)
+    vector_service.lexical_search = delete_after(lexical_search)
+    mode, results = HybridRetriever(vector_service, k=5).retrieve("KI Python")
+    assert results
+    assert {result["document_id"] for result in results} == {kept}
+
+
+def test_snapshot_reload(tmp_path, vector_service, embeddings, index_config):
+    document_id = vector_service.store_chunks(TEST_CHUNKS)
+    vector_service.store_chunks(TEST_CHUNKS[:4], document_id=document_id)
+
+    reloaded = VectorService(
+        index_dir=tmp_path / "index", embeddings=embeddings, index_config=index_config
+    )
+    assert len(reloaded) == 4
+    assert reloaded.search_similar("RAG Retrieval Generation", k=1) == [TEST_CHUNKS[2]]
+    assert reloaded.lexical_search("python", 5) == []
+
+
+def test_commits_append_to_the_log(tmp_path, vector_service, embeddings, index_config):
+    first = vector_service.store_chunks(TEST_CHUNKS[:3])
+    snapshot = vector_service.snapshot.path.name
+
+    # Later documents only append their changes, the snapshot stays
+    second = vector_service.store_chunks(TEST_CHUNKS[3:])
+    vector_service.store_chunks(TEST_CHUNKS[:2], document_id=first)
+    assert vector_service.snapshot.path.name == snapshot
+    assert log_path(tmp_path / "index", snapshot).exists()
+
+    reloaded = VectorService(
+        index_dir=tmp_path / "index", embeddings=embeddings, index_config=index_config
+    )
+    assert len(reloaded) == 4
+    assert reloaded.search_similar("Python Programmiersprache", k=1) == [TEST_CHUNKS[4]]
+    assert reloaded.lexical_search("rag", 5) == []
+    assert reloaded.store_chunks(["Noch ein Dokument."]) == second + 1
+
+
+def test_log_is_compacted_into_a_snapshot(tmp_path, embeddings, index_config):
+    index_dir = tmp_path / "index"
+    vector_service = VectorService(
+        index_dir=index_dir, embeddings=embeddings, index_config=index_config,
+        compact_ratio=0, compact_min=3,
+    )
+    vector_service.store_chunks(TEST_CHUNKS[:1])
+    snapshot = vector_service.snapshot.path.name
+    vector_service.store_chunks(TEST_CHUNKS[1:3])
+    assert vector_service.snapshot.path.name == snapshot
+
+    # The next commit pushes the log over compact_min
+    vector_service.store_chunks(TEST_CHUNKS[3:])
+    assert vector_service.snapshot.path.name != snapshot
+    assert not log_path(index_dir, snapshot).exists()
+
+    reloaded = VectorService(index_dir=index_dir, embeddings=embeddings, index_config=index_config)
+    assert len(reloaded) == len(TEST_CHUNKS)
+
+
+def test_torn_log_tail_is_dropped(tmp_path, vector_service, embeddings, index_config):
+    vector_service.store_chunks(TEST_CHUNKS[:3])
+    vector_service.store_chunks(TEST_CHUNKS[3:])
+    path = log_path(tmp_path / "index", vector_service.snapshot.path.name)
+    size = path.stat().st_size
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00 torn block")
+
+    reloaded = VectorService(
+        index_dir=tmp_path / "index", embeddings=embeddings, index_config=index_config
+    )
+    assert len(reloaded) == len(TEST_CHUNKS)
+    assert path.stat().st_size == size
+
+
+def test_embedding_cache(tmp_path, embeddings):
+    cache_dir = tmp_path / "cache"
+    cache = EmbeddingCache(cache_dir, embeddings.model_name, embeddings.dimension)
+    VectorService(embeddings=embeddings, cache=cache).store_chunks(TEST_CHUNKS)
+
+    # Fresh service without an index: all embeddings come from the cache
+    cache = EmbeddingCache(cache_dir, embeddings.model_name, embeddings.dimension)
+    second = VectorService(embeddings=embeddings, cache=cache)
+    encoded = embeddings.encoded
+    second.store_chunks(TEST_CHUNKS)
+
+    stats = second.cache_stats()
+    assert stats["hits"] == len(TEST_CHUNKS)
+    assert stats["misses"] == 0
+    assert embeddings.encoded == encoded
+
+
+def test_hybrid_retrieval(vector_service, embeddings):
+    vector_service.store_chunks(TEST_CHUNKS)
+    vector_service.store_chunks(["Ersatzteil AB-4711 passt zu Pumpe P200, Revision v2.3."])
+    retriever = HybridRetriever(vector_service, k=3)
+
+    # Product codes are answered from the BM25 index without embedding
+    encoded = embeddings.encoded
+    mode, results = retriever.retrieve("AB-4711")
+    assert mode == "exact"
+    assert "AB-4711" in results[0]["text"]
+    assert embeddings.encoded == encoded
+
+    mode, results = retriever.retrieve("RAG Retrieval Generation")
+    assert mode == "hybrid"
+    assert results[0]["text"] == TEST_CHUNKS[2]
+    assert results[0]["dense_rank"] == 1
+
 
 if __name__ == "__main__":
-    print("🧪 VectorService Test Script")
-    print("Make sure you have installed: langchain, faiss-cpu, sentence-transformers")
-    print()
-    
-    success = test_vector_service()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -1,5 +1,11 @@
 import argparse
-from scripts.pipeline import run_pipeline
+import json
+from pathlib import Path
+from scripts.distributed.work_queue import open_queue
+from scripts.distributed.worker import run_worker
+from scripts.pipeline import STAGE_ORDER, run_pipeline
+from scripts.processing.budget import parse_deadline
+from scripts.service import serve
 from scripts.logger.loggerSetup import setup_logger
 
 
@@ -9,17 +15,119 @@ logger = setup_logger(__name__)
 def parse_args():
     parser = argparse.ArgumentParser(description="RAG Pipeline Runner")
     parser.add_argument(
-        "--input", required=True,
+        "command", nargs="?", default="run",
+        choices=["run"] + STAGE_ORDER + ["worker", "serve"],
+        help="Stage to run; 'run' (default) runs all stages in order, "
+             "'worker' processes chunks from --queue, 'serve' starts the "
+             "job service"
+    )
+    parser.add_argument(
+        "--input",
         help="Path to input PDF, e.g. 'data/input/PAK-Confluence.pdf'"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Run stages even if their inputs are unchanged"
+    )
+    parser.add_argument(
+        "--deadline", type=parse_deadline,
+        help="Finish by this time: duration ('90m'), time of day ('07:30') "
+             "or ISO datetime"
+    )
+    parser.add_argument(
+        "--token-budget", type=int,
+        help="Total LLM tokens (prompt + generated) the run may use"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Sample all threads per stage; writes collapsed stacks for "
+             "flamegraph tools and a hot-function summary to logs/"
+    )
+    parser.add_argument(
+        "--queue",
+        help="Work queue database, e.g. 'data/queue.sqlite'; the rephrase "
+             "stage is then done by worker processes"
+    )
+    parser.add_argument(
+        "--local-workers", type=int, default=0,
+        help="Worker processes to start on this machine for --queue"
+    )
+    parser.add_argument(
+        "--worker-id", help="Name of this worker (default: host-pid)"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1,
+        help="Chunks a worker processes concurrently"
+    )
+    parser.add_argument(
+        "--exit-when-idle", action="store_true",
+        help="Stop the worker once the queue is empty"
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="Address the service binds to"
+    )
+    parser.add_argument(
+        "--port", type=int, default=8765, help="Port the service listens on"
+    )
+    parser.add_argument(
+        "--socket", help="Serve on this Unix socket instead of a TCP port"
+    )
+    parser.add_argument(
+        "--max-jobs", type=int, default=4,
+        help="Jobs the service runs concurrently"
+    )
+    parser.add_argument(
+        "--llm-slots", type=int,
+        help="LLM requests in flight, shared fairly between service jobs "
+             "(default: summed capacity of the healthy endpoints)"
+    )
+    args = parser.parse_args()
+    if args.command == "worker" and not args.queue:
+        parser.error("the 'worker' command requires --queue")
+    if args.command not in ("worker", "serve") and not args.input:
+        parser.error("the following arguments are required: --input")
+    return args
+
+
+def start_worker(args):
+    """Process chunks from the work queue until stopped."""
+    with open(Path("config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    queue = open_queue(
+        args.queue, max_deliveries=config.get("max_deliveries", 3)
+    )
+    run_worker(
+        queue, worker_id=args.worker_id, threads=args.threads,
+        lease_seconds=config.get("lease_seconds", 300),
+        exit_when_idle=args.exit_when_idle
+    )
 
 
 def main():
-    """Run the RAG Pipeline with given input PDF."""
+    """Run the RAG Pipeline (or a single stage) for the given input PDF."""
     args = parse_args()
+    if args.command == "worker":
+        start_worker(args)
+        return
+    if args.command == "serve":
+        server = serve(
+            host=args.host, port=args.port, socket_path=args.socket,
+            max_jobs=args.max_jobs, llm_slots=args.llm_slots
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Service stopped.")
+        return
+
+    stages = STAGE_ORDER if args.command == "run" else [args.command]
     try:
-        run_pipeline(args.input)
+        run_pipeline(
+            args.input, stages=stages, force=args.force,
+            deadline=args.deadline, token_budget=args.token_budget,
+            queue=args.queue, local_workers=args.local_workers,
+            profile=args.profile
+        )
     except Exception as e:
         logger.error(f"Pipeline failed: {e}", exc_info=True)
 
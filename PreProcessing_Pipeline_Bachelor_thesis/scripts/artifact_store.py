@@ -0,0 +1,192 @@
+"""
+Compact binary store for intermediate pipeline artifacts.
+
+Sections, chunks, rephrase results and evaluations are written as a stream
+of length-prefixed msgpack frames, one record per frame:
+
+    MAGIC | (u32 length, msgpack record)* | msgpack offsets | u64 offset | TRAILER
+
+The offset index at the end is written when the writer is closed and allows
+random access; files without it (e.g. from an interrupted run) are still
+readable by scanning the frames. Readers memory-map the file and decode
+records lazily, and can project a subset of top-level fields without
+materialising the others.
+"""
+
+import mmap
+import os
+import struct
+from pathlib import Path
+
+import msgpack
+
+MAGIC = b"PPART1\n"
+TRAILER = b"PPIDX1"
+_LEN = struct.Struct("<I")
+_OFFSET = struct.Struct("<Q")
+
+ARTIFACT_DIR = Path("data/artifacts")
+
+
+def artifact_path(base_name: str, kind: str, root=ARTIFACT_DIR) -> Path:
+    """Standard location of an artifact, e.g. data/artifacts/doc/chunks.mpk."""
+    return Path(root) / base_name / f"{kind}.mpk"
+
+
+class ArtifactWriter:
+    """
+    Appends records to an artifact file.
+
+    Data is written to a temporary file that replaces the target on close,
+    so readers never see a half-written artifact under the final name.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(MAGIC)
+        self._packer = msgpack.Packer(use_bin_type=True)
+        self._offsets = []
+
+    def write(self, record: dict) -> None:
+        data = self._packer.pack(record)
+        self._offsets.append(self._file.tell())
+        self._file.write(_LEN.pack(len(data)))
+        self._file.write(data)
+
+    def write_many(self, records) -> None:
+        for record in records:
+            self.write(record)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        self._file.write(self._packer.pack(self._offsets))
+        self._file.write(_OFFSET.pack(index_offset))
+        self._file.write(TRAILER)
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ArtifactReader:
+    """Memory-mapped, lazily decoding reader for artifact files."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a pipeline artifact file")
+        self._offsets = self._read_index()
+
+    def _read_index(self) -> list:
+        size = len(self._mmap)
+        tail = len(TRAILER) + _OFFSET.size
+        if size >= len(MAGIC) + tail and self._mmap[size - len(TRAILER):] == TRAILER:
+            (index_offset,) = _OFFSET.unpack_from(self._mmap, size - tail)
+            return msgpack.unpackb(self._mmap[index_offset:size - tail])
+
+        # No index: the writer did not finish, recover the complete frames.
+        offsets = []
+        pos = len(MAGIC)
+        while pos + _LEN.size <= size:
+            (length,) = _LEN.unpack_from(self._mmap, pos)
+            if pos + _LEN.size + length > size:
+                break
+            offsets.append(pos)
+            pos += _LEN.size + length
+        return offsets
+
+    def _frame(self, i: int) -> memoryview:
+        pos = self._offsets[i]
+        (length,) = _LEN.unpack_from(self._mmap, pos)
+        start = pos + _LEN.size
+        return memoryview(self._mmap)[start:start + length]
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += len(self)
+        frame = self._frame(i)
+        try:
+            return msgpack.unpackb(frame, raw=False)
+        finally:
+            frame.release()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def project(self, i: int, columns) -> dict:
+        """Decodes only the given top-level fields of record 'i'."""
+        wanted = set(columns)
+        frame = self._frame(i)
+        try:
+            unpacker = msgpack.Unpacker(raw=False)
+            unpacker.feed(frame)
+            record = {}
+            for _ in range(unpacker.read_map_header()):
+                key = unpacker.unpack()
+                if key in wanted:
+                    record[key] = unpacker.unpack()
+                else:
+                    unpacker.skip()
+            return record
+        finally:
+            frame.release()
+
+    def iter_columns(self, columns):
+        """Yields records restricted to 'columns'."""
+        for i in range(len(self)):
+            yield self.project(i, columns)
+
+    def column(self, name: str) -> list:
+        """Returns a single field across all records (None where absent)."""
+        return [
+            self.project(i, (name,)).get(name) for i in range(len(self))
+        ]
+
+    def close(self) -> None:
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_artifact(path, records) -> Path:
+    """Writes all 'records' to 'path' and returns the path."""
+    with ArtifactWriter(path) as writer:
+        writer.write_many(records)
+    return Path(path)
+
+
+def read_artifact(path, columns=None) -> list:
+    """Reads all records, optionally restricted to the given top-level fields."""
+    with ArtifactReader(path) as reader:
+        if columns:
+            return list(reader.iter_columns(columns))
+        return list(reader)
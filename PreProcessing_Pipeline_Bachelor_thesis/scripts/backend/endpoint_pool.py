@@ -0,0 +1,318 @@
+"""
+Load-balanced pool of Ollama endpoints.
+
+Endpoints come from the ``endpoints`` list in config.json, each with an
+optional ``weight``, ``capacity`` and ``models`` list, or from the comma
+separated ``OLLAMA_API_URLS`` variable, falling back to the single
+``OLLAMA_API_URL``.
+Requests go to the healthy endpoint that serves the model and has the fewest
+outstanding requests relative to its weight. Endpoints that fail repeatedly
+are ejected and re-admitted once a health check against ``/api/tags``
+succeeds again. Every endpoint keeps its own ModelManager, since model
+residency is a property of the individual host. The summed capacity of the
+healthy endpoints sizes the pipeline's request threads, so adding a host
+raises concurrency without further configuration.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from dotenv import load_dotenv
+
+from scripts.backend.model_manager import ModelManager
+from scripts.logger.loggerSetup import setup_logger
+
+load_dotenv()
+
+config_path = Path(__file__).resolve().parents[2] / "config.json"
+with open(config_path, "r", encoding="utf-8") as f:
+    config = json.load(f)
+
+logger = setup_logger(__name__)
+
+# Requests one Ollama host serves in parallel (Ollama's OLLAMA_NUM_PARALLEL)
+DEFAULT_CAPACITY = 4
+
+
+class Endpoint:
+    """One Ollama host with its routing state and counters."""
+
+    def __init__(self, url, weight=1.0, models=None, manager=None,
+                 capacity=DEFAULT_CAPACITY):
+        self.url = url
+        self.weight = float(weight) if weight else 1.0
+        self.capacity = int(capacity) if capacity else DEFAULT_CAPACITY
+        self.models = set(models) if models else None
+        self.manager = manager or ModelManager(url)
+
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.ejected_at = None
+
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.busy_seconds = 0.0
+        self.first_request = None
+        self.last_response = None
+
+    @property
+    def health_url(self) -> str:
+        parts = urlsplit(self.url)
+        return urlunsplit((parts.scheme, parts.netloc, "/api/tags", "", ""))
+
+    def serves(self, model) -> bool:
+        return self.models is None or model in self.models
+
+    def load(self) -> float:
+        return self.outstanding / self.weight
+
+    def stats(self) -> dict:
+        elapsed = (
+            (self.last_response - self.first_request)
+            if self.first_request and self.last_response else 0.0
+        )
+        completed = self.requests - self.errors
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "capacity": self.capacity,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.requests, 4)
+            if self.requests else 0.0,
+            "ejections": self.ejections,
+            "avg_latency_s": round(self.busy_seconds / self.requests, 3)
+            if self.requests else 0.0,
+            "throughput_rps": round(completed / elapsed, 4)
+            if elapsed > 0 else 0.0,
+            **self.manager.stats(),
+        }
+
+
+class EndpointPool:
+    """Routes generate requests across endpoints by least outstanding load."""
+
+    def __init__(
+        self,
+        endpoints,
+        failure_threshold: int = 3,
+        health_interval: float = 15.0,
+        get=requests.get,
+    ):
+        """
+        Args:
+            endpoints: List of Endpoint objects.
+            failure_threshold: Consecutive failures before an endpoint is ejected.
+            health_interval: Seconds between health checks of ejected endpoints.
+            get: Callable with the signature of ``requests.get`` used for
+                 health checks.
+        """
+        self.endpoints = endpoints
+        self.failure_threshold = failure_threshold
+        self.health_interval = health_interval
+        self._get = get
+        self._lock = threading.Lock()
+        self._health_thread = None
+        self._usage = Counter()
+        # Optional FairScheduler admitting requests across concurrent jobs
+        self.scheduler = None
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "EndpointPool":
+        manager_kwargs = {
+            "keep_alive": cfg.get("keep_alive", "30m"),
+            "max_streak": cfg.get("max_model_streak", 16),
+            "group_models": cfg.get("group_models", True),
+        }
+        specs = cfg.get("endpoints")
+        if not specs:
+            urls = os.getenv("OLLAMA_API_URLS") or os.getenv("OLLAMA_API_URL")
+            specs = [{"url": u.strip()} for u in (urls or "").split(",")
+                     if u.strip()]
+
+        endpoints = [
+            Endpoint(
+                spec["url"],
+                weight=spec.get("weight", 1.0),
+                models=spec.get("models"),
+                manager=ModelManager(spec["url"], **manager_kwargs),
+                capacity=spec.get(
+                    "capacity", cfg.get("endpoint_capacity", DEFAULT_CAPACITY)
+                ),
+            )
+            for spec in specs
+        ]
+        return cls(
+            endpoints,
+            failure_threshold=cfg.get("endpoint_failure_threshold", 3),
+            health_interval=cfg.get("endpoint_health_interval", 15.0),
+        )
+
+    def generate(self, payload: dict, timeout: int = 120) -> requests.Response:
+        """
+        Sends 'payload' to the least loaded endpoint serving its model.
+
+        A failed request is retried once on every other eligible endpoint
+        before the last error is raised to the caller.
+
+        Raises:
+            RuntimeError: If no endpoint is configured.
+            requests.exceptions.RequestException: If all eligible endpoints fail.
+        """
+        if not self.endpoints:
+            raise RuntimeError(
+                "No Ollama endpoint configured. Set OLLAMA_API_URL in .env "
+                "or 'endpoints' in config.json."
+            )
+        if self.scheduler is not None:
+            with self.scheduler.slot():
+                return self._route(payload, timeout)
+        return self._route(payload, timeout)
+
+    def _route(self, payload: dict, timeout: int) -> requests.Response:
+        model = payload.get("model")
+        tried = set()
+        last_error = None
+
+        while True:
+            endpoint = self._acquire(model, exclude=tried)
+            if endpoint is None:
+                break
+            tried.add(endpoint.url)
+
+            start = time.perf_counter()
+            try:
+                response = endpoint.manager.generate(payload, timeout=timeout)
+                if response.status_code >= 500:
+                    response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                self._release(endpoint, start, ok=False)
+                logger.warning(f"Endpoint {endpoint.url} failed: {e}")
+                last_error = e
+                continue
+
+            self._release(endpoint, start, ok=True)
+            return response
+
+        if last_error is not None:
+            raise last_error
+        raise requests.exceptions.ConnectionError(
+            f"No healthy endpoint available for model '{model}'."
+        )
+
+    def concurrency(self) -> int:
+        """Requests the healthy endpoints can serve in parallel (at least 1)."""
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.healthy] or self.endpoints
+            return max(1, sum(e.capacity for e in healthy))
+
+    def warm_up(self, models, timeout: int = 600) -> None:
+        """Pre-warms every endpoint with the models it serves."""
+        for endpoint in self.endpoints:
+            endpoint.manager.warm_up(
+                [m for m in models if endpoint.serves(m)], timeout=timeout
+            )
+
+    def check_health(self) -> None:
+        """Probes ejected endpoints and re-admits those that answer."""
+        for endpoint in self.endpoints:
+            if endpoint.healthy:
+                continue
+            try:
+                self._get(endpoint.health_url, timeout=5).raise_for_status()
+            except requests.exceptions.RequestException:
+                continue
+            with self._lock:
+                endpoint.healthy = True
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_at = None
+            logger.info(f"Endpoint {endpoint.url} re-admitted to the pool.")
+
+    def record_usage(self, response_json: dict) -> None:
+        """Adds the token counts of a parsed generate response to the totals."""
+        with self._lock:
+            self._usage["prompt_tokens"] += response_json.get("prompt_eval_count") or 0
+            self._usage["completion_tokens"] += response_json.get("eval_count") or 0
+
+    def tokens_used(self) -> int:
+        """Prompt and generated tokens of all recorded responses."""
+        with self._lock:
+            return self._usage["prompt_tokens"] + self._usage["completion_tokens"]
+
+    def usage(self) -> dict:
+        with self._lock:
+            return dict(self._usage)
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def _acquire(self, model, exclude) -> Endpoint | None:
+        with self._lock:
+            candidates = [
+                e for e in self.endpoints
+                if e.healthy and e.serves(model) and e.url not in exclude
+            ]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=Endpoint.load)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            if endpoint.first_request is None:
+                endpoint.first_request = time.perf_counter()
+            return endpoint
+
+    def _release(self, endpoint, start, ok) -> None:
+        now = time.perf_counter()
+        eject = False
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.busy_seconds += now - start
+            endpoint.last_response = now
+            if ok:
+                endpoint.consecutive_failures = 0
+                return
+            endpoint.errors += 1
+            endpoint.consecutive_failures += 1
+            healthy_left = sum(e.healthy for e in self.endpoints)
+            # Never eject the last healthy endpoint; the caller's retry
+            # logic is better placed to wait it out.
+            if (endpoint.healthy and healthy_left > 1 and
+                    endpoint.consecutive_failures >= self.failure_threshold):
+                endpoint.healthy = False
+                endpoint.ejected_at = now
+                endpoint.ejections += 1
+                eject = True
+
+        if eject:
+            logger.warning(
+                f"Endpoint {endpoint.url} ejected after "
+                f"{endpoint.consecutive_failures} consecutive failures."
+            )
+            self._ensure_health_thread()
+
+    def _ensure_health_thread(self) -> None:
+        with self._lock:
+            if self._health_thread and self._health_thread.is_alive():
+                return
+            self._health_thread = threading.Thread(
+                target=self._health_loop, name="endpoint-health", daemon=True
+            )
+            self._health_thread.start()
+
+    def _health_loop(self) -> None:
+        while any(not e.healthy for e in self.endpoints):
+            time.sleep(self.health_interval)
+            self.check_health()
+
+
+endpoint_pool = EndpointPool.from_config(config)
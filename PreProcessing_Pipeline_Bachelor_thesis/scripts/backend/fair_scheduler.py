@@ -0,0 +1,85 @@
+"""
+Fair sharing of LLM request slots between concurrent jobs.
+
+In service mode several pipeline runs share one EndpointPool. Without
+coordination a large batch job keeps every slot busy and a small job waits
+behind hundreds of its requests. FairScheduler limits the number of
+requests in flight and hands free slots to the waiting jobs in round-robin
+order, so each job gets an equal share regardless of how many requests it
+has queued. Threads declare their job with ``with scheduler.job(job_id):``;
+requests from undeclared threads share a default job.
+"""
+
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+DEFAULT_JOB = "default"
+
+
+class FairScheduler:
+    """Round-robin admission of LLM requests across jobs."""
+
+    def __init__(self, slots: int = 4):
+        self.slots = slots
+        self.in_flight = 0
+        self._waiting = OrderedDict()  # job -> deque of waiting events
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.granted = {}
+
+    @contextmanager
+    def job(self, job_id):
+        """Attribute requests made by the current thread to 'job_id'."""
+        previous = getattr(self._local, "job", None)
+        self._local.job = job_id
+        try:
+            yield
+        finally:
+            self._local.job = previous
+
+    def current_job(self):
+        return getattr(self._local, "job", None) or DEFAULT_JOB
+
+    def acquire(self) -> None:
+        job = self.current_job()
+        with self._lock:
+            if self.in_flight < self.slots and not self._waiting:
+                self.in_flight += 1
+                self.granted[job] = self.granted.get(job, 0) + 1
+                return
+            ready = threading.Event()
+            self._waiting.setdefault(job, deque()).append(ready)
+        ready.wait()
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._waiting:
+                self.in_flight -= 1
+                return
+            # Hand the slot to the longest-waiting job, then rotate it last
+            job, queue = next(iter(self._waiting.items()))
+            ready = queue.popleft()
+            del self._waiting[job]
+            if queue:
+                self._waiting[job] = queue
+            self.granted[job] = self.granted.get(job, 0) + 1
+        ready.set()
+
+    @contextmanager
+    def slot(self):
+        """Hold one request slot for the current thread's job."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "in_flight": self.in_flight,
+                "waiting": {job: len(q) for job, q in self._waiting.items()},
+                "granted": dict(self.granted),
+            }
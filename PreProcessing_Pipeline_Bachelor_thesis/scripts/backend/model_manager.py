@@ -0,0 +1,150 @@
+"""
+Keeps Ollama models resident and groups requests by model.
+
+The rephraser and the evaluator can be configured with different models. On
+a host that only fits one of them, alternating calls force Ollama to evict and
+reload a model for almost every request. The ModelManager sends an explicit
+``keep_alive`` with every request, pre-warms the configured models before the
+pipeline dispatches work, and admits queued calls so that requests for the
+currently loaded model run back to back before switching to the next model.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from scripts.logger.loggerSetup import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ModelManager:
+    """
+    Thin gate in front of the Ollama generate endpoint.
+
+    Requests for the active model are admitted immediately. Requests for a
+    different model wait until the active model has no more in-flight calls
+    and either no queued work is left for it or it has been served
+    ``max_streak`` times in a row, which bounds how long another model can
+    be starved.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        keep_alive: str = "30m",
+        max_streak: int = 16,
+        group_models: bool = True,
+        post=requests.post,
+    ):
+        """
+        Args:
+            url: Ollama generate endpoint, e.g. http://localhost:11434/api/generate.
+            keep_alive: Duration Ollama keeps a model loaded after a request.
+            max_streak: Consecutive admissions of one model before a waiting
+                        model gets its turn.
+            group_models: Disable to pass every request straight through.
+            post: Callable with the signature of ``requests.post``; replaced
+                  in tests or when talking to a stub backend.
+        """
+        self.url = url
+        self.keep_alive = keep_alive
+        self.max_streak = max_streak
+        self.group_models = group_models
+        self._post = post
+
+        self._cond = threading.Condition()
+        self._active_model = None
+        self._in_flight = 0
+        self._streak = 0
+        self._waiting = defaultdict(int)
+        self._calls = defaultdict(int)
+        self._switches = 0
+
+    def warm_up(self, models, timeout: int = 600) -> None:
+        """
+        Loads each model once so the first real requests skip the cold start.
+
+        An empty prompt makes Ollama load the model and return immediately.
+        The last model in ``models`` is the one left active afterwards.
+
+        Raises:
+            requests.exceptions.RequestException: If a model fails to load.
+        """
+        for model in dict.fromkeys(m for m in models if m):
+            start = time.perf_counter()
+            response = self.generate(
+                {"model": model, "prompt": "", "stream": False},
+                timeout=timeout
+            )
+            response.raise_for_status()
+            logger.info(
+                f"Warmed up model '{model}' in "
+                f"{time.perf_counter() - start:.1f}s"
+            )
+
+    def generate(self, payload: dict, timeout: int = 120) -> requests.Response:
+        """
+        Posts a generate payload once the model is allowed to run.
+
+        ``keep_alive`` is added unless the payload already sets it. The raw
+        response is returned so callers keep their own status handling.
+        """
+        model = payload.get("model")
+        payload = {"keep_alive": self.keep_alive, **payload}
+
+        self._acquire(model)
+        try:
+            return self._post(self.url, json=payload, timeout=timeout)
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        """Returns per-model call counts and the number of model switches."""
+        with self._cond:
+            return {
+                "calls_per_model": dict(self._calls),
+                "model_switches": self._switches,
+            }
+
+    def _may_enter(self, model) -> bool:
+        if not self.group_models or self._active_model is None:
+            return True
+
+        if model == self._active_model:
+            others_waiting = any(
+                n for m, n in self._waiting.items() if m != model
+            )
+            return not others_waiting or self._streak < self.max_streak
+
+        if self._in_flight:
+            return False
+        active_waiting = self._waiting.get(self._active_model, 0)
+        return not active_waiting or self._streak >= self.max_streak
+
+    def _acquire(self, model) -> None:
+        with self._cond:
+            self._waiting[model] += 1
+            while not self._may_enter(model):
+                self._cond.wait()
+            self._waiting[model] -= 1
+
+            if self._active_model != model:
+                if self._active_model is not None:
+                    self._switches += 1
+                    logger.debug(
+                        f"Switching model '{self._active_model}' -> '{model}'"
+                    )
+                self._active_model = model
+                self._streak = 0
+            self._in_flight += 1
+            self._streak += 1
+            self._calls[model] += 1
+
+    def _release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
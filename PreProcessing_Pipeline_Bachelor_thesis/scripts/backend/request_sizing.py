@@ -0,0 +1,197 @@
+"""
+Per-request sizing of the Ollama context window and generation length.
+
+Instead of a static worst-case limit, every request gets ``num_ctx`` and
+``num_predict`` derived from its own input: the prompt is counted with the
+local tokenizer, and the expected output follows from the kind of request.
+A rephrase is bounded by a length ratio of its source text, an evaluation by
+the known size of the evaluator JSON plus room for missing and hallucinated
+items, and a combined request by both. ``num_ctx`` is rounded up to a power
+of two so that requests of similar size share one context size; Ollama
+reloads a model whenever ``num_ctx`` changes, so fewer distinct values mean
+fewer reloads.
+
+A response that stops with ``done_reason == "length"`` was truncated by the
+bound. The request is repeated with twice the generation length, and the
+bound of its kind is widened for all later requests.
+"""
+
+import json
+import math
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from scripts.logger.loggerSetup import setup_logger
+from scripts.processing.tokenizer import get_token_helper
+
+config_path = Path(__file__).resolve().parents[2] / "config.json"
+with open(config_path, "r", encoding="utf-8") as f:
+    config = json.load(f)
+
+logger = setup_logger(__name__)
+
+KINDS = ("rephrase", "evaluate", "combined")
+
+
+class RequestSizer:
+    """
+    Computes tight num_ctx/num_predict options and learns from truncations.
+
+    Args:
+        tokenizer_model: Tokenizer used to count prompt and source tokens.
+        output_ratio: Rephrase tokens allowed per source token.
+        output_overhead: Tokens added to every rephrase bound (headers).
+        evaluation_tokens: Size of the evaluator JSON without item lists.
+        item_ratio: Evaluation tokens allowed per source token for the
+            missing and hallucinated item lists.
+        min_context: Smallest num_ctx that is sent.
+        max_context: Largest num_ctx that is sent.
+        margin: Tokens reserved on top of prompt and output, covering the
+            template and the difference to the server's tokenizer.
+        growth: Factor by which a kind's bound widens after a truncation.
+        max_scale: Upper limit of that widening.
+    """
+
+    def __init__(
+        self, tokenizer_model, output_ratio=1.6, output_overhead=96,
+        evaluation_tokens=384, item_ratio=0.25, min_context=2048,
+        max_context=32768, margin=64, growth=1.5, max_scale=4.0
+    ):
+        self.tokenizer_model = tokenizer_model
+        self.output_ratio = output_ratio
+        self.output_overhead = output_overhead
+        self.evaluation_tokens = evaluation_tokens
+        self.item_ratio = item_ratio
+        self.min_context = min_context
+        self.max_context = max_context
+        self.margin = margin
+        self.growth = growth
+        self.max_scale = max_scale
+        self.scale = {kind: 1.0 for kind in KINDS}
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def count(self, text) -> int:
+        return get_token_helper(self.tokenizer_model).count_tokens(text or "")
+
+    def expected_output(self, kind, source_tokens) -> int:
+        """Generation bound for a request of 'kind' over the source text."""
+        rephrase = self.output_ratio * source_tokens + self.output_overhead
+        evaluation = self.evaluation_tokens + self.item_ratio * source_tokens
+        if kind == "rephrase":
+            tokens = rephrase
+        elif kind == "evaluate":
+            tokens = evaluation
+        elif kind == "combined":
+            tokens = rephrase + evaluation
+        else:
+            raise ValueError(f"Unknown request kind '{kind}'")
+        return math.ceil(tokens * self.scale[kind])
+
+    def context_for(self, tokens) -> int:
+        """Smallest power of two >= tokens within [min_context, max_context]."""
+        size = 1 << max(0, tokens - 1).bit_length()
+        return min(max(size, self.min_context), self.max_context)
+
+    def apply(self, payload, kind, source_text) -> dict:
+        """
+        Set num_ctx and num_predict in payload["options"] for this request.
+
+        The static 'max_tokens' option is dropped; Ollama does not read it.
+        Returns the sizing state that grow() and record() take.
+        """
+        prompt_tokens = self.count(payload.get("prompt", ""))
+        num_predict = self.expected_output(kind, self.count(source_text))
+        num_ctx = self.context_for(prompt_tokens + num_predict + self.margin)
+        # Never let the prompt be cut off to make room for the output
+        num_predict = max(1, min(num_predict, num_ctx - prompt_tokens - self.margin))
+
+        options = payload.setdefault("options", {})
+        options.pop("max_tokens", None)
+        options["num_ctx"] = num_ctx
+        options["num_predict"] = num_predict
+
+        with self._lock:
+            stats = self._stats[kind]
+            stats["requests"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["num_ctx"] += num_ctx
+            stats["num_predict"] += num_predict
+            stats["max_num_ctx"] = max(stats["max_num_ctx"], num_ctx)
+        return {"kind": kind, "prompt_tokens": prompt_tokens}
+
+    def grow(self, payload, sizing) -> bool:
+        """
+        Double num_predict for a retry of a truncated request.
+
+        Returns False when the request is already at the largest context.
+        """
+        options = payload["options"]
+        available = self.max_context - sizing["prompt_tokens"] - self.margin
+        num_predict = min(options["num_predict"] * 2, available)
+        if num_predict <= options["num_predict"]:
+            return False
+        options["num_predict"] = num_predict
+        options["num_ctx"] = self.context_for(
+            sizing["prompt_tokens"] + num_predict + self.margin
+        )
+        with self._lock:
+            self._stats[sizing["kind"]]["retries"] += 1
+        return True
+
+    def record(self, payload, sizing, response_json) -> bool:
+        """
+        Record the generated length of a sized request.
+
+        Returns True if the response was truncated by num_predict, in which
+        case the bound for the request's kind is widened.
+        """
+        kind = sizing["kind"]
+        truncated = response_json.get("done_reason") == "length"
+        with self._lock:
+            stats = self._stats[kind]
+            stats["completion_tokens"] += response_json.get("eval_count") or 0
+            if truncated:
+                stats["truncations"] += 1
+                self.scale[kind] = min(
+                    self.scale[kind] * self.growth, self.max_scale
+                )
+        if truncated:
+            logger.warning(
+                f"{kind} response truncated at num_predict "
+                f"{payload['options']['num_predict']}; bound scale is now "
+                f"{self.scale[kind]:.2f}"
+            )
+        return truncated
+
+    def report(self) -> dict:
+        with self._lock:
+            report = {}
+            for kind, stats in self._stats.items():
+                requests = stats["requests"] or 1
+                report[kind] = {
+                    "requests": stats["requests"],
+                    "truncations": stats["truncations"],
+                    "retries": stats["retries"],
+                    "mean_prompt_tokens": round(stats["prompt_tokens"] / requests, 1),
+                    "mean_num_ctx": round(stats["num_ctx"] / requests, 1),
+                    "max_num_ctx": stats["max_num_ctx"],
+                    "mean_num_predict": round(stats["num_predict"] / requests, 1),
+                    "output_utilization": round(
+                        stats["completion_tokens"] / stats["num_predict"], 3
+                    ) if stats["num_predict"] else None,
+                    "scale": round(self.scale[kind], 2),
+                }
+            return report
+
+
+request_sizer = RequestSizer(
+    config["tokenizer_model"],
+    output_ratio=config.get("rephrase_output_ratio", 1.6),
+    output_overhead=config.get("rephrase_output_overhead", 96),
+    evaluation_tokens=config.get("evaluation_output_tokens", 384),
+    item_ratio=config.get("evaluation_item_ratio", 0.25),
+    min_context=config.get("min_context", 2048),
+    max_context=config.get("max_tokens", 32768),
+) if config.get("request_sizing", True) else None
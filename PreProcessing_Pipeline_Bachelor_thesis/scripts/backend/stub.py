@@ -0,0 +1,198 @@
+"""
+Local stand-in for the Ollama generate API.
+
+Simulates model residency on a memory-constrained host: only ``capacity``
+models fit at once, loading a model costs ``load_latency`` seconds and
+evicting one costs ``evict_latency`` seconds. Requests with a ``format``
+field get a passing evaluator JSON (wrapped with a rephrase for combined
+requests), all others echo a short rephrase (one per segment marker for
+packed prompts).
+
+Usage:
+    python -m scripts.backend.stub --port 11500 --load-latency 5 --capacity 1
+    OLLAMA_API_URL=http://localhost:11500/api/generate python main.py --input ...
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_EVALUATION = {
+    "scores": {
+        "correctness": 1.0,
+        "completeness": 1.0,
+        "consistency": 1.0,
+        "relevance": 1.0,
+        "interpretability": 1.0
+    },
+    "missing_items": [],
+    "hallucinated_items": [],
+    "feedback": ""
+}
+
+
+class ResidencySimulator:
+    """
+    Tracks loaded models with LRU eviction, counts loads/evictions and keeps
+    a log of the requests it served (model, keep_alive, warm-up or not).
+    """
+
+    def __init__(self, capacity=1, load_latency=5.0, evict_latency=1.0):
+        self.capacity = capacity
+        self.load_latency = load_latency
+        self.evict_latency = evict_latency
+        self.loaded = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def record(self, payload: dict) -> None:
+        with self._lock:
+            self.requests.append({
+                "model": payload.get("model", ""),
+                "keep_alive": payload.get("keep_alive"),
+                "warm_up": not payload.get("prompt"),
+            })
+
+    def ensure_loaded(self, model: str) -> float:
+        """Loads 'model' if needed and returns the simulated load time."""
+        with self._lock:
+            if model in self.loaded:
+                self.loaded.move_to_end(model)
+                return 0.0
+
+            waited = 0.0
+            while len(self.loaded) >= self.capacity:
+                self.loaded.popitem(last=False)
+                self.evictions += 1
+                time.sleep(self.evict_latency)
+                waited += self.evict_latency
+            time.sleep(self.load_latency)
+            self.loaded[model] = True
+            self.loads += 1
+            return waited + self.load_latency
+
+    def unload(self, model: str) -> None:
+        with self._lock:
+            self.loaded.pop(model, None)
+
+
+def make_handler(simulator, generate_latency):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") == "/api/tags":
+                body = {"models": [{"name": m} for m in simulator.loaded]}
+            elif self.path.rstrip("/") == "/stats":
+                body = {
+                    "loaded": list(simulator.loaded),
+                    "loads": simulator.loads,
+                    "evictions": simulator.evictions,
+                    "requests": simulator.requests
+                }
+            else:
+                self.send_error(404)
+                return
+            self._send_json(body)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/api/generate":
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            model = payload.get("model", "")
+            simulator.record(payload)
+
+            load_seconds = simulator.ensure_loaded(model)
+            prompt = payload.get("prompt", "")
+            if prompt:
+                time.sleep(generate_latency)
+
+            schema = payload.get("format")
+            if isinstance(schema, dict) and "rephrased_text" in schema.get(
+                "properties", {}
+            ):
+                text = json.dumps({
+                    "rephrased_text": f"Stub rephrase by {model}.",
+                    "evaluation": STUB_EVALUATION
+                })
+            elif schema:
+                text = json.dumps(STUB_EVALUATION)
+            elif prompt:
+                markers = re.findall(r"^### SEGMENT \d+ ###$", prompt, re.M)
+                text = "\n".join(
+                    f"{marker}\nStub rephrase by {model}."
+                    for marker in markers
+                ) or f"Stub rephrase by {model}."
+            else:
+                text = ""
+
+            if payload.get("keep_alive") in (0, "0", "0s"):
+                simulator.unload(model)
+
+            # Word counts stand in for tokens, as in the usage fields below
+            done_reason = "stop"
+            num_predict = payload.get("options", {}).get("num_predict")
+            if num_predict and len(text.split()) > num_predict:
+                text = " ".join(text.split()[:num_predict])
+                done_reason = "length"
+
+            self._send_json({
+                "model": model,
+                "response": text,
+                "done": True,
+                "done_reason": done_reason,
+                "load_duration": int(load_seconds * 1e9),
+                "prompt_eval_count": len(prompt.split()),
+                "eval_count": len(text.split())
+            })
+
+        def _send_json(self, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def serve(host="127.0.0.1", port=11500, capacity=1, load_latency=5.0,
+          evict_latency=1.0, generate_latency=0.2):
+    """Builds a stub server; call ``serve_forever()`` on the result."""
+    simulator = ResidencySimulator(capacity, load_latency, evict_latency)
+    server = ThreadingHTTPServer(
+        (host, port), make_handler(simulator, generate_latency)
+    )
+    server.simulator = simulator
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ollama stub backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--capacity", type=int, default=1)
+    parser.add_argument("--load-latency", type=float, default=5.0)
+    parser.add_argument("--evict-latency", type=float, default=1.0)
+    parser.add_argument("--generate-latency", type=float, default=0.2)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = serve(
+        args.host, args.port, args.capacity, args.load_latency,
+        args.evict_latency, args.generate_latency
+    )
+    print(f"Ollama stub listening on http://{args.host}:{args.port}/api/generate")
+    server.serve_forever()
@@ -0,0 +1,103 @@
+"""
+Coordinator side of distributed rephrasing.
+
+The coordinator enqueues the chunks of a document as tasks of one chunk or
+of several small chunks packed into one request (in LPT order, so workers
+pick up the most expensive chunks first), waits until each task has a
+result or has failed for good, and returns the results in document order
+for the evaluate and export stages.
+"""
+
+import subprocess
+import sys
+import time
+
+from tqdm import tqdm
+
+from scripts.distributed.work_queue import WorkQueue
+from scripts.logger.loggerSetup import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def task_id(unit) -> str:
+    """Task key of a unit: the document positions of its chunks."""
+    return ",".join(str(i) for i in unit)
+
+
+def enqueue_chunks(
+    queue: WorkQueue, job_id: str, chunks, units, max_attempts: int,
+    document: str = None
+) -> None:
+    """Enqueue each unit (tuple of chunk indices) as one task, in order."""
+    added = queue.enqueue(job_id, (
+        (task_id(unit), {
+            "chunks": [chunks[i] for i in unit],
+            "max_attempts": max_attempts,
+            "document": document
+        })
+        for unit in units
+    ))
+    if added < len(units):
+        logger.info(
+            f"Job '{job_id}': {len(units) - added} tasks already queued, "
+            f"resuming."
+        )
+    logger.info(f"Job '{job_id}': enqueued {added} tasks.")
+
+
+def spawn_local_workers(queue_location: str, count: int) -> list:
+    """Start worker processes on this machine that exit once the queue is empty."""
+    return [
+        subprocess.Popen([
+            sys.executable, "main.py", "worker", "--queue", queue_location,
+            "--exit-when-idle", "--worker-id", f"local-{n}"
+        ])
+        for n in range(count)
+    ]
+
+
+def wait_for_results(
+    queue: WorkQueue, job_id: str, chunks, poll_interval: float = 2.0,
+    workers=()
+):
+    """
+    Block until every task of the job is done or failed.
+
+    Returns (results, errors): results in document order, with the original
+    chunk for tasks that failed for good, and a header -> error mapping.
+    """
+    total = queue.total(job_id)
+    with tqdm(total=total) as progress:
+        while True:
+            counts = queue.progress(job_id)
+            finished = counts.get("done", 0) + counts.get("failed", 0)
+            progress.update(finished - progress.n)
+            if finished >= total:
+                break
+            if workers and all(w.poll() is not None for w in workers):
+                raise RuntimeError(
+                    f"All local workers exited with {total - finished} "
+                    f"tasks unfinished."
+                )
+            time.sleep(poll_interval)
+
+    results = [None] * len(chunks)
+    for key, unit_results in queue.results(job_id).items():
+        for i, result in zip(map(int, key.split(",")), unit_results):
+            results[i] = result
+
+    failed = {}
+    for key, error in queue.errors(job_id).items():
+        failed.update(dict.fromkeys(map(int, key.split(",")), error))
+
+    errors = {}
+    for i, chunk in enumerate(chunks):
+        if results[i] is None:
+            header = chunk["metadata"].get("header", "Unknown Header")
+            errors[header] = failed.get(i, "no result")
+            results[i] = {
+                "metadata": chunk["metadata"],
+                "page_content": chunk["page_content"]
+            }
+    return results, errors
@@ -0,0 +1,249 @@
+"""
+Durable work queue for distributed rephrasing.
+
+A coordinator enqueues the chunks of a job, workers lease one task at a
+time, and results are written back idempotently: the first result for a
+task wins and later deliveries of the same task are ignored. A lease that
+is not completed or extended before it expires makes the task available
+again, so a crashed worker only delays its chunk.
+
+WorkQueue defines the interface; SQLiteWorkQueue is the local-first
+implementation. SQLite in WAL mode is safe for several processes on one
+machine. Workers on other machines need the database on a file system with
+working locks, or a different WorkQueue implementation behind the same
+interface.
+"""
+
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import msgpack
+
+
+class Task:
+    """A leased unit of work."""
+
+    def __init__(self, job_id, task_id, payload, lease_token, deliveries):
+        self.job_id = job_id
+        self.task_id = task_id
+        self.payload = payload
+        self.lease_token = lease_token
+        self.deliveries = deliveries
+
+
+class WorkQueue:
+    """Interface of a work queue backend."""
+
+    def enqueue(self, job_id: str, tasks) -> int:
+        """Adds (task_id, payload) pairs in priority order; returns new count."""
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Task | None:
+        """Leases the next available task, or returns None if there is none."""
+        raise NotImplementedError
+
+    def extend(self, task: Task, lease_seconds: float) -> bool:
+        """Extends a lease; False if the lease was lost to another worker."""
+        raise NotImplementedError
+
+    def complete(self, task: Task, worker_id: str, result) -> bool:
+        """Stores the result; False if one was already stored for the task."""
+        raise NotImplementedError
+
+    def fail(self, task: Task, error: str) -> None:
+        """Releases a task after an error, or marks it failed for good."""
+        raise NotImplementedError
+
+    def progress(self, job_id: str) -> dict:
+        """Counts of tasks per state for a job."""
+        raise NotImplementedError
+
+    def total(self, job_id: str) -> int:
+        """Number of tasks in a job."""
+        return sum(self.progress(job_id).values())
+
+    def results(self, job_id: str) -> dict:
+        """Maps task_id to result for all completed tasks of a job."""
+        raise NotImplementedError
+
+    def errors(self, job_id: str) -> dict:
+        """Maps task_id to the last error of tasks that failed for good."""
+        raise NotImplementedError
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """WorkQueue stored in a single SQLite database file."""
+
+    def __init__(self, path, max_deliveries: int = 3):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_deliveries = max_deliveries
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    job_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    lease_owner TEXT,
+                    lease_token TEXT,
+                    lease_expires REAL,
+                    deliveries INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    PRIMARY KEY (job_id, task_id)
+                );
+                CREATE INDEX IF NOT EXISTS tasks_state_idx
+                    ON tasks (state, position);
+                CREATE TABLE IF NOT EXISTS results (
+                    job_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    worker_id TEXT,
+                    result BLOB NOT NULL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, task_id)
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue(self, job_id, tasks) -> int:
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (job_id, task_id, position, payload) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    (job_id, task_id, position, msgpack.packb(payload))
+                    for position, (task_id, payload) in enumerate(tasks)
+                ),
+            )
+            return conn.total_changes - before
+
+    def lease(self, worker_id, lease_seconds) -> Task | None:
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._transaction() as conn:
+            # Tasks whose workers keep dying are not handed out forever
+            conn.execute(
+                "UPDATE tasks SET state = 'failed', lease_token = NULL, "
+                "last_error = COALESCE(last_error, 'lease expired') "
+                "WHERE state = 'leased' AND lease_expires < ? "
+                "AND deliveries >= ?",
+                (now, self.max_deliveries),
+            )
+            row = conn.execute(
+                "SELECT job_id, task_id, payload, deliveries FROM tasks "
+                "WHERE state = 'pending' "
+                "   OR (state = 'leased' AND lease_expires < ?) "
+                "ORDER BY position LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, task_id, payload, deliveries = row
+            conn.execute(
+                "UPDATE tasks SET state = 'leased', lease_owner = ?, "
+                "lease_token = ?, lease_expires = ?, deliveries = deliveries + 1 "
+                "WHERE job_id = ? AND task_id = ?",
+                (worker_id, token, now + lease_seconds, job_id, task_id),
+            )
+        return Task(
+            job_id, task_id, msgpack.unpackb(payload), token, deliveries + 1
+        )
+
+    def extend(self, task, lease_seconds) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ? "
+                "WHERE job_id = ? AND task_id = ? AND lease_token = ? "
+                "AND state = 'leased'",
+                (time.time() + lease_seconds, task.job_id, task.task_id,
+                 task.lease_token),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, task, worker_id, result) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO results "
+                "(job_id, task_id, worker_id, result, completed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (task.job_id, task.task_id, worker_id,
+                 msgpack.packb(result), time.time()),
+            )
+            conn.execute(
+                "UPDATE tasks SET state = 'done', lease_token = NULL "
+                "WHERE job_id = ? AND task_id = ?",
+                (task.job_id, task.task_id),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, task, error) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET "
+                "state = CASE WHEN deliveries >= ? THEN 'failed' "
+                "             ELSE 'pending' END, "
+                "lease_token = NULL, last_error = ? "
+                "WHERE job_id = ? AND task_id = ? AND lease_token = ?",
+                (self.max_deliveries, error, task.job_id, task.task_id,
+                 task.lease_token),
+            )
+
+    def progress(self, job_id) -> dict:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT state, COUNT(*) FROM tasks WHERE job_id = ? "
+                "GROUP BY state",
+                (job_id,),
+            ).fetchall()
+        return dict(rows)
+
+    def results(self, job_id) -> dict:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT task_id, result FROM results WHERE job_id = ?",
+                (job_id,),
+            ).fetchall()
+        return {task_id: msgpack.unpackb(result) for task_id, result in rows}
+
+    def errors(self, job_id) -> dict:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT task_id, last_error FROM tasks "
+                "WHERE job_id = ? AND state = 'failed'",
+                (job_id,),
+            ).fetchall()
+        return dict(rows)
+
+
+def open_queue(location: str, **kwargs) -> WorkQueue:
+    """Opens a queue from 'sqlite:///path' or a plain database path."""
+    if "://" in location:
+        scheme, _, path = location.partition("://")
+        if scheme != "sqlite":
+            raise ValueError(f"Unsupported work queue backend: '{scheme}'")
+        location = path
+    return SQLiteWorkQueue(location, **kwargs)
@@ -0,0 +1,142 @@
+"""
+Worker process for distributed rephrasing.
+
+A worker leases tasks (one chunk, or several small chunks packed into one
+request) from a WorkQueue, runs rephrase_group_with_evaluation against its
+own configured Ollama endpoints and posts the results back. The lease is
+extended in the background while a task is being processed,
+so only a crashed or disconnected worker lets its lease expire.
+
+    python main.py worker --queue data/queue.sqlite
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from scripts.backend.endpoint_pool import endpoint_pool
+from scripts.distributed.work_queue import WorkQueue
+from scripts.evaluation.cascade import cascade
+from scripts.evaluation.eval_output import (
+    rephrase_group_with_evaluation, MODEL_NAME as EVAL_MODEL_NAME
+)
+from scripts.logger.loggerSetup import setup_logger
+
+logger = setup_logger(__name__)
+
+with open(Path("config.json"), "r", encoding="utf-8") as f:
+    config = json.load(f)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Heartbeat:
+    """Extends a task's lease every third of the lease period until stopped."""
+
+    def __init__(self, queue: WorkQueue, task, lease_seconds: float):
+        self.queue = queue
+        self.task = task
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.extend(self.task, self.lease_seconds):
+                    logger.warning(
+                        f"Lease on task '{self.task.task_id}' was lost; "
+                        f"its result may be discarded."
+                    )
+                    return
+            except Exception as e:
+                logger.warning(f"Lease extension failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def process_task(queue: WorkQueue, task, worker_id: str,
+                 lease_seconds: float) -> None:
+    """Rephrase a leased task's chunks and post the results, or the failure."""
+    chunks = task.payload["chunks"]
+    chunk_id = ", ".join(
+        c["metadata"].get("chunk_id", task.task_id) for c in chunks
+    )
+    logger.info(
+        f"[{worker_id}] Processing chunk '{chunk_id}' "
+        f"(delivery {task.deliveries})"
+    )
+    try:
+        with Heartbeat(queue, task, lease_seconds):
+            result = rephrase_group_with_evaluation(
+                chunks, max_attempts=task.payload.get(
+                    "max_attempts", config.get("max_attempts", 5)
+                ),
+                document=task.payload.get("document")
+            )
+    except Exception as e:
+        logger.warning(f"[{worker_id}] Chunk '{chunk_id}' failed: {e}")
+        queue.fail(task, str(e))
+        return
+
+    if not queue.complete(task, worker_id, result):
+        logger.info(
+            f"[{worker_id}] Chunk '{chunk_id}' was already completed "
+            f"by another worker."
+        )
+
+
+def run_worker(
+    queue: WorkQueue, worker_id: str | None = None, threads: int = 1,
+    lease_seconds: float = 300.0, poll_interval: float = 2.0,
+    exit_when_idle: bool = False
+) -> None:
+    """
+    Process tasks until interrupted.
+
+    Args:
+        queue: Queue to lease tasks from.
+        worker_id: Name recorded with leases and results.
+        threads: Chunks processed concurrently by this worker.
+        lease_seconds: Lease period; extended while a chunk is processed.
+        poll_interval: Seconds to wait when the queue is empty.
+        exit_when_idle: Stop once no task can be leased.
+    """
+    worker_id = worker_id or default_worker_id()
+    if config.get("warm_up", True):
+        try:
+            endpoint_pool.warm_up(
+                [config["model_name"], EVAL_MODEL_NAME]
+                + ([cascade.fast_model] if cascade is not None else [])
+            )
+        except Exception as e:
+            logger.warning(f"Model warm-up failed, continuing cold: {e}")
+
+    def loop(slot):
+        name = f"{worker_id}/{slot}" if threads > 1 else worker_id
+        while True:
+            task = queue.lease(name, lease_seconds)
+            if task is None:
+                if exit_when_idle:
+                    return
+                time.sleep(poll_interval)
+                continue
+            process_task(queue, task, name, lease_seconds)
+
+    logger.info(f"Worker '{worker_id}' started with {threads} thread(s).")
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(loop, slot) for slot in range(threads)]:
+            future.result()
+    logger.info(f"Worker '{worker_id}' finished.")
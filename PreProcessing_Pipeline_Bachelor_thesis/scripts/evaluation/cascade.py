@@ -0,0 +1,126 @@
+"""
+Cheap-to-expensive model cascade for rephrasing.
+
+Most chunks are plain paragraphs that a small model rephrases well enough to
+pass evaluation. With a cascade, the first attempts of a chunk go to a fast
+model and the chunk escalates to the configured rephrase model only when an
+evaluation fails. Chunks a local difficulty estimate predicts to fail (long
+chunks, or a high density of numbers, identifiers, URLs and paths) go to the
+large model right away, so they do not pay for a doomed fast attempt.
+"""
+
+import json
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from scripts.evaluation.sampler import RISK_PATTERNS
+from scripts.processing.tokenizer import get_token_helper
+
+config_path = Path(__file__).resolve().parents[2] / "config.json"
+with open(config_path, "r", encoding="utf-8") as f:
+    config = json.load(f)
+
+
+def entity_density(text: str) -> float:
+    """Technical entities (numbers, identifiers, URLs, paths) per word."""
+    words = len(text.split())
+    if not words:
+        return 0.0
+    entities = sum(
+        len(pattern.findall(text)) for pattern in RISK_PATTERNS.values()
+    )
+    return entities / words
+
+
+class ModelCascade:
+    """
+    Picks the model for each rephrase attempt and counts the outcomes.
+
+    Args:
+        fast_model: Model tried first.
+        strong_model: Model used after escalation.
+        tokenizer_model: Tokenizer for the chunk length estimate.
+        max_tokens: Chunks longer than this start on the strong model.
+        max_entity_density: Chunks with more entities per word start on
+            the strong model.
+        fast_attempts: Failed fast attempts before a chunk escalates.
+    """
+
+    def __init__(
+        self, fast_model, strong_model, tokenizer_model, max_tokens=250,
+        max_entity_density=0.15, fast_attempts=1
+    ):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.tokenizer_model = tokenizer_model
+        self.max_tokens = max_tokens
+        self.max_entity_density = max_entity_density
+        self.fast_attempts = fast_attempts
+        self._models = defaultdict(lambda: defaultdict(int))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def predicts_failure(self, text: str) -> str | None:
+        """Reason the fast model is expected to fail on 'text', or None."""
+        tokens = get_token_helper(self.tokenizer_model).count_tokens(text)
+        if tokens > self.max_tokens:
+            return "long"
+        if entity_density(text) > self.max_entity_density:
+            return "entity_dense"
+        return None
+
+    def first_model(self, texts) -> str:
+        """Model for the first attempt at a chunk or a packed group of chunks."""
+        for text in texts:
+            reason = self.predicts_failure(text)
+            if reason is not None:
+                self._count(f"predicted_{reason}")
+                return self.strong_model
+        return self.fast_model
+
+    def model_for(self, attempt: int, first_model: str) -> str:
+        """Model for 'attempt' (1-based) of a chunk that started on 'first_model'."""
+        if first_model == self.fast_model and attempt <= self.fast_attempts:
+            return self.fast_model
+        if first_model == self.fast_model and attempt == self.fast_attempts + 1:
+            self._count("escalations")
+        return self.strong_model
+
+    def record(self, model: str, passed: bool | None) -> None:
+        """Count one attempt of 'model'; 'passed' is None if unevaluated."""
+        with self._lock:
+            stats = self._models[model]
+            stats["calls"] += 1
+            if passed is not None:
+                stats["evaluated"] += 1
+                stats["accepted"] += int(passed)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "models": {
+                    model: {
+                        **stats,
+                        "acceptance_rate": round(
+                            stats["accepted"] / stats["evaluated"], 4
+                        ) if stats["evaluated"] else None,
+                    }
+                    for model, stats in self._models.items()
+                },
+                **self._counts,
+            }
+
+
+cascade = ModelCascade(
+    config["cascade_model"],
+    config["model_name"],
+    config["tokenizer_model"],
+    max_tokens=config.get("cascade_max_tokens", 250),
+    max_entity_density=config.get("cascade_max_entity_density", 0.15),
+    fast_attempts=config.get("cascade_fast_attempts", 1),
+) if config.get("cascade", False) else None
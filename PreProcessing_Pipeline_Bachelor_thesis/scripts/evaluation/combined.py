@@ -0,0 +1,145 @@
+"""
+Single-call rephrase and self-evaluation.
+
+One structured-output request returns the rephrased text together with
+scores in the EvaluatorResult format, so an attempt costs one LLM call and
+one copy of the source text instead of two. Because a model judging its own
+output tends to be lenient, CalibrationPolicy selects attempts that are
+still sent to the independent evaluator: a fixed share of calibration
+samples and every self-evaluation that passes only narrowly or reports
+missing or hallucinated items.
+"""
+
+import threading
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from .evaluator import EVALUATOR_SCHEMA
+from .json_repair import json_loads, repair_json
+from .parsed_evaluator import CombinedResult
+from scripts.processing.rephraser import generate_text
+
+prompt_path = Path(__file__).resolve().parents[2] / "prompts" / "combined_prompt.txt"
+_raw_prompt = prompt_path.read_text(encoding="utf-8")
+
+_escaped = _raw_prompt.replace("{", "{{").replace("}", "}}")
+for placeholder in (
+    "feedback_section", "metric_descriptions", "header", "input_text"
+):
+    _escaped = _escaped.replace(f"{{{{{placeholder}}}}}", f"{{{placeholder}}}")
+
+COMBINED_PROMPT = _escaped
+
+COMBINED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rephrased_text": {"type": "string"},
+        "evaluation": EVALUATOR_SCHEMA,
+    },
+    "required": ["rephrased_text", "evaluation"],
+}
+
+FEEDBACK_SECTION = """
+Your previous rephrase of this segment received the following feedback:
+
+{feedback}
+
+Previous Rephrased Version (for your reference):
+{previous_rephrased_text}
+
+Correct the previous version using the feedback, while preserving all
+accurate information already present.
+"""
+
+
+def rephrase_and_evaluate(
+    chunk, metrics, feedback=None, previous_rephrased_text=None, model=None
+) -> tuple[dict, dict]:
+    """
+    Rephrase a chunk and score the rephrase in one request.
+
+    Returns (rephrased chunk, evaluation dict). Raises ValueError if the
+    response is not valid JSON for CombinedResult even after local repair.
+    """
+    header = chunk["metadata"].get("header", "")
+    feedback_section = ""
+    if feedback and previous_rephrased_text:
+        feedback_section = FEEDBACK_SECTION.format(
+            feedback=feedback, previous_rephrased_text=previous_rephrased_text
+        )
+    prompt = COMBINED_PROMPT.format(
+        feedback_section=feedback_section,
+        metric_descriptions="\n".join(
+            f"  - {m['name'].capitalize()}: {m['description']}" for m in metrics
+        ),
+        header=header,
+        input_text=chunk.get("page_content", ""),
+    )
+
+    text = generate_text(
+        prompt, f"chunk '{header}' with self-evaluation",
+        schema=COMBINED_SCHEMA, kind="combined",
+        source_text=chunk.get("page_content", ""), model=model
+    )
+    try:
+        data = json_loads(text)
+    except ValueError:
+        data = json_loads(repair_json(text))
+    try:
+        result = CombinedResult(**data)
+    except (TypeError, ValidationError) as e:
+        raise ValueError(f"Combined response failed validation: {e}") from e
+
+    rephrased = {
+        "metadata": chunk["metadata"],
+        "page_content": result.rephrased_text.strip()
+    }
+    return rephrased, result.evaluation.dict()
+
+
+class CalibrationPolicy:
+    """
+    Chooses which self-evaluated attempts get an independent evaluation.
+
+    Args:
+        metrics: Metric dicts with 'name' and 'threshold'.
+        calibration_rate: Share of attempts evaluated independently anyway.
+        low_confidence_margin: A passing self-score closer than this to its
+            threshold counts as low confidence.
+    """
+
+    def __init__(self, metrics, calibration_rate=0.1, low_confidence_margin=0.05):
+        self.metrics = metrics
+        self.stride = (
+            max(1, round(1 / calibration_rate)) if calibration_rate else None
+        )
+        self.margin = low_confidence_margin
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def is_low_confidence(self, evaluation: dict) -> bool:
+        if evaluation.get("missing_items") or evaluation.get("hallucinated_items"):
+            return True
+        scores = evaluation.get("scores") or {}
+        return any(
+            metric.get("threshold", 0.0)
+            <= scores.get(metric["name"], 0.0)
+            < metric.get("threshold", 0.0) + self.margin
+            for metric in self.metrics
+        )
+
+    def check(self, self_evaluation: dict, passed: bool) -> str | None:
+        """
+        Reason to evaluate independently ('calibration' or 'low_confidence'),
+        or None to trust the self-evaluation. Failing self-evaluations are
+        trusted: they only lead to another attempt.
+        """
+        with self._lock:
+            self._seen += 1
+            calibrate = self.stride is not None and self._seen % self.stride == 0
+        if calibrate:
+            return "calibration"
+        if passed and self.is_low_confidence(self_evaluation):
+            return "low_confidence"
+        return None
@@ -5,21 +5,19 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+from scripts.evaluation.cascade import cascade
+from scripts.evaluation.combined import CalibrationPolicy, rephrase_and_evaluate
 from scripts.evaluation.evaluator import Evaluator
+from scripts.evaluation.sampler import EvaluationSampler
 from scripts.logger.loggerSetup import setup_logger
-from scripts.processing.rephraser import rephrase_chunk
+from scripts.processing.rephraser import rephrase_chunk, rephrase_packed
 
 
 project_root = Path(__file__).resolve().parents[2]
 os.environ.setdefault('PYTHONPATH', str(project_root))
 
-# Load environment variables
+# Load environment variables (endpoints are resolved by scripts.backend)
 load_dotenv(project_root / '.env')
-OLLAMA_URL = os.getenv('OLLAMA_API_URL')
-if not OLLAMA_URL:
-    raise RuntimeError(
-        'OLLAMA_API_URL is not set in .env'
-    )
 
 # Load model parameters (used by Evaluator via its global scope)
 config_file = project_root / 'scripts' / 'evaluation' / 'eval_config.json'
@@ -29,6 +27,7 @@ with open(config_file, 'r', encoding='utf-8') as f:
 MODEL_NAME = config.get('model_name') # Used by Evaluator
 TEMPERATURE = config.get('temperature') # Used by Evaluator
 MAX_TOKENS = config.get('max_tokens') # Used by Evaluator
+EVAL_RETRIES = config.get('eval_retries', 2)
 
 metrics_file_path = project_root / 'scripts' / 'evaluation' / 'metrics.json'
 
@@ -36,33 +35,189 @@ metrics_file_path = project_root / 'scripts' / 'evaluation' / 'metrics.json'
 logger = setup_logger(__name__)
 evaluator = Evaluator(metrics_file_path=str(metrics_file_path))
 
+# Combined rephrase + self-evaluation requests (off unless configured)
+calibration = CalibrationPolicy(
+    evaluator.metrics,
+    calibration_rate=config.get('calibration_rate', 0.1),
+    low_confidence_margin=config.get('low_confidence_margin', 0.05),
+) if config.get('combined_mode', False) else None
+
+# Adaptive sampling of first-attempt evaluations (off unless configured)
+sampler = EvaluationSampler(
+    evaluator.metrics,
+    target_pass_rate=config.get('sampling_target_pass_rate', 0.9),
+    confidence=config.get('sampling_confidence', 0.95),
+    min_samples=config.get('sampling_min_samples', 20),
+    sample_rate=config.get('sampling_rate', 0.25),
+    recovery_window=config.get('sampling_recovery_window', 10),
+) if config.get('adaptive_sampling', False) else None
+
+
+def evaluate_with_retry(
+    original_text: str, rephrased_text: str, chunk_header: str,
+    retries: int = EVAL_RETRIES
+) -> dict:
+    """
+    Evaluates a rephrase, repeating only the evaluator call when its output
+    cannot be parsed or validated, so a formatting glitch does not cost a
+    full rephrase attempt. Request errors are raised immediately.
+    """
+    for eval_attempt in range(retries + 1):
+        try:
+            return evaluator.evaluate(original_text, rephrased_text)
+        except ValueError as eval_error:
+            if eval_attempt == retries:
+                raise
+            evaluator.count('evaluation_retries')
+            logger.warning(
+                "Chunk '%s' evaluator output unusable (%s). Retrying evaluation.",
+                chunk_header, eval_error
+            )
+
 
+def self_evaluated_attempt(
+    chunk_data: dict, chunk_header: str, feedback=None,
+    previous_rephrased_text=None, model=None
+) -> tuple[dict, dict]:
+    """
+    One combined rephrase + self-evaluation request. Calibration samples and
+    low-confidence self-evaluations are replaced by the independent
+    evaluator's result. Returns (rephrased chunk, evaluation).
+    """
+    rephrased_obj, self_evaluation = rephrase_and_evaluate(
+        chunk_data, evaluator.metrics, feedback=feedback,
+        previous_rephrased_text=previous_rephrased_text, model=model
+    )
+    evaluator.count('combined_calls')
+    self_passed, _ = evaluator.check_thresholds(self_evaluation)
+    reason = calibration.check(self_evaluation, self_passed)
+    if reason is None:
+        return rephrased_obj, self_evaluation
 
-def rephrase_with_evaluation(chunk_data: dict, max_attempts: int = 5) -> dict:
+    evaluator.count(f'{reason}_evaluations')
+    try:
+        evaluation = evaluate_with_retry(
+            chunk_data.get('page_content', ''), rephrased_obj['page_content'],
+            chunk_header
+        )
+    except Exception as eval_error:
+        logger.warning(
+            "Chunk '%s' independent evaluation failed (%s). "
+            "Keeping self-evaluation.", chunk_header, eval_error
+        )
+        return rephrased_obj, self_evaluation
+
+    if reason == 'calibration':
+        passed, _ = evaluator.check_thresholds(evaluation)
+        evaluator.count('calibration_agreements', int(passed == self_passed))
+        self_scores = self_evaluation.get('scores', {})
+        scores = evaluation.get('scores', {})
+        evaluator.count('calibration_score_error', sum(
+            abs(self_scores.get(m['name'], 0.0) - scores.get(m['name'], 0.0))
+            for m in evaluator.metrics
+        ) / len(evaluator.metrics))
+    return rephrased_obj, evaluation
+
+
+def rephrase_with_evaluation(
+    chunk_data: dict, max_attempts: int = 5, evaluate: bool = True,
+    initial_rephrase: dict = None, document: str = None,
+    initial_model: str = None
+) -> dict:
     """
     Repeatedly rephrase 'chunk_data' and evaluate it until it passes all metrics
     or until max_attempts is reached. Returns the best rephrased chunk.
+    With evaluate=False a single rephrase is returned unevaluated.
+    An 'initial_rephrase' (e.g. from a packed request by 'initial_model') is
+    used as the first attempt instead of requesting one. With adaptive
+    sampling enabled, the first attempt of a 'document' chunk may be accepted
+    unevaluated. With the model cascade enabled, early attempts go to the
+    fast model and failed chunks escalate to the rephrase model.
     """
     chunk_header = chunk_data['metadata'].get('header', 'Unknown Header')
     original_text = chunk_data.get('page_content', '')
 
+    def first_or_next_rephrase(attempt, **kwargs):
+        if attempt == 1 and initial_rephrase is not None:
+            return initial_rephrase
+        return rephrase_chunk(chunk_data, original_text=original_text, **kwargs)
+
+    # Without evaluation a failed fast attempt would go unnoticed
+    first_model = None
+    if cascade is not None and evaluate:
+        first_model = (
+            initial_model if initial_rephrase is not None
+            else cascade.first_model([original_text])
+        )
+
+    if not evaluate:
+        rephrased_obj = first_or_next_rephrase(1)
+        evaluator.count('attempts')
+        chunk_data['metadata']['attempts'] = 1
+        chunk_data['metadata']['status'] = 'unevaluated'
+        return rephrased_obj
+
     best_rephrase_obj = None
+    best_evaluation = None
     best_score_sum = -1.0
     last_feedback = None
     prev_rephrase_text = None
 
     for attempt in range(1, max_attempts + 1):
-        rephrased_obj = rephrase_chunk(
-            chunk_data,
-            feedback=last_feedback,
-            previous_rephrased_text=prev_rephrase_text,
-            original_text=original_text 
+        model = (
+            cascade.model_for(attempt, first_model)
+            if cascade is not None and evaluate else None
         )
+        self_evaluation = None
+        if calibration is not None:
+            try:
+                rephrased_obj, self_evaluation = self_evaluated_attempt(
+                    chunk_data, chunk_header, feedback=last_feedback,
+                    previous_rephrased_text=prev_rephrase_text, model=model
+                )
+            except ValueError as combined_error:
+                evaluator.count('combined_fallbacks')
+                logger.warning(
+                    "Chunk '%s' combined response unusable (%s). "
+                    "Falling back to separate calls.", chunk_header,
+                    combined_error
+                )
+        if self_evaluation is None:
+            rephrased_obj = first_or_next_rephrase(
+                attempt,
+                feedback=last_feedback,
+                previous_rephrased_text=prev_rephrase_text,
+                model=model
+            )
         rephrased_text = rephrased_obj['page_content']
+        evaluator.count('attempts')
+
+        # Fast-model attempts are always evaluated, they decide escalation
+        sampling = (
+            attempt == 1 and self_evaluation is None and sampler is not None
+            and document is not None
+            and (model is None or model == cascade.strong_model)
+        )
+        if sampling:
+            should_evaluate, reason = sampler.should_evaluate(
+                document, original_text, rephrased_text
+            )
+            if not should_evaluate:
+                evaluator.count('sampled_out')
+                if model is not None:
+                    cascade.record(model, None)
+                chunk_data['metadata']['attempts'] = 1
+                chunk_data['metadata']['status'] = 'not_sampled'
+                return rephrased_obj
 
         try:
-            evaluation_result = evaluator.evaluate(original_text, rephrased_text)
+            evaluation_result = self_evaluation or evaluate_with_retry(
+                original_text, rephrased_text, chunk_header
+            )
         except Exception as eval_error:
+            evaluator.count('wasted_attempts')
+            if model is not None:
+                cascade.record(model, None)
             logger.warning(
                 "Chunk '%s' evaluation failed on attempt %d: %s",
                 chunk_header, attempt, eval_error
@@ -84,18 +239,27 @@ def rephrase_with_evaluation(chunk_data: dict, max_attempts: int = 5) -> dict:
         )
 
         passed, message = evaluator.check_thresholds(evaluation_result)
+        if sampling:
+            sampler.record(document, evaluation_result, passed)
+        if model is not None:
+            cascade.record(model, passed)
                 
         current_score_sum = sum(evaluation_result.get('scores', {}).values())
 
         if current_score_sum > best_score_sum:
             best_score_sum = current_score_sum
             best_rephrase_obj = rephrased_obj
+            best_evaluation = evaluation_result
             logger.info(
                 "Chunk '%s', attempt %d is new best with score sum: %.2f",
                 chunk_header, attempt, best_score_sum
             )
 
         if passed:
+            chunk_data['metadata']['attempts'] = attempt
+            if model is not None:
+                chunk_data['metadata']['model'] = model
+            chunk_data['metadata']['evaluation'] = evaluation_result
             logger.info(
                 "Chunk '%s' accepted on attempt %d. Scores: %s",
                 chunk_header, attempt, evaluation_result.get('scores')
@@ -118,8 +282,10 @@ def rephrase_with_evaluation(chunk_data: dict, max_attempts: int = 5) -> dict:
         "Chunk '%s' failed all %d attempts. Returning best rephrase found.",
         chunk_header, max_attempts
     )
+    chunk_data['metadata']['attempts'] = max_attempts
     if best_rephrase_obj:
         best_rephrase_obj['metadata']['status'] = 'best_effort_failed_thresholds'
+        best_rephrase_obj['metadata']['evaluation'] = best_evaluation
         return best_rephrase_obj
 
     logger.error(
@@ -132,3 +298,50 @@ def rephrase_with_evaluation(chunk_data: dict, max_attempts: int = 5) -> dict:
         'page_content': original_text,
         'status': 'failed_all_attempts_no_best'
     }
+
+
+def rephrase_group_with_evaluation(
+    chunks: list, max_attempts: int = 5, evaluate: bool = True, on_error=None,
+    document: str = None
+) -> list:
+    """
+    Rephrase a group of small chunks with one packed request, then evaluate
+    and retry each chunk on its own exactly as rephrase_with_evaluation does.
+    If the packed request fails or its response cannot be split, every chunk
+    falls back to single-chunk requests.
+
+    If a chunk raises, on_error(chunk, error) supplies its result; without
+    on_error the exception propagates.
+    """
+    initial = [None] * len(chunks)
+    pack_model = None
+    # In combined mode every attempt carries its own self-evaluation
+    if len(chunks) > 1 and calibration is None:
+        if cascade is not None and evaluate:
+            pack_model = cascade.first_model(
+                [chunk.get('page_content', '') for chunk in chunks]
+            )
+        try:
+            initial = rephrase_packed(chunks, model=pack_model)
+            evaluator.count('packed_requests')
+            evaluator.count('packed_chunks', len(chunks))
+        except Exception as e:
+            evaluator.count('packing_fallbacks')
+            logger.warning(
+                "Packed request for %d chunks failed (%s). "
+                "Falling back to single-chunk requests.", len(chunks), e
+            )
+
+    results = []
+    for chunk, rephrase in zip(chunks, initial):
+        try:
+            results.append(rephrase_with_evaluation(
+                chunk, max_attempts=max_attempts, evaluate=evaluate,
+                initial_rephrase=rephrase, document=document,
+                initial_model=pack_model
+            ))
+        except Exception as e:
+            if on_error is None:
+                raise
+            results.append(on_error(chunk, e))
+    return results
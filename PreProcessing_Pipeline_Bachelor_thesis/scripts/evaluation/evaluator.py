@@ -3,23 +3,25 @@ Handles the evaluation of rephrased text against an original text using an LLM.
 
 This module loads evaluation configuration, model parameters, and prompt templates
 to interact with an Ollama API endpoint for generating evaluations based on
-predefined metrics. It validates the LLM's response against a JSON schema.
+predefined metrics. The JSON schema is sent to Ollama as a structured-output
+format, and the LLM's response is repaired locally if it arrives truncated or
+lightly malformed before it is validated.
 """
 
 import json
-import os
+import threading
+from collections import Counter
 from pathlib import Path
 
 import requests
-from dotenv import load_dotenv
 from pydantic import ValidationError
 
+from .json_repair import json_loads, repair_json
 from .parsed_evaluator import EvaluatorResult
+from scripts.backend.endpoint_pool import endpoint_pool
+from scripts.backend.request_sizing import request_sizer
 from scripts.logger.loggerSetup import setup_logger
 
-load_dotenv()
-OLLAMA_URL = os.getenv("OLLAMA_API_URL")
-
 base_dir = Path(__file__).resolve().parent
 config_path = base_dir / "eval_config.json"
 
@@ -66,6 +68,40 @@ class Evaluator:
             metrics_file_path: Path to the JSON file containing evaluation metrics.
         """
         self.metrics = self._load_metrics(metrics_file_path)
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def count(self, key: str, n: int = 1) -> None:
+        """Increments a run statistic such as 'repaired' or 'wasted_attempts'."""
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def stats(self) -> dict:
+        """
+        Returns the evaluation counters of this run.
+
+        'wasted_attempt_rate' is the share of rephrase attempts that were
+        discarded only because their evaluation could not be obtained. In
+        combined mode, 'calibration_agreement_rate' and
+        'calibration_mean_abs_error' compare self-evaluations with the
+        independent evaluator on calibration samples.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        attempts = stats.get("attempts", 0)
+        stats["wasted_attempt_rate"] = (
+            round(stats.get("wasted_attempts", 0) / attempts, 4)
+            if attempts else 0.0
+        )
+        samples = stats.get("calibration_evaluations", 0)
+        if samples:
+            stats["calibration_agreement_rate"] = round(
+                stats.get("calibration_agreements", 0) / samples, 4
+            )
+            stats["calibration_mean_abs_error"] = round(
+                stats.pop("calibration_score_error", 0.0) / samples, 4
+            )
+        return stats
 
     def _load_metrics(self, path: str) -> list[dict]:
         """
@@ -115,12 +151,17 @@ class Evaluator:
             rephrased_text=rephrased_text
         )
 
-    def _send_ollama_request(self, prompt: str) -> dict:
+    def _send_ollama_request(self, prompt: str, input_text: str = None) -> dict:
         """
         Sends a request to Ollama and returns the parsed JSON response.
 
+        The context window and generation length are sized from the prompt
+        and 'input_text'; a response truncated by that limit is requested
+        again with a larger one.
+
         Args:
             prompt: The prompt to send.
+            input_text: The original text the evaluation refers to.
 
         Returns:
             The JSON response.
@@ -133,29 +174,40 @@ class Evaluator:
             "model": model_name,
             "prompt": prompt,
             "stream": False,
-            "format": "json", 
+            "format": EVALUATOR_SCHEMA,
             "options": {
                 "temperature": temperature,
                 "max_tokens": max_tokens,
             },
         }
-        try:
-            response = requests.post(OLLAMA_URL, json=payload, timeout=120)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ollama API request failed: {e}")
-            raise
-
-        try:
-            return response.json()
-        except requests.exceptions.JSONDecodeError as e:
-            logger.error(
-                f"Failed to parse Ollama API response as JSON: '{response.text}'. "
-                f"Error: {e}"
-            )
-            raise ValueError(
-                f"Failed to parse Ollama API response as JSON: {e}"
-            ) from e
+        sizing = None
+        if request_sizer is not None:
+            sizing = request_sizer.apply(payload, "evaluate", input_text or prompt)
+
+        while True:
+            try:
+                response = endpoint_pool.generate(payload, timeout=120)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Ollama API request failed: {e}")
+                raise
+
+            try:
+                response_json = json_loads(response.content)
+            except ValueError as e:
+                logger.error(
+                    f"Failed to parse Ollama API response as JSON: '{response.text}'. "
+                    f"Error: {e}"
+                )
+                raise ValueError(
+                    f"Failed to parse Ollama API response as JSON: {e}"
+                ) from e
+            endpoint_pool.record_usage(response_json)
+            if sizing is None or not (
+                request_sizer.record(payload, sizing, response_json)
+                and request_sizer.grow(payload, sizing)
+            ):
+                return response_json
 
     def _process_ollama_response(self, response_json: dict) -> EvaluatorResult:
         """
@@ -181,21 +233,28 @@ class Evaluator:
             )
 
         try:
-            parsed_eval_data = json.loads(raw_eval_json_str)
-        except json.JSONDecodeError as e:
-            logger.error(
-                f"Invalid JSON in Ollama 'response' field: '{raw_eval_json_str}'. "
-                f"Error: {e}"
-            )
-            raise ValueError(
-                f"Invalid JSON in Ollama 'response' field: {e}\n"
-                f">>> {raw_eval_json_str}"
-            ) from e
+            parsed_eval_data = json_loads(raw_eval_json_str)
+        except ValueError as e:
+            try:
+                parsed_eval_data = json_loads(repair_json(raw_eval_json_str))
+            except ValueError:
+                self.count("invalid_json")
+                logger.error(
+                    f"Invalid JSON in Ollama 'response' field: "
+                    f"'{raw_eval_json_str}'. Error: {e}"
+                )
+                raise ValueError(
+                    f"Invalid JSON in Ollama 'response' field: {e}\n"
+                    f">>> {raw_eval_json_str}"
+                ) from e
+            self.count("repaired_json")
+            logger.info("Repaired malformed evaluator JSON locally.")
 
         try:
             validated_result = EvaluatorResult(**parsed_eval_data)
             return validated_result
         except ValidationError as ve:
+            self.count("schema_invalid")
             error_items = [
                 f"{'.'.join(map(str, err['loc']))}: {err['msg']}"
                 for err in ve.errors()
@@ -220,8 +279,9 @@ class Evaluator:
         Returns:
             A dictionary containing validated evaluation scores and reasoning.
         """
+        self.count("evaluations")
         prompt = self._build_prompt(input_text, rephrased_text)
-        api_response_json = self._send_ollama_request(prompt)
+        api_response_json = self._send_ollama_request(prompt, input_text)
         validated_result = self._process_ollama_response(api_response_json)
         return validated_result.dict()
 
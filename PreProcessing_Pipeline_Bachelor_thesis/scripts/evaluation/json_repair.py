@@ -0,0 +1,108 @@
+"""
+Local repair of truncated or lightly malformed evaluator JSON.
+
+LLM output that hits the generation limit stops mid-object, and models
+occasionally wrap JSON in code fences or leave trailing commas. These cases
+are cheap to fix locally and do not justify another round trip to the LLM.
+The repair is purely syntactic; the result still has to pass the
+EvaluatorResult validation.
+"""
+
+import json
+import re
+
+try:
+    import orjson
+
+    def json_loads(data):
+        """Parse JSON with orjson; accepts str or bytes."""
+        return orjson.loads(data)
+except ImportError:  # pragma: no cover - orjson is optional
+    def json_loads(data):
+        """Parse JSON with the standard library; accepts str or bytes."""
+        return json.loads(data)
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+# Number or literal cut off before it was complete: "-", "0.", "1e-", "tru"
+_PARTIAL_VALUE = re.compile(
+    r"(?<=[:\[,\s])(?:-|-?\d+(?:\.|(?:\.\d+)?[eE][-+]?)"
+    r"|t|tr|tru|f|fa|fal|fals|n|nu|nul)$"
+)
+
+
+def _drop_trailing_comma(out: list) -> None:
+    """Removes a comma (and whitespace after it) at the end of 'out'."""
+    i = len(out)
+    while i and out[i - 1].isspace():
+        i -= 1
+    if i and out[i - 1] == ",":
+        del out[i - 1:]
+
+
+def repair_json(text: str) -> str:
+    """
+    Returns a best-effort syntactically valid version of 'text'.
+
+    Strips code fences and surrounding prose, removes trailing commas
+    outside of strings, terminates an unfinished string, drops a dangling
+    key, value fragment or comma and closes all brackets that are still
+    open. String contents are never changed.
+    """
+    text = _FENCE.sub("", text.strip())
+    start = text.find("{")
+    if start == -1:
+        return text
+    text = text[start:]
+
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    string_start = 0
+    complete = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            string_start = len(out)
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            if not stack:
+                out.append(ch)
+                complete = True
+                break
+        out.append(ch)
+
+    text = "".join(out)
+    if complete:
+        return text
+
+    if in_string:
+        before = text[:string_start].rstrip()
+        if stack and stack[-1] == "}" and before.endswith(("{", ",")):
+            # Truncated inside an object key; there is no value to keep.
+            text = before
+        else:
+            if escaped:
+                text = text[:-1]
+            text += '"'
+
+    # A value that was cut off after its key or a separator, or in the
+    # middle of a number or literal, cannot be completed, so drop the
+    # dangling fragment (with its key) instead of inventing a value.
+    text = _PARTIAL_VALUE.sub("", text.rstrip()).rstrip()
+    text = re.sub(r',?\s*"(?:[^"\\]|\\.)*"\s*:\s*$', "", text)
+    if stack and stack[-1] == "}":
+        text = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"$', r"\1", text)
+    text = re.sub(r"[,:]\s*$", "", text)
+    return text + "".join(reversed(stack))
@@ -26,3 +26,10 @@ class EvaluatorResult(BaseModel):
 
     class Config:
         extra = "forbid"  # disallow extra fields
+
+class CombinedResult(BaseModel):
+    rephrased_text: str = Field(..., min_length=1)
+    evaluation: EvaluatorResult
+
+    class Config:
+        extra = "forbid"
@@ -0,0 +1,165 @@
+"""
+Adaptive sampling of LLM evaluations.
+
+Tracks the first-attempt pass rate of each document, overall and per
+metric, and once the one-sided Wilson lower bound of every rate is above
+the target, only every n-th first attempt is sent to the evaluator; the
+others are accepted unevaluated. Chunks with cheap local risk signals
+(numbers, identifiers, URLs, paths, a much shorter rephrase) are always
+evaluated. A failed evaluation switches the document back to full
+evaluation until a run of consecutive passes has been seen again.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from statistics import NormalDist
+
+RISK_PATTERNS = {
+    "numbers": re.compile(r"\d"),
+    "identifiers": re.compile(
+        r"\b[a-z]+[A-Z]\w*\b"          # camelCase
+        r"|\b[A-Za-z]+_\w+\b"          # snake_case
+        r"|\b\w+\(\)"                  # call()
+        r"|\b[A-Z]{2,}[A-Z0-9]*\b"     # ACRONYMS / CONSTANTS
+    ),
+    "urls_or_paths": re.compile(r"https?://|\w+/\w+|\w+\.\w+\.\w+|\\\w+"),
+}
+
+# A rephrase shorter than this share of the original may have dropped content
+MIN_LENGTH_RATIO = 0.6
+
+
+def wilson_lower_bound(passes: int, n: int, confidence: float) -> float:
+    """One-sided Wilson score lower bound of a pass rate."""
+    if n == 0:
+        return 0.0
+    z = NormalDist().inv_cdf(confidence)
+    p = passes / n
+    denominator = 1 + z * z / n
+    centre = p + z * z / (2 * n)
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+    return max(0.0, (centre - margin) / denominator)
+
+
+def risk_signals(original_text: str, rephrased_text: str) -> list:
+    """Names of the local risk signals found in a chunk and its rephrase."""
+    signals = [
+        name for name, pattern in RISK_PATTERNS.items()
+        if pattern.search(original_text)
+    ]
+    if len(rephrased_text) < MIN_LENGTH_RATIO * len(original_text):
+        signals.append("short_rephrase")
+    return signals
+
+
+class EvaluationSampler:
+    """
+    Decides which first attempts are evaluated and keeps the statistics.
+
+    Args:
+        metrics: Metric dicts with 'name' and 'threshold' (metrics.json).
+        target_pass_rate: Pass rate the lower bound must reach to sample.
+        confidence: Confidence level of the lower bound.
+        min_samples: Evaluations per document before sampling may start.
+        sample_rate: Share of unflagged first attempts evaluated once stable.
+        recovery_window: Consecutive passes needed after a failure.
+    """
+
+    def __init__(
+        self, metrics, target_pass_rate=0.9, confidence=0.95, min_samples=20,
+        sample_rate=0.25, recovery_window=10
+    ):
+        self.metrics = metrics
+        self.target_pass_rate = target_pass_rate
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.stride = max(1, round(1 / sample_rate))
+        self.recovery_window = recovery_window
+        self._docs = defaultdict(lambda: {
+            "counts": Counter(), "metric_passes": Counter(), "streak": 0,
+            "recovering": False, "since_sample": 0,
+        })
+        self._lock = threading.Lock()
+
+    def _lower_bounds(self, doc) -> dict:
+        n = doc["counts"]["evaluated"]
+        bounds = {
+            "overall": wilson_lower_bound(
+                doc["counts"]["passed"], n, self.confidence
+            )
+        }
+        for metric in self.metrics:
+            bounds[metric["name"]] = wilson_lower_bound(
+                doc["metric_passes"][metric["name"]], n, self.confidence
+            )
+        return bounds
+
+    def _stable(self, doc) -> bool:
+        if doc["recovering"] or doc["counts"]["evaluated"] < self.min_samples:
+            return False
+        return all(
+            bound >= self.target_pass_rate
+            for bound in self._lower_bounds(doc).values()
+        )
+
+    def should_evaluate(
+        self, document: str, original_text: str, rephrased_text: str
+    ) -> tuple[bool, str]:
+        """Whether to evaluate a first attempt, and the reason."""
+        signals = risk_signals(original_text, rephrased_text)
+        with self._lock:
+            doc = self._docs[document]
+            if signals:
+                doc["counts"]["risk_flagged"] += 1
+                return True, "risk:" + ",".join(signals)
+            if not self._stable(doc):
+                return True, "recovering" if doc["recovering"] else "unstable"
+            doc["since_sample"] += 1
+            if doc["since_sample"] >= self.stride:
+                doc["since_sample"] = 0
+                return True, "sampled"
+            doc["counts"]["skipped"] += 1
+            return False, "sampled_out"
+
+    def record(self, document: str, evaluation: dict, passed: bool) -> None:
+        """Record the evaluation of a first attempt."""
+        scores = evaluation.get("scores") or {}
+        with self._lock:
+            doc = self._docs[document]
+            was_sampling = self._stable(doc)
+            doc["counts"]["evaluated"] += 1
+            for metric in self.metrics:
+                if scores.get(metric["name"], 0.0) >= metric.get("threshold", 0.0):
+                    doc["metric_passes"][metric["name"]] += 1
+            if passed:
+                doc["counts"]["passed"] += 1
+                doc["streak"] += 1
+                if doc["recovering"] and doc["streak"] >= self.recovery_window:
+                    doc["recovering"] = False
+            else:
+                if was_sampling:
+                    doc["counts"]["reverted_to_full"] += 1
+                doc["streak"] = 0
+                doc["recovering"] = True
+
+    def report(self) -> dict:
+        """Per-document sampling statistics and the confidence achieved."""
+        with self._lock:
+            report = {}
+            for document, doc in self._docs.items():
+                counts = doc["counts"]
+                n = counts["evaluated"]
+                bounds = self._lower_bounds(doc)
+                report[document] = {
+                    **dict(counts),
+                    "pass_rate": round(counts["passed"] / n, 4) if n else None,
+                    "confidence": self.confidence,
+                    "pass_rate_lower_bound": round(bounds.pop("overall"), 4),
+                    "metric_lower_bounds": {
+                        name: round(bound, 4) for name, bound in bounds.items()
+                    },
+                    "sampling_active": self._stable(doc),
+                }
+            return report
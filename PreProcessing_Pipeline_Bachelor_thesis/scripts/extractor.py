@@ -1,7 +1,6 @@
-import json
 import fitz  # PyMuPDF
 import numpy as np
-from pathlib import Path
+from scripts.artifact_store import artifact_path, write_artifact
 from scripts.logger.loggerSetup import setup_logger
 
 logger = setup_logger(__name__)
@@ -87,9 +86,7 @@ def process_sections(blocks):
     return sections
 
 
-def extract_sections(
-    pdf_path: str, base_name: str = None, timestamp: str = None
-):
+def extract_sections(pdf_path: str, base_name: str = None):
     """Extract structured sections from a PDF."""
     logger.info("Extracting content from PDF...")
 
@@ -103,13 +100,10 @@ def extract_sections(
 
     logger.info(f"Extracted {len(sections)} sections.")
 
-    if base_name and timestamp:
-        output_path = (
-            Path("data/extracted") / f"{base_name}_raw_sections_{timestamp}.json"
+    if base_name:
+        output_path = write_artifact(
+            artifact_path(base_name, "sections"), sections
         )
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(sections, f, indent=2, ensure_ascii=False)
         logger.info(f"Saved raw sections to {output_path}")
 
     return sections
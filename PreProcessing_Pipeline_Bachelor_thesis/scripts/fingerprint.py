@@ -0,0 +1,91 @@
+"""
+Input fingerprints for incremental stage execution.
+
+Each pipeline stage hashes everything that determines its output: the
+upstream artifact or PDF, the relevant config.json keys, the prompt files it
+uses and the source of the code it runs. The fingerprint is stored together
+with the stage's output paths in ``fingerprints.json`` next to the artifacts,
+and a stage whose fingerprint is unchanged and whose outputs still exist can
+be skipped.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPTS_DIR.parent
+PROMPT_DIR = PROJECT_ROOT / "prompts"
+
+
+def hash_file(path) -> str:
+    """SHA-256 of a file's content, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_version(patterns) -> str:
+    """Combined hash of the source files matching 'patterns' under scripts/."""
+    digest = hashlib.sha256()
+    files = sorted({
+        path for pattern in patterns for path in SCRIPTS_DIR.glob(pattern)
+    })
+    for path in files:
+        digest.update(str(path.relative_to(SCRIPTS_DIR)).encode("utf-8"))
+        digest.update(hash_file(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def compute_fingerprint(stage: str, config: dict, spec: dict, inputs) -> str:
+    """
+    Fingerprint of a stage run.
+
+    Args:
+        stage: Stage name.
+        config: Loaded config.json.
+        spec: Stage spec with 'config_keys', 'prompts' and 'code' lists.
+        inputs: Paths of the files the stage reads.
+    """
+    payload = {
+        "stage": stage,
+        "inputs": [hash_file(p) for p in inputs],
+        "config": {k: config.get(k) for k in spec.get("config_keys", [])},
+        "prompts": {
+            name: hash_file(PROMPT_DIR / name) for name in spec.get("prompts", [])
+        },
+        "code": code_version(spec.get("code", [])),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class FingerprintStore:
+    """Per-document record of the last fingerprint and outputs of each stage."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._records = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._records = json.load(f)
+
+    def is_current(self, stage: str, fingerprint: str) -> bool:
+        record = self._records.get(stage)
+        if not record or record.get("fingerprint") != fingerprint:
+            return False
+        return all(Path(p).exists() for p in record.get("outputs", []))
+
+    def outputs(self, stage: str) -> list:
+        return self._records.get(stage, {}).get("outputs", [])
+
+    def record(self, stage: str, fingerprint: str, outputs) -> None:
+        self._records[stage] = {
+            "fingerprint": fingerprint,
+            "outputs": [str(p) for p in outputs],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self._records, f, indent=2, ensure_ascii=False)
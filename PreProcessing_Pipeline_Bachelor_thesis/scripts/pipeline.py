@@ -1,66 +1,447 @@
 import datetime
 import json
+import time
+from contextlib import nullcontext
 from pathlib import Path
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from collections import defaultdict
 
+from scripts.artifact_store import artifact_path, read_artifact, write_artifact
+from scripts.distributed.coordinator import (
+    enqueue_chunks, spawn_local_workers, wait_for_results
+)
+from scripts.distributed.work_queue import open_queue
 from scripts.extractor import extract_sections
+from scripts.fingerprint import FingerprintStore, compute_fingerprint
+from scripts.profiler import StageProfiler
+from scripts.processing.budget import RunBudget
 from scripts.processing.chunker import chunk_sections
-from scripts.evaluation.eval_output import rephrase_with_evaluation
+from scripts.processing.packer import pack_units
+from scripts.processing.scheduler import AttemptHistory, history_key, lpt_order
+from scripts.backend.endpoint_pool import endpoint_pool
+from scripts.backend.request_sizing import request_sizer
+from scripts.evaluation.cascade import cascade
+from scripts.evaluation.eval_output import (
+    evaluate_with_retry, evaluator, rephrase_group_with_evaluation, sampler,
+    MODEL_NAME as EVAL_MODEL_NAME
+)
 from scripts.exporter import export_to_pdf
 from scripts.logger.loggerSetup import setup_logger
 
 logger = setup_logger(__name__)
 
+STAGE_ORDER = ["extract", "chunk", "rephrase", "evaluate", "export"]
 
-def run_pipeline(input_pdf_path: str) -> None:
-    pdf_path = Path(input_pdf_path)
-    base_name = pdf_path.stem
+# What each stage's output depends on besides its input files
+STAGES = {
+    "extract": {
+        "config_keys": [],
+        "prompts": [],
+        "code": ["extractor.py", "artifact_store.py"],
+    },
+    "chunk": {
+        "config_keys": [
+            "chunk_size", "chunk_overlap", "tokenizer_model", "max_tokens_check"
+        ],
+        "prompts": [],
+        "code": ["processing/chunker.py", "processing/tokenizer.py"],
+    },
+    "rephrase": {
+        "config_keys": [
+            "model_name", "temperature", "max_tokens", "max_attempts",
+            "packing", "pack_max_chunk_tokens", "pack_token_budget",
+            "pack_max_chunks", "request_sizing", "rephrase_output_ratio",
+            "rephrase_output_overhead", "evaluation_output_tokens",
+            "evaluation_item_ratio", "min_context", "cascade",
+            "cascade_model", "cascade_max_tokens",
+            "cascade_max_entity_density", "cascade_fast_attempts"
+        ],
+        "prompts": [
+            "rephraser_prompt.txt", "feedback_prompt.txt",
+            "packed_rephraser_prompt.txt", "evaluator_prompt.txt"
+        ],
+        "code": [
+            "processing/rephraser.py", "processing/packer.py",
+            "evaluation/*.py", "evaluation/*.json",
+            "backend/*.py"
+        ],
+    },
+    "evaluate": {
+        "config_keys": [
+            "request_sizing", "evaluation_output_tokens",
+            "evaluation_item_ratio", "min_context"
+        ],
+        "prompts": ["evaluator_prompt.txt"],
+        "code": ["evaluation/*.py", "evaluation/*.json"],
+    },
+    "export": {
+        "config_keys": [],
+        "prompts": [],
+        "code": ["exporter.py"],
+    },
+}
 
-    config_path = Path("config.json")
-    with open(config_path, "r", encoding="utf-8") as f:
-        config = json.load(f)
 
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
-        output_dir = Path("data/output")
-        log_dir = Path("logs")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        log_dir.mkdir(parents=True, exist_ok=True)
+def warm_up_models(*models) -> None:
+    """Load the LLMs before dispatching work; failures are not fatal."""
+    logger.info(f"Warming up models: {', '.join(dict.fromkeys(models))}")
+    try:
+        endpoint_pool.warm_up(models)
+    except Exception as e:
+        logger.warning(f"Model warm-up failed, continuing cold: {e}")
 
-        rephrase_pdf_path = output_dir / f"{base_name}_Rephrased_{timestamp}.pdf"
-        error_log_file = log_dir / f"{base_name}_failed_chunks__{timestamp}.json"
 
-        sections = extract_sections(
-            str(pdf_path), base_name=base_name, timestamp=timestamp
+class PipelineRun:
+    """
+    One invocation of the pipeline for a PDF.
+
+    Each stage reads the artifacts of the previous stage from
+    data/artifacts/<name>/ and is skipped when the fingerprint of its
+    inputs matches the one recorded by its last successful run.
+    """
+
+    def __init__(
+        self, input_pdf_path: str, force: bool = False, deadline=None,
+        token_budget=None, queue=None, local_workers: int = 0,
+        profile: bool = False, job_id=None
+    ):
+        self.pdf_path = Path(input_pdf_path)
+        self.base_name = self.pdf_path.stem
+        self.force = force
+        self.deadline = deadline
+        self.token_budget = token_budget
+        self.budget = None
+        self.queue = queue
+        self.local_workers = local_workers
+        self.stage_fingerprints = {}
+        self.job_id = job_id
+        self.progress = {"stage": None, "done": 0, "total": 0}
+
+        with open(Path("config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        self.timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+        self.output_dir = Path("data/output")
+        self.log_dir = Path("logs")
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+
+        self.fingerprints = FingerprintStore(
+            artifact_path(self.base_name, "fingerprints").with_suffix(".json")
+        )
+        self.report = {"input": str(self.pdf_path), "stages": {}}
+        self.profiler = StageProfiler(
+            self.log_dir / f"{self.base_name}_profile_{self.timestamp}",
+            interval=self.config.get("profile_interval_ms", 5) / 1000,
+            top_n=self.config.get("profile_top_n", 15),
+        ) if profile else None
+
+    def artifact(self, kind: str) -> Path:
+        return artifact_path(self.base_name, kind)
+
+    def llm_job(self):
+        """Attribute LLM requests of the current thread to this run's job."""
+        if self.job_id is None or endpoint_pool.scheduler is None:
+            return nullcontext()
+        return endpoint_pool.scheduler.job(self.job_id)
+
+    def run(self, stages) -> None:
+        started = time.perf_counter()
+        if self.profiler:
+            self.profiler.start()
+        try:
+            for stage in stages:
+                self.run_stage(stage)
+        finally:
+            if self.profiler:
+                self.profiler.stop()
+                self.report["profile"] = self.profiler.write()
+        self.report["duration_s"] = round(time.perf_counter() - started, 1)
+        self.write_report()
+
+    def run_stage(self, stage: str) -> None:
+        inputs = self.stage_inputs(stage)
+        missing = [p for p in inputs if not Path(p).exists()]
+        if missing:
+            previous = STAGE_ORDER[STAGE_ORDER.index(stage) - 1]
+            raise FileNotFoundError(
+                f"Stage '{stage}' needs {missing[0]}; run '{previous}' first."
+            )
+
+        fingerprint = compute_fingerprint(
+            stage, self.config, STAGES[stage], inputs
         )
+        if not self.force and self.fingerprints.is_current(stage, fingerprint):
+            logger.info(f"Stage '{stage}' is up to date, skipping.")
+            self.report["stages"][stage] = {"status": "skipped"}
+            return
+
+        logger.info(f"Running stage '{stage}'...")
+        self.stage_fingerprints[stage] = fingerprint
+        self.progress = {"stage": stage, "done": 0, "total": 0}
+        started = time.perf_counter()
+        if self.profiler:
+            with self.profiler.stage(stage):
+                outputs = getattr(self, f"stage_{stage}")()
+        else:
+            outputs = getattr(self, f"stage_{stage}")()
+        if outputs is not None:
+            self.fingerprints.record(stage, fingerprint, outputs)
+        self.report["stages"][stage] = {
+            "status": "ran",
+            "duration_s": round(time.perf_counter() - started, 1),
+        }
+
+    def stage_inputs(self, stage: str) -> list:
+        return {
+            "extract": [self.pdf_path],
+            "chunk": [self.artifact("sections")],
+            "rephrase": [self.artifact("chunks")],
+            "evaluate": [self.artifact("chunks"), self.artifact("rephrased")],
+            "export": [self.artifact("sections"), self.artifact("rephrased")],
+        }[stage]
+
+    def stage_extract(self) -> list:
+        sections = extract_sections(str(self.pdf_path), base_name=self.base_name)
         if not sections:
             raise ValueError("No sections extracted.")
+        self.report["sections"] = len(sections)
+        return [self.artifact("sections")]
 
+    def stage_chunk(self) -> list:
+        sections = read_artifact(self.artifact("sections"))
         logger.info("Chunking sections...")
         chunks = chunk_sections(
-            sections, config, chunk_overlap=config["chunk_overlap"]
+            sections, self.config, chunk_overlap=self.config["chunk_overlap"]
         )
+        write_artifact(self.artifact("chunks"), chunks)
+        self.report["chunks"] = len(chunks)
+        return [self.artifact("chunks")]
+
+    def stage_rephrase(self) -> list:
+        chunks = read_artifact(self.artifact("chunks"))
+        config = self.config
+        history = AttemptHistory(
+            config.get("attempt_history", "logs/attempt_history.json")
+        )
+        if config.get("lpt_scheduling", True):
+            order = lpt_order(chunks, history, self.base_name)
+        else:
+            order = range(len(chunks))
+
+        if self.queue:
+            results, errors = self.rephrase_distributed(chunks, order)
+        else:
+            results, errors = self.rephrase_local(chunks, order)
+
+        for chunk in results:
+            attempts = chunk["metadata"].get("attempts")
+            if attempts:
+                history.record(history_key(self.base_name, chunk), attempts)
+        history.save()
+
+        write_artifact(self.artifact("rephrased"), results)
+
+        if errors:
+            error_log_file = (
+                self.log_dir
+                / f"{self.base_name}_failed_chunks__{self.timestamp}.json"
+            )
+            with open(error_log_file, "w", encoding="utf-8") as f:
+                json.dump(errors, f, indent=2, ensure_ascii=False)
+
+        self.report["chunks"] = len(chunks)
+        self.report["failed_chunks"] = len(errors)
+        if self.budget is not None and self.budget.active:
+            self.report["budget"] = self.budget.report()
+        if self.budget is not None and self.budget.degradations:
+            # Degraded results are usable but should not satisfy a later
+            # run without deadline pressure, so no fingerprint is recorded.
+            return None
+        return [self.artifact("rephrased")]
+
+    def units(self, chunks, order) -> list:
+        """Index tuples to rephrase together; small chunks are packed."""
+        config = self.config
+        if not config.get("packing", True):
+            return [(i,) for i in order]
+        return pack_units(
+            chunks, order,
+            max_chunk_tokens=config.get("pack_max_chunk_tokens", 80),
+            token_budget=config.get("pack_token_budget", 400),
+            max_chunks=config.get("pack_max_chunks", 8),
+        )
+
+    def rephrase_local(self, chunks, order):
+        """Rephrase all chunks in this process; returns (results, errors)."""
+        config = self.config
+        if config.get("warm_up", True):
+            warm_up_models(
+                config["model_name"], EVAL_MODEL_NAME,
+                *([cascade.fast_model] if cascade is not None else [])
+            )
 
         logger.info("Rephrasing chunks...")
         errors = {}
+        budget = self.budget = RunBudget(
+            chunks,
+            max_attempts=config.get("max_attempts", 5),
+            deadline=self.deadline,
+            token_budget=self.token_budget,
+            tokens_used=endpoint_pool.tokens_used,
+            low_value_tokens=config.get("low_value_tokens", 40),
+        )
 
-        def process(chunk):
+        def on_error(chunk, e):
             header = chunk["metadata"].get("header", "Unknown Header")
-            chunk_id = chunk["metadata"].get("chunk_id", "unknown_chunk")
-            logger.info(f"Processing: Header='{header}' | Chunk ID='{chunk_id}'")
+            logger.warning(f"Chunk '{header}' failed rephrasing: {e}")
+            errors[header] = str(e)
+            return {
+                "metadata": chunk["metadata"],
+                "page_content": chunk["page_content"]
+            }
+
+        def process(unit):
+            group = [chunks[i] for i in unit]
+            chunk_ids = ", ".join(
+                c["metadata"].get("chunk_id", "unknown_chunk") for c in group
+            )
+            plan = budget.plan(group, key=unit)
+            if plan["defer"]:
+                logger.info(f"Deferring low-value chunk(s) '{chunk_ids}'")
+                return None
+
+            logger.info(
+                f"Processing: Header='{group[0]['metadata'].get('header')}' "
+                f"| Chunk ID(s)='{chunk_ids}'"
+            )
             try:
-                return rephrase_with_evaluation(chunk)
-            except Exception as e:
-                logger.warning(f"Chunk '{header}' failed rephrasing: {e}")
-                errors[header] = str(e)
-                return {
-                    "metadata": chunk["metadata"],
-                    "page_content": chunk["page_content"]
-                }
-
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            results = list(tqdm(executor.map(process, chunks), total=len(chunks)))
+                with self.llm_job():
+                    return rephrase_group_with_evaluation(
+                        group, max_attempts=plan["max_attempts"],
+                        evaluate=plan["evaluate"], on_error=on_error,
+                        document=self.base_name
+                    )
+            finally:
+                for chunk in group:
+                    budget.complete(chunk)
+
+        # Dispatch the most expensive chunks first, reassemble in document order
+        # Chunks deferred under deadline/budget pressure run in a second pass.
+        results = [None] * len(chunks)
+        self.progress["total"] = len(chunks)
+        workers = config.get("rephrase_workers") or endpoint_pool.concurrency()
+        logger.info(f"Rephrasing with {workers} concurrent requests.")
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="rephrase"
+        ) as executor:
+            pending = self.units(chunks, order)
+            with tqdm(total=len(chunks)) as progress:
+                while pending:
+                    futures = {
+                        executor.submit(process, unit): unit for unit in pending
+                    }
+                    for future in as_completed(futures):
+                        unit_results = future.result()
+                        if unit_results is None:
+                            continue
+                        for i, result in zip(futures[future], unit_results):
+                            results[i] = result
+                        progress.update(len(unit_results))
+                        self.progress["done"] = progress.n
+                    pending = [u for u in pending if results[u[0]] is None]
+        return results, errors
+
+    def rephrase_distributed(self, chunks, order):
+        """
+        Hand the chunks to worker processes through the work queue and wait
+        for all results; returns (results, errors).
+
+        The job id is derived from the stage fingerprint, so a restarted
+        coordinator resumes the same job and reuses finished results.
+        """
+        if self.deadline is not None or self.token_budget is not None:
+            logger.warning(
+                "Deadline and token budget are not enforced in distributed "
+                "mode; workers use the configured attempt limit."
+            )
+        queue = open_queue(
+            self.queue, max_deliveries=self.config.get("max_deliveries", 3)
+        )
+        job_id = f"{self.base_name}-{self.stage_fingerprints['rephrase'][:12]}"
+        if self.force:
+            job_id += f"-{self.timestamp}"
+        enqueue_chunks(
+            queue, job_id, chunks, self.units(chunks, order),
+            max_attempts=self.config.get("max_attempts", 5),
+            document=self.base_name
+        )
+
+        workers = spawn_local_workers(self.queue, self.local_workers)
+        try:
+            logger.info(f"Waiting for workers to finish job '{job_id}'...")
+            results, errors = wait_for_results(
+                queue, job_id, chunks, workers=workers
+            )
+        finally:
+            for worker in workers:
+                worker.wait()
+        self.report["queue"] = {"job_id": job_id, **queue.progress(job_id)}
+        return results, errors
+
+    def stage_evaluate(self) -> list:
+        """
+        Collect one evaluation per chunk. Evaluations made while rephrasing
+        are reused; only rephrases without one are sent to the evaluator.
+        """
+        chunks = read_artifact(self.artifact("chunks"))
+        results = read_artifact(self.artifact("rephrased"))
+
+        evaluations = []
+        self.progress["total"] = len(chunks)
+        for chunk, result in zip(chunks, results):
+            self.progress["done"] += 1
+            metadata = result["metadata"]
+            evaluation = metadata.get("evaluation") or {}
+            status = metadata.get("status") or result.get("status")
+
+            rephrased = result["page_content"]
+            # Chunks left out by adaptive sampling stay unevaluated
+            if (not evaluation and status != "not_sampled"
+                    and rephrased != chunk["page_content"]
+                    and (self.budget is None
+                         or self.budget.allow_reevaluation())):
+                try:
+                    evaluation = evaluate_with_retry(
+                        chunk["page_content"], rephrased,
+                        metadata.get("header", "")
+                    )
+                    passed, _ = evaluator.check_thresholds(evaluation)
+                    status = "accepted" if passed else "failed_thresholds"
+                except Exception as e:
+                    logger.warning(
+                        f"Evaluation of chunk '{metadata.get('chunk_id')}' "
+                        f"failed: {e}"
+                    )
+
+            evaluations.append({
+                "chunk_id": metadata.get("chunk_id"),
+                "header": metadata.get("header"),
+                "attempts": metadata.get("attempts"),
+                "model": metadata.get("model"),
+                "status": status or (
+                    "accepted" if evaluation else "not_evaluated"
+                ),
+                **evaluation,
+            })
+
+        write_artifact(self.artifact("evaluations"), evaluations)
+        return [self.artifact("evaluations")]
+
+    def stage_export(self) -> list:
+        sections = read_artifact(self.artifact("sections"), columns=["header"])
+        results = read_artifact(self.artifact("rephrased"))
 
         rephrase_map = defaultdict(list)
         for chunk in results:
@@ -79,13 +460,46 @@ def run_pipeline(input_pdf_path: str) -> None:
             for section in sections
         ]
 
+        rephrase_pdf_path = (
+            self.output_dir / f"{self.base_name}_Rephrased_{self.timestamp}.pdf"
+        )
         export_to_pdf(combined, rephrase_pdf_path)
+        logger.info(
+            f"Exported {len(results)} chunks across {len(sections)} headers."
+        )
+        return [rephrase_pdf_path]
 
-        if errors:
-            with open(error_log_file, "w", encoding="utf-8") as f:
-                json.dump(errors, f, indent=2, ensure_ascii=False)
+    def write_report(self) -> None:
+        if any(
+            self.report["stages"].get(s, {}).get("status") == "ran"
+            for s in ("rephrase", "evaluate")
+        ):
+            self.report["endpoints"] = endpoint_pool.stats()
+            self.report["evaluation"] = evaluator.stats()
+            if sampler is not None:
+                self.report["evaluation_sampling"] = sampler.report()
+            if cascade is not None:
+                self.report["model_cascade"] = cascade.report()
+            if request_sizer is not None:
+                self.report["request_sizing"] = request_sizer.report()
 
-        logger.info(
-            f"Pipeline completed. Processed {len(results)} chunks across "
-            f"{len(sections)} headers."
+        report_file = (
+            self.log_dir / f"{self.base_name}_run_report_{self.timestamp}.json"
         )
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(self.report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Run report saved: {report_file}")
+
+
+def run_pipeline(
+    input_pdf_path: str, stages=None, force: bool = False, deadline=None,
+    token_budget=None, queue=None, local_workers: int = 0,
+    profile: bool = False
+) -> None:
+    """Run the given stages (default: all) for a PDF, skipping unchanged ones."""
+    PipelineRun(
+        input_pdf_path, force=force, deadline=deadline,
+        token_budget=token_budget, queue=queue, local_workers=local_workers,
+        profile=profile
+    ).run(stages or STAGE_ORDER)
+    logger.info("Pipeline completed.")
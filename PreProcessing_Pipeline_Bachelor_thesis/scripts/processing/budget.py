@@ -0,0 +1,182 @@
+import datetime
+import re
+import threading
+import time
+from collections import Counter
+from scripts.logger.loggerSetup import setup_logger
+from scripts.processing.scheduler import predict_cost
+
+logger = setup_logger(__name__)
+
+# Pressure is predicted remaining cost divided by what is left of the
+# deadline or token budget. Above these levels the run degrades further.
+PRESSURE_SKIP_EVALUATION = 2.0
+PRESSURE_DEFER_LOW_VALUE = 1.5
+
+# Completed chunks needed before the observed rates are trusted
+MIN_SAMPLES = 4
+
+
+def parse_deadline(value: str) -> float:
+    """
+    Convert a deadline argument to a wall-clock timestamp.
+
+    Accepts a duration ('90m', '2h', '45s'), a time of day ('07:30', the next
+    occurrence) or an ISO datetime ('2026-10-20T07:30').
+    """
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smh])", value.strip())
+    if match:
+        seconds = float(match.group(1)) * {"s": 1, "m": 60, "h": 3600}[
+            match.group(2)
+        ]
+        return time.time() + seconds
+
+    now = datetime.datetime.now()
+    if re.fullmatch(r"\d{1,2}:\d{2}", value.strip()):
+        hour, minute = map(int, value.split(":"))
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= now:
+            target += datetime.timedelta(days=1)
+        return target.timestamp()
+
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+class RunBudget:
+    """
+    Adapts per-chunk effort to a wall-clock deadline and/or token budget.
+
+    Progress is measured in predicted cost units (see predict_cost). Once a
+    few chunks are done, the observed seconds and tokens per unit project
+    the cost of the remaining chunks. When that projection exceeds what is
+    left, the run degrades step by step: fewer attempts per chunk, deferring
+    small low-value chunks to the end, and finally a single unevaluated
+    rephrase per chunk. Every chunk still gets at least one rephrase.
+    """
+
+    def __init__(
+        self, chunks, max_attempts=5, deadline=None, token_budget=None,
+        tokens_used=lambda: 0, low_value_tokens=40
+    ):
+        """
+        Args:
+            chunks: All chunks of the run.
+            max_attempts: Attempt limit without time or token pressure.
+            deadline: Wall-clock timestamp the run should finish by.
+            token_budget: Total LLM tokens (prompt + generated) for the run.
+            tokens_used: Callable returning the tokens consumed so far.
+            low_value_tokens: Requests at or below this many tokens may be
+                              deferred.
+        """
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.token_budget = token_budget
+        self.tokens_used = tokens_used
+        self.low_value_tokens = low_value_tokens
+
+        self.started = time.time()
+        self.start_tokens = tokens_used()
+        self.total_units = sum(predict_cost(c) for c in chunks)
+        self.done_units = 0.0
+        self.done_chunks = 0
+        self.degradations = Counter()
+        self.deferred = set()  # keys of requests deferred to the second pass
+        self.peak_pressure = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.deadline is not None or self.token_budget is not None
+
+    def pressure(self) -> float:
+        """Predicted remaining cost relative to remaining time/tokens."""
+        with self._lock:
+            done_units = self.done_units
+            done_chunks = self.done_chunks
+        if not self.active or done_chunks < MIN_SAMPLES or not done_units:
+            return 0.0
+
+        remaining_units = max(self.total_units - done_units, 0.0)
+        pressures = []
+        if self.deadline is not None:
+            elapsed = time.time() - self.started
+            left = self.deadline - time.time()
+            needed = elapsed / done_units * remaining_units
+            pressures.append(needed / left if left > 0 else float("inf"))
+        if self.token_budget is not None:
+            used = self.tokens_used() - self.start_tokens
+            left = self.token_budget - used
+            needed = used / done_units * remaining_units
+            pressures.append(needed / left if left > 0 else float("inf"))
+
+        pressure = max(pressures)
+        self.peak_pressure = max(self.peak_pressure, pressure)
+        return pressure
+
+    def plan(self, chunks, key) -> dict:
+        """
+        Decide how much effort one request for 'chunks' gets.
+
+        A packed group is planned as a whole: its value is the summed token
+        count of its chunks. 'key' identifies the request across passes; a
+        request that was deferred once is not deferred again.
+
+        Returns a dict with 'max_attempts', 'evaluate' and 'defer'.
+        """
+        pressure = self.pressure()
+        if pressure <= 1.0:
+            return {
+                "max_attempts": self.max_attempts, "evaluate": True,
+                "defer": False
+            }
+
+        tokens = sum(c["metadata"].get("token_count", 0) for c in chunks)
+        if (pressure > PRESSURE_DEFER_LOW_VALUE
+                and tokens <= self.low_value_tokens):
+            with self._lock:
+                defer = key not in self.deferred
+                self.deferred.add(key)
+            if defer:
+                self._degrade("deferred_chunks", len(chunks))
+                return {"max_attempts": 1, "evaluate": False, "defer": True}
+
+        if pressure > PRESSURE_SKIP_EVALUATION:
+            self._degrade("unevaluated_chunks", len(chunks))
+            return {"max_attempts": 1, "evaluate": False, "defer": False}
+
+        limit = max(1, min(self.max_attempts, int(self.max_attempts / pressure)))
+        if limit < self.max_attempts:
+            self._degrade("reduced_attempt_limit", len(chunks))
+        return {"max_attempts": limit, "evaluate": True, "defer": False}
+
+    def allow_reevaluation(self) -> bool:
+        """Whether best-effort results may still be sent to the evaluator."""
+        if self.pressure() > 1.0:
+            self._degrade("skipped_reevaluations")
+            return False
+        return True
+
+    def _degrade(self, kind: str, count: int = 1) -> None:
+        with self._lock:
+            first = not self.degradations[kind]
+            self.degradations[kind] += count
+        if first:
+            logger.warning(f"Run behind deadline/budget, degrading: {kind}")
+
+    def complete(self, chunk) -> None:
+        with self._lock:
+            self.done_units += predict_cost(chunk)
+            self.done_chunks += 1
+
+    def report(self) -> dict:
+        used = self.tokens_used() - self.start_tokens
+        return {
+            "deadline": datetime.datetime.fromtimestamp(self.deadline)
+            .isoformat(timespec="seconds") if self.deadline else None,
+            "deadline_met": time.time() <= self.deadline
+            if self.deadline else None,
+            "token_budget": self.token_budget,
+            "tokens_used": used,
+            "peak_pressure": round(self.peak_pressure, 2),
+            "degradations": dict(self.degradations),
+        }
@@ -1,10 +1,10 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from scripts.processing.tokenizer import TokenHelper
+from scripts.processing.tokenizer import get_token_helper
 
 
 def chunk_sections(sections, config, chunk_overlap):
     """Split sections into smaller chunks based on token limits."""
-    tokenizer = TokenHelper(config["tokenizer_model"])
+    tokenizer = get_token_helper(config["tokenizer_model"])
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=config["chunk_size"],
         chunk_overlap=chunk_overlap,
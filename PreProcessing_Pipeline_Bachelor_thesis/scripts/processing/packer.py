@@ -0,0 +1,63 @@
+import re
+
+# Delimiter between segments in packed requests and responses
+SEGMENT_MARKER = "### SEGMENT {n} ###"
+_SEGMENT_RE = re.compile(r"^[ \t]*#{2,}\s*SEGMENT\s+(\d+)\s*#{2,}[ \t]*$",
+                         re.MULTILINE | re.IGNORECASE)
+
+
+def pack_units(chunks, order, max_chunk_tokens=80, token_budget=400,
+               max_chunks=8):
+    """
+    Group small chunks into packed requests.
+
+    Walks 'order' and collects chunks of at most 'max_chunk_tokens' into
+    groups of up to 'token_budget' tokens and 'max_chunks' chunks; larger
+    chunks stay on their own. Returns a list of index tuples, each placed at
+    the position of its first chunk in 'order'.
+    """
+    units = []
+    open_group, open_tokens = None, 0
+    for i in order:
+        tokens = chunks[i]["metadata"].get("token_count", 0)
+        if tokens > max_chunk_tokens:
+            units.append((i,))
+            continue
+        if (open_group is None or len(open_group) >= max_chunks
+                or open_tokens + tokens > token_budget):
+            open_group, open_tokens = [], 0
+            units.append(open_group)
+        open_group.append(i)
+        open_tokens += tokens
+    return [tuple(unit) for unit in units]
+
+
+def format_segments(chunks) -> str:
+    """Render chunks as numbered segments for the packed prompt."""
+    return "\n\n".join(
+        f"{SEGMENT_MARKER.format(n=n)}\n"
+        f"Title: {chunk['metadata'].get('header', '')}\n"
+        f"Content:\n{chunk.get('page_content', '')}"
+        for n, chunk in enumerate(chunks, start=1)
+    )
+
+
+def parse_segments(text: str, count: int):
+    """
+    Split a packed response into 'count' segment texts.
+
+    Returns None unless every segment 1..count appears exactly once with
+    non-empty content, so the caller can fall back to single requests.
+    """
+    matches = list(_SEGMENT_RE.finditer(text))
+    numbers = [int(m.group(1)) for m in matches]
+    if sorted(numbers) != list(range(1, count + 1)):
+        return None
+
+    segments = {}
+    for m, nxt in zip(matches, matches[1:] + [None]):
+        body = text[m.end():nxt.start() if nxt else len(text)].strip()
+        if not body:
+            return None
+        segments[int(m.group(1))] = body
+    return [segments[n] for n in range(1, count + 1)]
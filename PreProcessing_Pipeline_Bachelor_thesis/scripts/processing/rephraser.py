@@ -1,16 +1,11 @@
-import os
 import json
-import requests
 import time
 from pathlib import Path
-from dotenv import load_dotenv
 from requests.exceptions import RequestException
+from scripts.backend.endpoint_pool import endpoint_pool
+from scripts.backend.request_sizing import request_sizer
 from scripts.logger.loggerSetup import setup_logger
-
-# Load environment variables
-load_dotenv()
-
-OLLAMA_URL = os.getenv("OLLAMA_API_URL")
+from scripts.processing.packer import format_segments, parse_segments
 
 # Load model_name and generation parameters from config.json
 config_path = Path(__file__).resolve().parents[2] / "config.json"
@@ -27,12 +22,15 @@ with open(PROMPT_DIR / "rephraser_prompt.txt", "r", encoding="utf-8") as f:
     BASE_PROMPT = f.read()
 with open(PROMPT_DIR / "feedback_prompt.txt", "r", encoding="utf-8") as f:
     FEEDBACK_PROMPT = f.read()
+with open(PROMPT_DIR / "packed_rephraser_prompt.txt", "r", encoding="utf-8") as f:
+    PACKED_PROMPT = f.read()
 
 logger = setup_logger(__name__)
 
 
 def rephrase_chunk(
-    chunk, feedback=None, previous_rephrased_text=None, original_text=None, retries=2
+    chunk, feedback=None, previous_rephrased_text=None, original_text=None,
+    retries=2, model=None
 ):
     header = chunk["metadata"].get("header", "")
     text = chunk.get("page_content", "")
@@ -52,36 +50,94 @@ def rephrase_chunk(
             input_text=input_text
         )
 
+    return {
+        "metadata": chunk["metadata"],
+        "page_content": generate_text(
+            prompt, f"chunk '{header}'", retries, source_text=input_text,
+            model=model
+        )
+    }
+
+
+def rephrase_packed(chunks, retries=2, model=None):
+    """
+    Rephrase several small chunks with one delimited request.
+
+    Returns one rephrased chunk per input chunk. Raises ValueError when the
+    response cannot be split back into the individual segments.
+    """
+    segments = format_segments(chunks)
+    prompt = PACKED_PROMPT.format(count=len(chunks), segments=segments)
+    text = generate_text(
+        prompt, f"packed request of {len(chunks)} chunks", retries,
+        source_text=segments, model=model
+    )
+    segments = parse_segments(text, len(chunks))
+    if segments is None:
+        raise ValueError(
+            f"Packed response does not contain {len(chunks)} segments"
+        )
+    return [
+        {"metadata": chunk["metadata"], "page_content": segment}
+        for chunk, segment in zip(chunks, segments)
+    ]
+
+
+def generate_text(
+    prompt, label, retries=2, schema=None, kind="rephrase", source_text=None,
+    model=None
+):
+    """
+    Send a prompt to the rephrase model (or 'model') and return the
+    response text.
+
+    With 'schema', the response is constrained to that JSON schema.
+    Request errors are retried 'retries' times. Context window and
+    generation length are sized to the request from 'source_text' and
+    'kind' (see RequestSizer); a truncated response is requested again
+    with a larger generation limit.
+    """
+    payload = {
+        "model": model or model_name,
+        "prompt": prompt,
+        "stream": False,
+        "options": {
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+    }
+    if schema is not None:
+        payload["format"] = schema
+    sizing = None
+    if request_sizer is not None:
+        sizing = request_sizer.apply(payload, kind, source_text or prompt)
+
     for count in range(retries + 1):
         attempts = count + 1
         try:
-            logger.info(f"Rephrasing chunk: '{header}' (Attempt {attempts})")
-            response = requests.post(
-                OLLAMA_URL,
-                json={
-                    "model": model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "max_tokens": max_tokens
-                    }
-                },
-                timeout=120
-            )
-            response.raise_for_status()
-            response_data = response.json()
-            return {
-                "metadata": chunk["metadata"],
-                "page_content": response_data["response"].strip()
-            }
+            logger.info(f"Rephrasing {label} (Attempt {attempts})")
+            while True:
+                response = endpoint_pool.generate(payload, timeout=120)
+                response.raise_for_status()
+                response_data = response.json()
+                endpoint_pool.record_usage(response_data)
+                if sizing is None or not (
+                    request_sizer.record(payload, sizing, response_data)
+                    and request_sizer.grow(payload, sizing)
+                ):
+                    break
+                logger.info(
+                    f"Requesting {label} again with num_predict "
+                    f"{payload['options']['num_predict']}"
+                )
+            return response_data["response"].strip()
         except RequestException as e:
             logger.warning(
-                f"Request failed for chunk '{header}' on attempt {attempts}: {e}"
+                f"Request failed for {label} on attempt {attempts}: {e}"
             )
             if count == retries:
                 logger.error(
-                    f"All {retries + 1} attempts failed for chunk '{header}'. "
+                    f"All {retries + 1} attempts failed for {label}. "
                     f"Raising exception."
                 )
                 raise
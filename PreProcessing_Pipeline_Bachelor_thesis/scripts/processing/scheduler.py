@@ -0,0 +1,76 @@
+import json
+import threading
+from pathlib import Path
+from scripts.logger.loggerSetup import setup_logger
+
+logger = setup_logger(__name__)
+
+# Rough token size of the rephrase prompt template around the chunk text.
+# Every attempt pays it, so it keeps tiny chunks from predicting zero cost.
+PROMPT_OVERHEAD_TOKENS = 600
+
+
+class AttemptHistory:
+    """Persistent per-chunk record of how many attempts a chunk needed."""
+
+    def __init__(self, path, smoothing=0.5):
+        self.path = Path(path)
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._attempts = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._attempts = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Ignoring unreadable attempt history: {e}")
+
+    def get(self, key):
+        """Return the smoothed attempt count for 'key', or None if unseen."""
+        return self._attempts.get(key)
+
+    def record(self, key, attempts):
+        """Blend a new observation into the moving average for 'key'."""
+        with self._lock:
+            previous = self._attempts.get(key)
+            if previous is None:
+                self._attempts[key] = float(attempts)
+            else:
+                self._attempts[key] = (
+                    self.smoothing * previous
+                    + (1 - self.smoothing) * attempts
+                )
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._attempts, f, indent=2, ensure_ascii=False)
+
+
+def history_key(base_name, chunk):
+    """Key chunks by document and chunk id so headers can repeat across PDFs."""
+    return f"{base_name}:{chunk['metadata'].get('chunk_id', '')}"
+
+
+def predict_cost(chunk, expected_attempts=None):
+    """Predicted LLM work for a chunk: prompt plus text, times attempts."""
+    tokens = chunk["metadata"].get("token_count", 0)
+    return (PROMPT_OVERHEAD_TOKENS + tokens) * (expected_attempts or 1.0)
+
+
+def lpt_order(chunks, history=None, base_name=""):
+    """
+    Return chunk indices ordered longest-processing-time first.
+
+    Ties keep document order, so a run without history and with equally
+    sized chunks dispatches exactly as before.
+    """
+    def cost(idx):
+        chunk = chunks[idx]
+        attempts = (
+            history.get(history_key(base_name, chunk)) if history else None
+        )
+        return predict_cost(chunk, attempts)
+
+    return sorted(range(len(chunks)), key=cost, reverse=True)
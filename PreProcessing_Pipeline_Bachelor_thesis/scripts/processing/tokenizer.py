@@ -1,4 +1,6 @@
 import json
+import threading
+from functools import lru_cache
 from transformers import AutoTokenizer
 from scripts.logger.loggerSetup import setup_logger
 from pathlib import Path
@@ -15,9 +17,18 @@ class TokenHelper:
             model_name = config["tokenizer_model"]
 
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # Fast tokenizers must not be used from several threads at once
+        self._lock = threading.Lock()
         self.logger.info(f"Initialized TokenHelper with model '{model_name}'")
 
     def count_tokens(self, text):
-        tokens = self.tokenizer.encode(text)
+        with self._lock:
+            tokens = self.tokenizer.encode(text)
         self.logger.debug(f"Token count for chunk: {len(tokens)}")
         return len(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_token_helper(model_name: str) -> TokenHelper:
+    """Shared TokenHelper per model, loaded once per process."""
+    return TokenHelper(model_name)
@@ -0,0 +1,154 @@
+"""
+Sampling profiler for pipeline runs (``main.py --profile``).
+
+A background thread samples the stacks of all threads every few
+milliseconds via ``sys._current_frames`` and attributes each sample to the
+running stage and the sampled thread. Per stage it writes collapsed stacks
+(``stage;thread;outer;...;inner count``), which flamegraph.pl, speedscope
+and inferno read directly, and a top-N summary of the hottest functions.
+Stages that allocate heavily in Python (extract, chunk) additionally record
+their tracemalloc peak and top allocation sites.
+"""
+
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from scripts.logger.loggerSetup import setup_logger
+
+logger = setup_logger(__name__)
+
+# Stages whose allocations are traced; the others spend their time waiting
+# on the LLM backend, where tracemalloc would only add overhead.
+TRACEMALLOC_STAGES = ("extract", "chunk")
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> tuple:
+    """Stack of a frame from outermost to innermost."""
+    stack = []
+    while frame is not None:
+        stack.append(frame_label(frame))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+class StageProfiler:
+    """
+    Samples all threads while stages run and collects per-stage results.
+
+    Args:
+        output_dir: Directory for the collapsed-stack files.
+        interval: Seconds between samples.
+        top_n: Number of functions in the hot-function summaries.
+    """
+
+    def __init__(self, output_dir, interval=0.005, top_n=15):
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self.top_n = top_n
+        self._stage = None
+        self._samples = defaultdict(Counter)  # stage -> (thread, stack) -> n
+        self._summaries = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stage = self._stage
+            if stage is None:
+                continue
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                thread = names.get(thread_id, str(thread_id))
+                self._samples[stage][(thread, collapse(frame))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._sample_loop, name="profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Profile the enclosed stage."""
+        trace = name in TRACEMALLOC_STAGES
+        if trace:
+            tracemalloc.start()
+        self._stage = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stage = None
+            summary = {"wall_s": round(time.perf_counter() - started, 3)}
+            if trace:
+                summary["memory"] = self._memory_summary()
+                tracemalloc.stop()
+            self._summaries[name] = summary
+
+    def _memory_summary(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        return {
+            "peak_mb": round(peak / 2**20, 2),
+            "retained_mb": round(current / 2**20, 2),
+            "top_allocations": [
+                {
+                    "site": f"{stat.traceback[0].filename}:"
+                            f"{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count": stat.count,
+                }
+                for stat in snapshot.statistics("lineno")[:self.top_n]
+            ],
+        }
+
+    def _hot_functions(self, samples: Counter) -> list:
+        own, total = Counter(), Counter()
+        for (_, stack), n in samples.items():
+            own[stack[-1]] += n
+            for label in set(stack):
+                total[label] += n
+        count = sum(samples.values())
+        return [
+            {
+                "function": label,
+                "self_pct": round(100 * n / count, 1),
+                "total_pct": round(100 * total[label] / count, 1),
+            }
+            for label, n in own.most_common(self.top_n)
+        ]
+
+    def write(self) -> dict:
+        """Write <stage>.collapsed files and return the per-stage summaries."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        for stage, samples in self._samples.items():
+            path = self.output_dir / f"{stage}.collapsed"
+            with open(path, "w", encoding="utf-8") as f:
+                for (thread, stack), n in samples.most_common():
+                    f.write(f"{stage};{thread};{';'.join(stack)} {n}\n")
+            summary = self._summaries.setdefault(stage, {})
+            summary["samples"] = sum(samples.values())
+            summary["collapsed"] = str(path)
+            summary["hot_functions"] = self._hot_functions(samples)
+        logger.info(f"Profiles saved to {self.output_dir}")
+        return self._summaries
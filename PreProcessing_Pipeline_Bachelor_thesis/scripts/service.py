@@ -0,0 +1,265 @@
+"""
+Resident preprocessing service.
+
+Keeps one process with the tokenizer, prompts, configs, evaluator and the
+endpoint pool loaded, and runs PDF jobs submitted over a small HTTP API on
+a TCP port or a Unix socket. All jobs share one FairScheduler, so LLM
+request slots are handed out round-robin between jobs and a small document
+is not stuck behind a large batch.
+
+    python main.py serve --port 8765
+    curl --data-binary @doc.pdf -H 'Content-Type: application/pdf' \\
+         'http://localhost:8765/jobs?name=doc.pdf'
+    curl http://localhost:8765/jobs/<id>
+    curl -o out.pdf http://localhost:8765/jobs/<id>/result
+
+API:
+    POST /jobs?name=<file.pdf>[&stages=a,b][&force=1]  body: PDF bytes
+    GET  /jobs                  all jobs
+    GET  /jobs/<id>             state, current stage and progress, report
+    GET  /jobs/<id>/result      exported PDF once the job is done
+    GET  /health                scheduler and endpoint state
+"""
+
+import datetime
+import json
+import os
+import re
+import socketserver
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from scripts.backend.endpoint_pool import endpoint_pool
+from scripts.backend.fair_scheduler import FairScheduler
+from scripts.evaluation.cascade import cascade
+from scripts.evaluation.eval_output import MODEL_NAME as EVAL_MODEL_NAME
+from scripts.logger.loggerSetup import setup_logger
+from scripts.pipeline import STAGE_ORDER, PipelineRun
+from scripts.processing.tokenizer import get_token_helper
+
+logger = setup_logger(__name__)
+
+UPLOAD_DIR = Path("data/input/service")
+MAX_UPLOAD_BYTES = 200 * 2**20
+
+
+class Job:
+    """A submitted PDF and the state of its pipeline run."""
+
+    def __init__(self, job_id, name, pdf_path, stages, force):
+        self.id = job_id
+        self.name = name
+        self.pdf_path = pdf_path
+        self.stages = stages
+        self.force = force
+        self.state = "queued"
+        self.error = None
+        self.run = None
+        self.created = datetime.datetime.now().isoformat(timespec="seconds")
+        self.finished = None
+
+    def result_path(self):
+        if self.state != "done" or self.run is None:
+            return None
+        outputs = self.run.fingerprints.outputs("export")
+        return Path(outputs[0]) if outputs else None
+
+    def to_dict(self, detail=False) -> dict:
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "stages": self.stages,
+            "created": self.created,
+            "finished": self.finished,
+        }
+        if self.run is not None:
+            data["progress"] = dict(self.run.progress)
+        if self.error:
+            data["error"] = self.error
+        if self.result_path():
+            data["result"] = f"/jobs/{self.id}/result"
+        if detail and self.run is not None:
+            data["report"] = self.run.report
+        return data
+
+
+class JobManager:
+    """Runs submitted jobs on a bounded pool of job threads."""
+
+    def __init__(self, max_jobs=4, llm_slots=None):
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_jobs, thread_name_prefix="job"
+        )
+        self.scheduler = FairScheduler(llm_slots or endpoint_pool.concurrency())
+        endpoint_pool.scheduler = self.scheduler
+
+    def warm_up(self, config) -> None:
+        """Load the components every job needs before the first request."""
+        get_token_helper(config["tokenizer_model"])
+        if config.get("warm_up", True):
+            try:
+                endpoint_pool.warm_up(
+                    [config["model_name"], EVAL_MODEL_NAME]
+                    + ([cascade.fast_model] if cascade is not None else [])
+                )
+            except Exception as e:
+                logger.warning(f"Model warm-up failed, continuing cold: {e}")
+
+    def submit(self, name, data: bytes, stages=None, force=False) -> Job:
+        job_id = uuid.uuid4().hex[:12]
+        stem = re.sub(r"[^\w.-]", "_", Path(name or "document.pdf").stem)
+        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        # The job id prefix keeps artifacts of equally named uploads apart
+        pdf_path = UPLOAD_DIR / f"{stem}_{job_id}.pdf"
+        pdf_path.write_bytes(data)
+
+        job = Job(job_id, name, pdf_path, stages or STAGE_ORDER, force)
+        with self._lock:
+            self.jobs[job_id] = job
+        self._executor.submit(self._run, job)
+        logger.info(f"Job {job_id} queued: {name} ({len(data)} bytes)")
+        return job
+
+    def _run(self, job: Job) -> None:
+        job.state = "running"
+        try:
+            job.run = PipelineRun(job.pdf_path, force=job.force, job_id=job.id)
+            with self.scheduler.job(job.id):
+                job.run.run(job.stages)
+            job.state = "done"
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+            logger.error(f"Job {job.id} failed: {e}\n{traceback.format_exc()}")
+        finally:
+            job.finished = datetime.datetime.now().isoformat(timespec="seconds")
+
+    def get(self, job_id) -> Job | None:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return list(self.jobs.values())
+
+
+def make_handler(manager: JobManager):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path).path.strip("/").split("/")
+            if parts == ["health"]:
+                self._send_json(200, {
+                    "scheduler": manager.scheduler.stats(),
+                    "endpoints": endpoint_pool.stats(),
+                })
+            elif parts == ["jobs"]:
+                self._send_json(200, [j.to_dict() for j in manager.list()])
+            elif len(parts) in (2, 3) and parts[0] == "jobs":
+                job = manager.get(parts[1])
+                if job is None:
+                    self._send_json(404, {"error": "unknown job"})
+                elif len(parts) == 2:
+                    self._send_json(200, job.to_dict(detail=True))
+                elif parts[2] == "result":
+                    self._send_result(job)
+                else:
+                    self._send_json(404, {"error": "not found"})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path.rstrip("/") != "/jobs":
+                self._send_json(404, {"error": "not found"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            if not 0 < length <= MAX_UPLOAD_BYTES:
+                self._send_json(400, {"error": "PDF body required"})
+                return
+            data = self.rfile.read(length)
+            if not data.startswith(b"%PDF"):
+                self._send_json(400, {"error": "body is not a PDF"})
+                return
+
+            query = parse_qs(url.query)
+            stages = None
+            if "stages" in query:
+                stages = query["stages"][0].split(",")
+                unknown = [s for s in stages if s not in STAGE_ORDER]
+                if unknown:
+                    self._send_json(400, {"error": f"unknown stages {unknown}"})
+                    return
+            job = manager.submit(
+                query.get("name", ["document.pdf"])[0], data, stages=stages,
+                force=query.get("force", ["0"])[0] in ("1", "true")
+            )
+            self._send_json(201, job.to_dict())
+
+        def _send_result(self, job):
+            path = job.result_path()
+            if path is None or not path.exists():
+                self._send_json(409, {"error": f"job is {job.state}"})
+                return
+            body = path.read_bytes()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header(
+                "Content-Disposition", f'attachment; filename="{path.name}"'
+            )
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def address_string(self):
+            # Unix socket peers have no (host, port) address
+            return str(self.client_address[0]) if self.client_address else "-"
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn,
+                              socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def serve(host="127.0.0.1", port=8765, socket_path=None, max_jobs=4,
+          llm_slots=None):
+    """Create the service; call serve_forever() on the returned server."""
+    with open(Path("config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    manager = JobManager(max_jobs=max_jobs, llm_slots=llm_slots)
+    manager.warm_up(config)
+
+    handler = make_handler(manager)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+        logger.info(f"Service listening on unix socket {socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        logger.info(f"Service listening on http://{host}:{port}")
+    return server
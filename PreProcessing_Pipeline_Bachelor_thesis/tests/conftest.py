@@ -0,0 +1,60 @@
+"""
+Shared fixtures for the test suite.
+
+Run from the project root, like main.py:
+
+    python -m pytest tests
+"""
+
+import threading
+
+import pytest
+
+from scripts.backend.stub import serve
+
+
+@pytest.fixture
+def start_stub():
+    """
+    Starts Ollama stubs (scripts.backend.stub) on free ports.
+
+    Latencies default to a few milliseconds so the tests stay fast; every
+    server started through the fixture is shut down afterwards.
+    """
+    servers = []
+
+    def start(capacity=1, load_latency=0.05, evict_latency=0.02,
+              generate_latency=0.01):
+        server = serve(
+            port=0, capacity=capacity, load_latency=load_latency,
+            evict_latency=evict_latency, generate_latency=generate_latency
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+        server.url = f"http://{host}:{port}/api/generate"
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def stub(start_stub):
+    return start_stub()
+
+
+@pytest.fixture
+def stub_pool(stub, monkeypatch):
+    """Routes the process-wide endpoint pool to a fresh stub."""
+    from scripts.backend.endpoint_pool import Endpoint, endpoint_pool
+    from scripts.backend.model_manager import ModelManager
+
+    monkeypatch.setattr(
+        endpoint_pool, "endpoints",
+        [Endpoint(stub.url, manager=ModelManager(stub.url))]
+    )
+    monkeypatch.setenv("OLLAMA_API_URL", stub.url)
+    return stub
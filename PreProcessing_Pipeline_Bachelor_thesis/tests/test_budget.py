@@ -0,0 +1,50 @@
+"""RunBudget plans whole packed groups and tracks deferral itself."""
+
+import pytest
+
+from scripts.processing.budget import RunBudget
+
+
+def make_chunk(tokens):
+    return {"page_content": "x " * tokens, "metadata": {"token_count": tokens}}
+
+
+@pytest.fixture
+def pressured(monkeypatch):
+    """A budget whose run is behind enough to defer low-value requests."""
+    def make(chunks, pressure=1.8):
+        budget = RunBudget(chunks, max_attempts=5, deadline=0, low_value_tokens=40)
+        monkeypatch.setattr(budget, "pressure", lambda: pressure)
+        return budget
+    return make
+
+
+def test_group_is_planned_on_its_summed_tokens(pressured):
+    group = [make_chunk(10), make_chunk(200)]
+    budget = pressured(group)
+
+    plan = budget.plan(group, key=(0, 1))
+
+    assert not plan["defer"]
+    assert plan["max_attempts"] == 2
+    assert budget.degradations["reduced_attempt_limit"] == 2
+
+
+def test_small_group_is_deferred_once(pressured):
+    group = [make_chunk(10), make_chunk(15)]
+    budget = pressured(group)
+
+    assert budget.plan(group, key=(3, 4))["defer"]
+    assert not budget.plan(group, key=(3, 4))["defer"]
+    assert budget.degradations["deferred_chunks"] == 2
+    assert all("deferred" not in c["metadata"] for c in group)
+
+
+def test_unevaluated_under_high_pressure(pressured):
+    group = [make_chunk(100), make_chunk(100)]
+    budget = pressured(group, pressure=3.0)
+
+    assert budget.plan(group, key=(0, 1)) == {
+        "max_attempts": 1, "evaluate": False, "defer": False
+    }
+    assert budget.degradations["unevaluated_chunks"] == 2
@@ -0,0 +1,89 @@
+"""Distributed rephrasing with local worker processes and a SQLite queue."""
+
+import sqlite3
+import time
+
+from scripts.distributed.coordinator import (
+    enqueue_chunks, spawn_local_workers, wait_for_results
+)
+from scripts.distributed.work_queue import SQLiteWorkQueue, open_queue
+
+
+def make_chunk(i):
+    return {
+        "page_content": f"Sentence {i} about the climate. " * 4,
+        "metadata": {
+            "header": f"Section {i}",
+            "chunk_id": f"Section_{i}_0",
+            "token_count": 30,
+        },
+    }
+
+
+def test_local_workers_return_results_in_document_order(stub_pool, tmp_path):
+    queue_path = str(tmp_path / "queue.sqlite")
+    queue = open_queue(queue_path)
+    chunks = [make_chunk(i) for i in range(7)]
+    # Dispatch order differs from document order; (3, 4) is a packed request
+    units = [(6,), (3, 4), (0,), (5,), (1,), (2,)]
+    enqueue_chunks(queue, "job", chunks, units, max_attempts=1, document="doc")
+
+    workers = spawn_local_workers(queue_path, 3)
+    try:
+        results, errors = wait_for_results(
+            queue, "job", chunks, poll_interval=0.2, workers=workers
+        )
+    finally:
+        for worker in workers:
+            worker.wait(timeout=120)
+
+    assert not errors
+    assert [r["metadata"]["chunk_id"] for r in results] == [
+        c["metadata"]["chunk_id"] for c in chunks
+    ]
+    assert all(r["page_content"].startswith("Stub rephrase") for r in results)
+    assert queue.progress("job") == {"done": len(units)}
+
+
+def test_expired_lease_is_redelivered(tmp_path):
+    queue = SQLiteWorkQueue(tmp_path / "queue.sqlite", max_deliveries=2)
+    queue.enqueue("job", [("0", {"chunks": []})])
+
+    first = queue.lease("crashed", lease_seconds=0.05)
+    assert queue.lease("other", lease_seconds=60) is None
+    time.sleep(0.1)
+
+    second = queue.lease("other", lease_seconds=60)
+    assert second.task_id == first.task_id
+    assert second.deliveries == 2
+    assert not queue.extend(first, 60)  # the crashed worker lost its lease
+
+
+def test_lease_fails_after_max_deliveries(tmp_path):
+    queue = SQLiteWorkQueue(tmp_path / "queue.sqlite", max_deliveries=2)
+    queue.enqueue("job", [("0", {"chunks": []})])
+
+    for _ in range(2):
+        assert queue.lease("crashed", lease_seconds=0.01) is not None
+        time.sleep(0.05)
+
+    assert queue.lease("other", lease_seconds=60) is None
+    assert queue.progress("job") == {"failed": 1}
+    assert queue.errors("job") == {"0": "lease expired"}
+
+
+def test_complete_ignores_duplicate_results(tmp_path):
+    path = tmp_path / "queue.sqlite"
+    queue = SQLiteWorkQueue(path)
+    queue.enqueue("job", [("0", {"chunks": []})])
+
+    slow = queue.lease("slow", lease_seconds=0.01)
+    time.sleep(0.05)
+    fast = queue.lease("fast", lease_seconds=60)
+
+    assert queue.complete(fast, "fast", ["first result"])
+    assert not queue.complete(slow, "slow", ["late duplicate"])
+    assert queue.results("job") == {"0": ["first result"]}
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT worker_id FROM results").fetchall()
+    assert rows == [("fast",)]
@@ -0,0 +1,52 @@
+"""Concurrency of the endpoint pool and the pipeline's rephrase threads."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.backend.endpoint_pool import Endpoint, EndpointPool
+
+
+def make_pool(urls, capacities):
+    return EndpointPool([
+        Endpoint(url, capacity=capacity)
+        for url, capacity in zip(urls, capacities)
+    ])
+
+
+def test_concurrency_sums_healthy_capacities():
+    pool = make_pool(["http://a/api/generate", "http://b/api/generate"], [4, 2])
+    assert pool.concurrency() == 6
+
+    pool.endpoints[1].healthy = False
+    assert pool.concurrency() == 4
+
+    pool.endpoints[0].healthy = False
+    assert pool.concurrency() == 6  # all ejected: fall back to every endpoint
+
+
+def test_from_config_reads_capacity():
+    pool = EndpointPool.from_config({
+        "endpoint_capacity": 2,
+        "endpoints": [
+            {"url": "http://a/api/generate", "capacity": 8},
+            {"url": "http://b/api/generate"},
+        ],
+    })
+    assert [e.capacity for e in pool.endpoints] == [8, 2]
+
+
+def test_second_endpoint_doubles_throughput(start_stub):
+    """Two equal hosts serve twice the requests of one in the same time."""
+    def elapsed(pool, n=16):
+        with ThreadPoolExecutor(max_workers=pool.concurrency()) as executor:
+            started = time.perf_counter()
+            list(executor.map(
+                lambda _: pool.generate({"model": "m", "prompt": "Hi"}),
+                range(n)
+            ))
+            return time.perf_counter() - started
+
+    stubs = [start_stub(load_latency=0, generate_latency=0.2) for _ in range(2)]
+    one = elapsed(make_pool([stubs[0].url], [2]))
+    two = elapsed(make_pool([s.url for s in stubs], [2, 2]))
+    assert two < one * 0.75
@@ -0,0 +1,87 @@
+"""repair_json fixes the syntax of LLM responses without changing their strings."""
+
+import json
+
+import pytest
+
+from scripts.evaluation.json_repair import repair_json
+
+
+def repaired(text):
+    return json.loads(repair_json(text))
+
+
+def test_fenced_response():
+    text = '```json\n{"score": 4, "feedback": "Gut."}\n```'
+
+    assert repaired(text) == {"score": 4, "feedback": "Gut."}
+
+
+def test_prose_around_json():
+    text = 'Hier ist die Bewertung:\n{"score": 3, "items": [1, 2]}\nIch hoffe, das hilft.'
+
+    assert repaired(text) == {"score": 3, "items": [1, 2]}
+
+
+def test_trailing_commas_outside_strings():
+    text = '{"items": [1, 2, ], "score": 5, }'
+
+    assert repaired(text) == {"items": [1, 2], "score": 5}
+
+
+@pytest.mark.parametrize("value", [
+    'config {\\"retries\\": 3, } and the list [a, b, ]',
+    "Fehlt: Absatz 2\", ]",
+    "Ende\", }",
+])
+def test_strings_with_commas_before_brackets_are_kept(value):
+    # The fence forces the repair path; string contents must survive it
+    data = {"rephrased_text": value.replace('\\"', '"'), "score": 4}
+    text = "```json\n" + json.dumps(data) + "\n```"
+
+    assert repaired(text) == data
+
+
+def test_string_cut_off_mid_value():
+    text = '{"score": 4, "feedback": "Der Text ist verst'
+
+    assert repaired(text) == {"score": 4, "feedback": "Der Text ist verst"}
+
+
+def test_key_cut_off_mid_name():
+    text = '{"score": 4, "feedb'
+
+    assert repaired(text) == {"score": 4}
+
+
+def test_key_without_value():
+    text = '{"score": 4, "feedback": '
+
+    assert repaired(text) == {"score": 4}
+
+
+@pytest.mark.parametrize("fragment", ["0.", "-", "1e", "1.5e-", "tru", "nul"])
+def test_partial_value_is_dropped_with_its_key(fragment):
+    text = '{"score": 4, "confidence": ' + fragment
+
+    assert repaired(text) == {"score": 4}
+
+
+def test_partial_number_in_list_is_dropped():
+    text = '{"scores": [1, 2, 0.'
+
+    assert repaired(text) == {"scores": [1, 2]}
+
+
+def test_escaped_quote_at_cut_point():
+    text = '{"score": 4, "feedback": "Er sagte \\"gut\\'
+
+    assert repaired(text) == {"score": 4, "feedback": 'Er sagte "gut'}
+
+
+def test_nested_objects_are_closed():
+    text = '{"evaluation": {"scores": [{"name": "clarity", "score": 4}, {"name": "acc'
+
+    assert repaired(text) == {
+        "evaluation": {"scores": [{"name": "clarity", "score": 4}, {"name": "acc"}]}
+    }
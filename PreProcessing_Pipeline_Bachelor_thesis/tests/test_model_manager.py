@@ -0,0 +1,96 @@
+"""ModelManager against the Ollama stub: keep-alive, warm-up and grouping."""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from scripts.backend.model_manager import ModelManager
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def make_chunk(i, tokens=60):
+    return {
+        "page_content": f"Sentence {i} about the climate. " * 4,
+        "metadata": {
+            "header": f"Section {i}",
+            "chunk_id": f"Section_{i}_0",
+            "token_count": tokens,
+        },
+    }
+
+
+def test_keep_alive_is_sent(stub):
+    manager = ModelManager(stub.url, keep_alive="30m")
+
+    manager.generate({"model": "rephraser", "prompt": "Hi", "stream": False})
+    assert stub.simulator.requests[-1]["keep_alive"] == "30m"
+    assert "rephraser" in stub.simulator.loaded
+
+    # A keep_alive in the payload wins; 0 makes Ollama unload the model
+    manager.generate({"model": "rephraser", "prompt": "", "keep_alive": 0})
+    assert stub.simulator.requests[-1]["keep_alive"] == 0
+    assert "rephraser" not in stub.simulator.loaded
+
+
+def test_warm_up_loads_models_before_requests(start_stub):
+    stub = start_stub(capacity=2, load_latency=0.2)
+    manager = ModelManager(stub.url)
+
+    manager.warm_up(["rephraser", "evaluator", "rephraser"])
+    assert stub.simulator.loads == 2
+    assert all(r["warm_up"] for r in stub.simulator.requests)
+
+    # The first real requests find their models resident
+    for model in ("rephraser", "evaluator"):
+        response = manager.generate({"model": model, "prompt": "Hi"})
+        assert response.json()["load_duration"] == 0
+    assert stub.simulator.loads == 2
+
+
+def test_pipeline_warms_up_before_dispatch(stub_pool, tmp_path, monkeypatch):
+    from scripts.pipeline import PipelineRun
+
+    config = json.loads((PROJECT_ROOT / "config.json").read_text("utf-8"))
+    config.update(packing=False, cascade=False, max_attempts=1)
+    (tmp_path / "config.json").write_text(json.dumps(config), "utf-8")
+    (tmp_path / "tokenization_model").symlink_to(PROJECT_ROOT / "tokenization_model")
+    monkeypatch.chdir(tmp_path)
+
+    chunks = [make_chunk(i) for i in range(4)]
+    results, errors = PipelineRun("doc.pdf").rephrase_local(chunks, range(4))
+
+    assert not errors
+    assert all(r["page_content"].startswith("Stub rephrase") for r in results)
+    log = stub_pool.simulator.requests
+    first_dispatch = next(i for i, r in enumerate(log) if not r["warm_up"])
+    warmed = {r["model"] for r in log[:first_dispatch]}
+    assert warmed == {r["model"] for r in log}
+
+
+def run_interleaved(url, group_models, requests_per_model=12):
+    """Alternating requests for two models from several threads."""
+    manager = ModelManager(url, group_models=group_models)
+
+    def call(model):
+        manager.generate({"model": model, "prompt": "Hi"}).raise_for_status()
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(call, ["rephraser", "evaluator"] * requests_per_model))
+    return manager.stats()
+
+
+def test_grouping_reduces_evictions(start_stub):
+    ungrouped = start_stub(capacity=1)
+    ungrouped_stats = run_interleaved(ungrouped.url, group_models=False)
+
+    grouped = start_stub(capacity=1)
+    grouped_stats = run_interleaved(grouped.url, group_models=True)
+
+    assert grouped_stats["calls_per_model"] == ungrouped_stats["calls_per_model"]
+    assert grouped.simulator.evictions < ungrouped.simulator.evictions
+    assert grouped.simulator.evictions <= grouped_stats["model_switches"] + 1
+    stats = requests.get(grouped.url.replace("/api/generate", "/stats")).json()
+    assert stats["evictions"] == grouped.simulator.evictions